@@ -0,0 +1,176 @@
+import collections
+import threading
+import time
+
+from LatencyTracker import latency
+
+
+class Command:
+    """
+    One request from an input source. enqueued_at is a time.monotonic()
+    timestamp so the consumer can measure how long the command queued.
+    origin is when the input itself happened (e.g. the first serial byte of
+    a gesture) and defaults to enqueued_at.
+    """
+    __slots__ = ('kind', 'steps', 'velocity', 'enqueued_at', 'origin')
+
+    def __init__(self, kind, steps=0, velocity=0.0, origin=None):
+        self.kind = kind
+        self.steps = steps
+        self.velocity = velocity
+        self.enqueued_at = time.monotonic()
+        self.origin = self.enqueued_at if origin is None else origin
+
+    def __repr__(self):
+        return f"Command({self.kind}, steps={self.steps})"
+
+
+class CommandQueue:
+    """
+    Bounded single-producer/single-consumer queue between an input thread
+    and the playback side.
+
+    put() and drain() only append to / pop from a collections.deque, which
+    is atomic in CPython, so neither side ever takes a lock or waits on the
+    other. Consecutive navigate commands are coalesced when drained: a burst
+    of steps that piled up while the consumer was busy becomes one command
+    carrying the summed steps and the oldest enqueue time.
+
+    notify() is called after every put so the consumer can be woken up.
+    """
+    def __init__(self, maxlen=64, notify=None):
+        self.maxlen = maxlen
+        self.notify = notify
+        self._items = collections.deque()
+        self.dropped = 0
+
+    def put(self, kind, steps=0, velocity=0.0, origin=None):
+        if len(self._items) >= self.maxlen:
+            # Full: the consumer is stuck, don't make the input thread wait
+            self.dropped += 1
+            return False
+        self._items.append(Command(kind, steps, velocity, origin))
+        if self.notify is not None:
+            self.notify()
+        return True
+
+    def __len__(self):
+        return len(self._items)
+
+    def drain(self):
+        """Pop everything that is queued, coalescing consecutive navigates."""
+        commands = []
+        while True:
+            try:
+                command = self._items.popleft()
+            except IndexError:
+                break
+            last = commands[-1] if commands else None
+            if last is not None and last.kind == 'navigate' and command.kind == 'navigate':
+                last.steps += command.steps
+                last.velocity = max(last.velocity, command.velocity)
+            else:
+                commands.append(command)
+        return commands
+
+    def attach(self, controller):
+        """Route a controller's callbacks into this queue."""
+        controller.incrementCallback = lambda: self.put('navigate', 1)
+        controller.decrementCallback = lambda: self.put('navigate', -1)
+        controller.navigateCallback = lambda command: self.put('navigate', command.steps,
+                                                               command.velocity, command.origin)
+        controller.quitCallback = lambda *args: self.put('quit')
+
+
+class QueueStats:
+    """Running queueing-delay figures for drained commands."""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, delay):
+        self.count += 1
+        self.total += delay
+        self.last = delay
+        if delay > self.max:
+            self.max = delay
+
+    def __str__(self):
+        mean = self.total / self.count if self.count else 0.0
+        return (f"{self.count} commands, queueing delay mean {mean * 1000:.1f} ms, "
+                f"max {self.max * 1000:.1f} ms")
+
+
+def dispatch(command, target):
+    delay = time.monotonic() - command.enqueued_at
+    latency.record('queue_delay', delay)
+    latency.mark('dequeued', command.origin)
+    if command.kind == 'navigate':
+        if command.steps != 0:
+            target.navigate(command)
+    elif command.kind == 'quit':
+        target.stop()
+    else:
+        print(f"Unknown command: {command}")
+
+
+class PlaybackWorker:
+    """
+    The one thread that talks to the slideshow. Input threads only put()
+    commands; this thread sleeps on an Event until there is work.
+    """
+    def __init__(self, commands, target):
+        self.commands = commands
+        self.target = target
+        self.stats = QueueStats()
+        self._wake = threading.Event()
+        self.commands.notify = self._wake.set
+        self._running = False
+        self._thread = threading.Thread(target=self._loop, name='playback-worker', daemon=True)
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        print(f"Playback worker: {self.stats}")
+
+    def _loop(self):
+        while self._running:
+            self._wake.wait()
+            self._wake.clear()
+            for command in self.commands.drain():
+                self.stats.add(time.monotonic() - command.enqueued_at)
+                try:
+                    dispatch(command, self.target)
+                except Exception as e:
+                    print(f"Command {command} failed: {e}")
+
+
+class TkCommandPump:
+    """
+    Same as PlaybackWorker, but runs the commands on the Tk main loop via
+    root.after so slideshows that draw with Tk stay on the Tk thread.
+    """
+    def __init__(self, commands, root, target):
+        self.commands = commands
+        self.root = root
+        self.target = target
+        self.stats = QueueStats()
+        self._scheduled = False
+        self.commands.notify = self._schedule
+
+    def _schedule(self):
+        if not self._scheduled:
+            self._scheduled = True
+            self.root.after(0, self._drain)
+
+    def _drain(self):
+        self._scheduled = False
+        for command in self.commands.drain():
+            self.stats.add(time.monotonic() - command.enqueued_at)
+            dispatch(command, self.target)
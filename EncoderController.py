@@ -2,71 +2,98 @@ import time
 import threading
 import serial
 
+from FrameParser import FrameParser, CLOCKWISE
+from TickAccumulator import TickAccumulator
+from LatencyTracker import latency
+from Tracer import tracer
+
 
 class EncoderController:
     
-    def __init__(self):
+    def __init__(self, port='/dev/ttyS0', baud=125000):
+        # port can also be a pty from encoder_replay.py
         self.ser = serial.Serial(
-            port='/dev/ttyS0',
-            baudrate=125000,
+            port=port,
+            baudrate=baud,
             timeout=1.0  # 1-second timeout
         )
         self.incrementCallback = None
         self.decrementCallback = None
+        # Optional: receives one NavigationCommand per gesture
+        self.navigateCallback = None
+        # Optional: hintCallback(direction, steps) as soon as a turn starts,
+        # (0, 0) when it was abandoned before completing a detent
+        self.hintCallback = None
+        self.hint = (0, 0)
         self.tics_per_increment = 3
-        self.last_increment_time = time.time()
-        self.min_time_between_increment = 5
-        
-        self.last_click_time = time.time()
-        self.min_time_between_clicks = 0.2
-        self.increment_count = 0
-        self.t1 = threading.Thread(target=self.begin_loop)
-    
-    def checkIncrementTimes(self, now):
-        if (time.time() - self.last_click_time) < self.min_time_between_clicks:
-            return False
         
-        self.increment_count = (self.increment_count + 1) % self.tics_per_increment
-        self.last_click_time = now
+        # Ticks are never dropped any more: bursts are merged into one
+        # command once the knob has been still for burst_gap, at most one
+        # command every min_time_between_increment seconds
+        self.min_time_between_increment = 0.1
+        self.burst_gap = 0.08
+        self.accumulator = TickAccumulator(self.tics_per_increment,
+                                           burst_gap=self.burst_gap,
+                                           min_interval=self.min_time_between_increment)
+        self.idle_timeout = 1.0
         
-        # Check if it's reached ticks_per_increment
-        if (self.increment_count) != 0:
-            return False
+        self.parser = FrameParser()
+        self.t1 = threading.Thread(target=self.begin_loop, name='encoder')
+    
+    def increment(self, received_at=None):
+        self.accumulator.add(1, received_at or time.monotonic())
+    
+    def decrement(self, received_at=None):
+        self.accumulator.add(-1, received_at or time.monotonic())
+    
+    def flush_ticks(self):
+        """Send the current burst on once it is over."""
+        command = self.accumulator.poll(time.monotonic())
         
-        # Check if it's been long enough since the last increment
-        if (time.time() - self.last_increment_time) < self.min_time_between_increment:
-            return False
+        # Wake up soon while a burst is open so it is sent promptly, and
+        # only once a second while the knob is idle
+        timeout = self.burst_gap if self.accumulator.pending else self.idle_timeout
+        if self.ser.timeout != timeout:
+            self.ser.timeout = timeout
         
-        self.last_increment_time = now
-        return True
-
+        if command is not None:
+            # The command itself takes over from any hint
+            self.hint = (0, 0)
+            self.navigate(command)
+        elif self.accumulator.abandoned:
+            # The turn stopped short of a detent: withdraw the hint
+            self.accumulator.abandoned = False
+            self.hint = (0, 0)
+            if callable(self.hintCallback):
+                self.hintCallback(0, 0)
+        else:
+            self.update_hint()
     
-    def increment(self):
-        now = time.time()
-        
-        if self.checkIncrementTimes(now):
-            # Check if incrementCallback is not a function
-            if not callable(self.incrementCallback):
-                #throw an error
-                #TODO: Implement a better error handling mechanism
-                print("Error: incrementCallback is not a function.")
-            else:
-                print("Calling incrementCallback.")
-                self.incrementCallback()
+    def update_hint(self):
+        """Tell the slideshow which way a turn is heading before its detent completes."""
+        hint = self.accumulator.hint()
+        if hint == self.hint:
+            return
+        self.hint = hint
+        if callable(self.hintCallback):
+            self.hintCallback(*hint)
     
-    def decrement(self):
-        now = time.time()
+    @tracer.traced('encoder.navigate')
+    def navigate(self, command):
+        print(f"Navigating: {command}")
+        latency.mark('command', command.origin)
+        if callable(self.navigateCallback):
+            self.navigateCallback(command)
+            return
         
-        if self.checkIncrementTimes(now):
-        # self.increment_count = (self.increment_count - 1) % self.tics_per_increment
-        # print("Default decrement logic.")
-        
-            if not callable(self.decrementCallback):
-                print("Error: decrementCallback is not a function.")
-            else:
-                if (self.increment_count) == 0:
-                    print("Calling decrementCallback.")
-                    self.decrementCallback()
+        # Slideshows without navigate() only know single steps
+        callback = self.incrementCallback if command.steps > 0 else self.decrementCallback
+        if not callable(callback):
+            #TODO: Implement a better error handling mechanism
+            print("Error: increment/decrementCallback is not a function.")
+            return
+        for _ in range(abs(command.steps)):
+            callback()
         
     def start_controller(self):
         self._running = True
@@ -81,26 +108,35 @@ class EncoderController:
     def begin_loop(self):
         
         while self._running:
-            # time.sleep(0.2)
-            
-            data = None
-            
-            data = self.ser.read(4)
-            print(f"Raw data: {data}")
-            self.handle_data(data)
+            # Block for the first byte (up to the timeout), then drain
+            # everything else that has arrived in the same read
+            data = self.ser.read(max(1, self.ser.in_waiting))
+            if data:
+                self.handle_data(data, time.monotonic())
+            self.flush_ticks()
 
         self.ser.close()
+        print(f"Encoder serial closed. {self.parser.stats()}")
             
-    def handle_data(self, data):
-        # logic for interpreting data
-        if data == b'\xff\x00\x00\x01':
-            #print("Encoder spinning clockwise")
-            self.increment()
-        elif data == b'\xff\x00\x00\xfe':
-            #print("Encoder spinning counterclockwise")
-            self.decrement()
-        else:
-            print("Unknown state")
+    @tracer.traced('encoder.handle_data')
+    def handle_data(self, data, received_at=None):
+        # logic for interpreting data, the parser resynchronises on the
+        # 0xFF header if bytes go missing
+        if received_at is None:
+            received_at = time.monotonic()
+        errors = self.parser.framing_errors
+        directions = self.parser.feed(data)
+        if directions:
+            latency.mark('decoded', received_at)
+        for direction in directions:
+            if direction == CLOCKWISE:
+                #print("Encoder spinning clockwise")
+                self.increment(received_at)
+            else:
+                #print("Encoder spinning counterclockwise")
+                self.decrement(received_at)
+        if self.parser.framing_errors != errors:
+            print(f"Encoder resync, framing errors so far: {self.parser.framing_errors}")
 
         
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+import bisect
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+
+from MediaCatalog import MEDIA_EXTS
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT = struct.Struct('iIII')      # wd, mask, cookie, len; then len bytes of name
+
+ADDED = 'added'
+REMOVED = 'removed'
+MODIFIED = 'modified'
+RESCAN = 'rescan'
+
+
+def _libc():
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+class ExhibitWatcher:
+    """
+    Watches one exhibit folder with inotify and reports changes to its media
+    files as they happen: callback(kind, path) with kind ADDED, REMOVED or
+    MODIFIED, on the watcher's own thread.
+
+    A copied-in file is only reported once its writer closes it
+    (IN_CLOSE_WRITE), or when it is renamed into the folder complete
+    (IN_MOVED_TO, e.g. rsync). Hidden files and other extensions are
+    ignored. If the kernel queue overflows, events were lost and the
+    callback gets RESCAN with the folder instead.
+    """
+    def __init__(self, folder, callback, known=None, extensions=MEDIA_EXTS):
+        self.folder = os.path.abspath(folder)
+        self.callback = callback
+        self.extensions = extensions
+        if known is None:
+            known = [os.path.join(self.folder, f) for f in os.listdir(self.folder)]
+        self.known = {os.path.abspath(path) for path in known}
+
+        self._libc = _libc()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1: {os.strerror(errno)}")
+        if self._libc.inotify_add_watch(self._fd, os.fsencode(self.folder), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch {self.folder}: {os.strerror(errno)}")
+
+        # Writing to this pipe wakes the thread up to stop
+        self._wake_r, self._wake_w = os.pipe()
+        self._running = False
+        self._thread = threading.Thread(target=self._loop, name='exhibit-watcher', daemon=True)
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+
+    def stop(self):
+        if self._fd is None:
+            return
+        self._running = False
+        if self._thread.is_alive():
+            os.write(self._wake_w, b'x')
+            self._thread.join(timeout=1.0)
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            os.close(fd)
+        self._fd = None
+
+    def _loop(self):
+        while self._running:
+            readable, _, _ = select.select([self._fd, self._wake_r], [], [])
+            if self._wake_r in readable:
+                break
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            for mask, name in self._parse(data):
+                try:
+                    self._handle(mask, name)
+                except Exception as e:
+                    print(f"ExhibitWatcher: {name} failed: {e}")
+
+    @staticmethod
+    def _parse(data):
+        offset = 0
+        while offset + EVENT.size <= len(data):
+            _, mask, _, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].split(b'\0', 1)[0]
+            offset += length
+            yield mask, os.fsdecode(name)
+
+    def _handle(self, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            self.callback(RESCAN, self.folder)
+            return
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+            print(f"ExhibitWatcher: {self.folder} went away, no longer watching")
+            self._running = False
+            return
+        if mask & IN_ISDIR or not name or name.startswith('.'):
+            return
+        if not name.lower().endswith(self.extensions):
+            return
+
+        path = os.path.join(self.folder, name)
+        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            kind = MODIFIED if path in self.known else ADDED
+            self.known.add(path)
+            self.callback(kind, path)
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            if path in self.known:
+                self.known.discard(path)
+                self.callback(REMOVED, path)
+
+
+def apply_delta(media_files, current_index, kind, path):
+    """
+    Apply one ADDED/REMOVED change to a sorted playlist in place, without
+    rescanning. Returns the new current index, chosen so the item on screen
+    stays on screen (or, if it was removed, its successor takes its place).
+    """
+    if kind == ADDED:
+        if path in media_files:
+            return current_index
+        position = bisect.bisect_left(media_files, path)
+        media_files.insert(position, path)
+        if len(media_files) > 1 and position <= current_index:
+            return current_index + 1
+        return current_index
+    if kind == REMOVED:
+        try:
+            position = media_files.index(path)
+        except ValueError:
+            return current_index
+        del media_files[position]
+        if not media_files:
+            return 0
+        if position < current_index:
+            current_index -= 1
+        return current_index % len(media_files)
+    return current_index
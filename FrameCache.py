@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of display-ready still images.
+
+Each entry is one file holding the raw RGB pixels of an image already
+scaled to fit a given screen size, named after the content hash of the
+source file and that size:
+
+    <cache dir>/<blake2b of the file>_<W>x<H>.rgb
+
+load() memory-maps the file and wraps it in a PIL image without copying or
+decoding, so after a reboot a still costs a page-in instead of a JPEG
+decode. The directory is bounded by a disk quota; the least recently used
+frames (by file mtime, touched on every load) are evicted first.
+
+Pre-build the cache for an exhibit with
+
+    python FrameCache.py build Videos/Teens_Exhibit --size 1920x1080
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+
+from PIL import Image
+
+from ImageDecoder import IMAGE_EXTS, BACKENDS, saved_backend
+from MediaCatalog import content_hash
+
+DEFAULT_DIR = os.environ.get('SLIDESHOW_FRAME_CACHE',
+                             os.path.join(os.path.expanduser('~'), '.cache', 'slideshow', 'frames'))
+DEFAULT_QUOTA = 2 * 1024 * 1024 * 1024
+
+# magic, version, width, height, reserved; pixels start right after
+HEADER = struct.Struct('<4sHIIH')
+MAGIC = b'RGBF'
+VERSION = 1
+INDEX_FILE = 'index.json'
+
+
+class FrameCache:
+    """
+    Memory-mappable raw-frame store, keyed by (content hash, screen size).
+
+    Hashing a file means reading all of it, so hashes are remembered per
+    (absolute path, size, mtime) in index.json inside the cache directory;
+    an edited file gets a new hash and therefore a new frame. The index is
+    written as soon as it changes, since a kiosk is usually switched off
+    rather than shut down.
+    """
+    def __init__(self, directory=DEFAULT_DIR, quota=DEFAULT_QUOTA):
+        self.directory = directory
+        self.quota = quota
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._hashes = self._load_index()
+        self._dirty = False
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE)) as f:
+                hashes = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Older indexes kept the paths as given, relative ones included
+        return {os.path.abspath(path): entry for path, entry in hashes.items()}
+
+    def save_index(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            hashes = dict(self._hashes)
+            self._dirty = False
+        path = os.path.join(self.directory, INDEX_FILE)
+        # Decoder workers may save at the same time
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(hashes, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Frame cache: could not write {path}: {e}")
+            self._remove(tmp_path)
+
+    def hash_of(self, path):
+        # The CLI is given relative paths, the slideshows absolute ones
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        with self._lock:
+            entry = self._hashes.get(path)
+        if entry is not None and entry[:2] == stamp:
+            return entry[2]
+        digest = content_hash(path)
+        with self._lock:
+            self._hashes[path] = stamp + [digest]
+            self._dirty = True
+        return digest
+
+    def frame_path(self, path, size):
+        return os.path.join(self.directory, f"{self.hash_of(path)}_{size[0]}x{size[1]}.rgb")
+
+    def load(self, path, size):
+        """The cached frame as a PIL image backed by an mmap, or None."""
+        try:
+            frame_path = self.frame_path(path, size)
+            with open(frame_path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        # A file cut short before its header was complete is as bad as a wrong one
+        valid = len(mapped) >= HEADER.size
+        if valid:
+            magic, version, width, height, _ = HEADER.unpack_from(mapped)
+            valid = (magic == MAGIC and version == VERSION
+                     and len(mapped) == HEADER.size + width * height * 3)
+        if not valid:
+            mapped.close()
+            self._remove(frame_path)
+            self.misses += 1
+            return None
+        try:
+            # LRU clock for evict()
+            os.utime(frame_path)
+        except OSError:
+            pass
+        self.hits += 1
+        if self._dirty:
+            # Hashed just now for a frame built earlier
+            self.save_index()
+        # frombuffer keeps a reference to the mapping, no pixels are copied
+        return Image.frombuffer('RGB', (width, height), memoryview(mapped)[HEADER.size:],
+                                'raw', 'RGB', 0, 1)
+
+    def store(self, path, size, image):
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        frame_path = self.frame_path(path, size)
+        tmp_path = f"{frame_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, image.width, image.height, 0))
+                f.write(image.tobytes())
+                # On disk before the rename, so a power cut can't leave a short frame
+                f.flush()
+                os.fsync(f.fileno())
+            # Readers only ever see complete frames
+            os.replace(tmp_path, frame_path)
+        except OSError as e:
+            print(f"Frame cache: could not write {frame_path}: {e}")
+            self._remove(tmp_path)
+            return
+        self.save_index()
+        self.evict()
+
+    def invalidate(self, path):
+        """Forget the remembered hash of a file (its frames age out)."""
+        with self._lock:
+            if self._hashes.pop(os.path.abspath(path), None) is not None:
+                self._dirty = True
+
+    def frames(self):
+        """(mtime, bytes, path) of every cached frame, oldest first."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.rgb'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def usage(self):
+        return sum(size for _, size, _ in self.frames())
+
+    def evict(self, quota=None):
+        """Delete least recently used frames until the cache fits the quota."""
+        quota = self.quota if quota is None else quota
+        frames = self.frames()
+        total = sum(size for _, size, _ in frames)
+        removed = 0
+        for _, size, frame_path in frames:
+            if total <= quota:
+                break
+            self._remove(frame_path)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for _, _, frame_path in self.frames():
+            self._remove(frame_path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def __str__(self):
+        frames = self.frames()
+        total = sum(size for _, size, _ in frames)
+        return (f"{len(frames)} frames, {total / 1e6:.1f}/{self.quota / 1e6:.0f} MB in {self.directory}, "
+                f"{self.hits} hits, {self.misses} misses")
+
+
+###############################################################################
+# Command line
+###############################################################################
+def screen_size():
+    import tkinter as tk
+    root = tk.Tk()
+    root.withdraw()
+    size = (root.winfo_screenwidth(), root.winfo_screenheight())
+    root.destroy()
+    return size
+
+
+def image_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, f) for f in sorted(os.listdir(path))
+                      if f.lower().endswith(IMAGE_EXTS)]
+        else:
+            files.append(path)
+    return files
+
+
+def build(cache, files, size, force=False):
+    decode = BACKENDS[saved_backend()]
+    built = 0
+    for path in files:
+        if not force and os.path.exists(cache.frame_path(path, size)):
+            continue
+        try:
+            cache.store(path, size, decode(path, size))
+        except OSError as e:
+            print(f"  {path}: {e}")
+            continue
+        built += 1
+        print(f"  {os.path.basename(path)}")
+    cache.save_index()
+    return built
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the raw-frame cache for still images.')
+    parser.add_argument('--dir', default=DEFAULT_DIR, help='cache directory')
+    parser.add_argument('--quota', type=float, default=DEFAULT_QUOTA / 1e9, help='disk quota in GB')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='pre-build frames for an exhibit')
+    build_parser.add_argument('paths', nargs='+', help='image files or folders')
+    build_parser.add_argument('--size', help='screen size, WxH (default: this screen)')
+    build_parser.add_argument('--force', action='store_true', help='rebuild existing frames')
+    commands.add_parser('stats', help='show cache usage')
+    commands.add_parser('evict', help='trim the cache to the quota')
+    commands.add_parser('clear', help='delete every frame')
+    args = parser.parse_args()
+
+    cache = FrameCache(args.dir, int(args.quota * 1e9))
+    if args.command == 'build':
+        size = tuple(int(v) for v in args.size.lower().split('x')) if args.size else screen_size()
+        files = image_files(args.paths)
+        if not files:
+            print("No images found.")
+            sys.exit(1)
+        print(f"Building frames at {size[0]}x{size[1]} for {len(files)} images")
+        built = build(cache, files, size, args.force)
+        print(f"Built {built}, {len(files) - built} already cached")
+    elif args.command == 'evict':
+        print(f"Removed {cache.evict()} frames")
+    elif args.command == 'clear':
+        cache.clear()
+    print(cache)
+
+
+if __name__ == '__main__':
+    main()
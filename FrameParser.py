@@ -0,0 +1,75 @@
+CLOCKWISE = 1
+COUNTERCLOCKWISE = -1
+
+
+class FrameParser:
+    """
+    Streaming parser for the encoder's serial protocol.
+
+    Every event is a 4-byte frame starting with a 0xFF header:
+        b'\\xff\\x00\\x00\\x01'  one tick clockwise
+        b'\\xff\\x00\\x00\\xfe'  one tick counterclockwise
+
+    feed() accepts chunks of any size, decodes every complete frame in the
+    buffer and keeps a trailing partial frame for the next call. If a byte
+    is dropped or inserted, the parser throws away bytes up to the next
+    0xFF header instead of misreading every frame after it.
+    """
+    HEADER = 0xFF
+    FRAME_LENGTH = 4
+    FRAMES = {
+        b'\xff\x00\x00\x01': CLOCKWISE,
+        b'\xff\x00\x00\xfe': COUNTERCLOCKWISE,
+    }
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.frames_decoded = 0
+        self.framing_errors = 0
+        self.bytes_discarded = 0
+
+    def feed(self, data):
+        """Add raw bytes and return the directions of all complete frames."""
+        buffer = self.buffer
+        buffer += data
+        directions = []
+        pos = 0
+        end = len(buffer)
+
+        while end - pos >= self.FRAME_LENGTH:
+            if buffer[pos] != self.HEADER:
+                # Out of sync, skip ahead to the next header
+                header = buffer.find(self.HEADER, pos + 1)
+                skipped_to = header if header != -1 else end
+                self._discard(skipped_to - pos)
+                pos = skipped_to
+                continue
+
+            direction = self.FRAMES.get(bytes(buffer[pos:pos + self.FRAME_LENGTH]))
+            if direction is None:
+                # A header followed by garbage (or a frame that lost a byte):
+                # drop the header and look for the next one
+                self._discard(1)
+                pos += 1
+                continue
+
+            directions.append(direction)
+            self.frames_decoded += 1
+            pos += self.FRAME_LENGTH
+
+        del buffer[:pos]
+        return directions
+
+    def _discard(self, count):
+        self.framing_errors += 1
+        self.bytes_discarded += count
+
+    def reset(self):
+        self.buffer.clear()
+
+    def stats(self):
+        return {
+            'frames_decoded': self.frames_decoded,
+            'framing_errors': self.framing_errors,
+            'bytes_discarded': self.bytes_discarded,
+        }
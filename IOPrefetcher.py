@@ -0,0 +1,164 @@
+import collections
+import os
+import queue
+import threading
+
+
+class IOPrefetcher:
+    """
+    Warms the page cache for playlist items around the current one, so
+    opening them doesn't stall on the SD card.
+
+    For the `radius` entries either side of the current index the first
+    `head_bytes` of each file get posix_fadvise(WILLNEED), which makes the
+    kernel start reading them in the background. Python has no
+    os.readahead(); WILLNEED is the same request on Linux. Items that drift
+    more than `evict_distance` away get DONTNEED so their pages can go.
+    At most `budget` bytes are ever advised at once: when a new item doesn't
+    fit, the farthest warm items are dropped first, and if it still doesn't
+    fit it is skipped.
+
+    focus() only queues work; the fadvise calls run on a thread of their
+    own, so the caller never waits on I/O.
+    """
+    def __init__(self, media_files, radius=2, head_bytes=16 * 1024 * 1024,
+                 budget=128 * 1024 * 1024, evict_distance=None):
+        self.media_files = media_files
+        self.radius = radius
+        self.head_bytes = head_bytes
+        self.budget = budget
+        self.evict_distance = evict_distance if evict_distance is not None else radius + 2
+
+        # path -> bytes advised, oldest first
+        self.warm = collections.OrderedDict()
+        self.used = 0
+        self.advised = 0
+        self.dropped = 0
+        self._center = None
+
+        self._jobs = queue.Queue()
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name='io-prefetch', daemon=True)
+        self._thread.start()
+
+    def focus(self, index):
+        """The visitor is at `index`: warm its neighbours, cool far items."""
+        self._jobs.put(('focus', index))
+
+    def prefetch(self, indices):
+        """Warm a few specific indices too (e.g. where a knob turn is heading)."""
+        self._jobs.put(('prefetch', list(indices)))
+
+    def stop(self):
+        self._running = False
+        self._jobs.put(None)
+
+    def _loop(self):
+        while self._running:
+            job = self._jobs.get()
+            if job is None:
+                break
+            kind, argument = job
+            # Only the newest focus matters once several piled up
+            while kind == 'focus' and not self._jobs.empty():
+                newer = self._jobs.get()
+                if newer is None:
+                    return
+                if newer[0] == 'focus':
+                    argument = newer[1]
+                else:
+                    self._jobs.put(newer)
+                    break
+            try:
+                if kind == 'focus':
+                    self._focus(argument)
+                else:
+                    self._warm_indices(argument, self._center)
+            except Exception as e:
+                print(f"IOPrefetcher: {e}")
+
+    def _distance(self, a, b):
+        count = len(self.media_files)
+        d = abs(a - b) % count
+        return min(d, count - d)
+
+    def _focus(self, index):
+        files = list(self.media_files)
+        if not files:
+            return
+        index %= len(files)
+        self._center = index
+        positions = {path: i for i, path in enumerate(files)}
+
+        # Cool everything that is now far away (or gone from the playlist)
+        for path in list(self.warm):
+            position = positions.get(path)
+            if position is None or self._distance(position, index) > self.evict_distance:
+                self._drop(path)
+
+        wanted = [index]
+        for distance in range(1, self.radius + 1):
+            wanted += [index + distance, index - distance]
+        self._warm_indices(wanted, index)
+
+    def _warm_indices(self, indices, center):
+        files = list(self.media_files)
+        if not files:
+            return
+        positions = {path: i for i, path in enumerate(files)}
+        for index in indices:
+            path = files[index % len(files)]
+            if path in self.warm:
+                self.warm.move_to_end(path)
+                continue
+            try:
+                size = min(os.path.getsize(path), self.head_bytes)
+            except OSError:
+                continue
+            if not self._make_room(size, positions, center):
+                continue
+            if self._advise(path, size, os.POSIX_FADV_WILLNEED):
+                self.warm[path] = size
+                self.used += size
+                self.advised += size
+
+    def _make_room(self, size, positions, center):
+        if size > self.budget:
+            return False
+        if self.used + size <= self.budget:
+            return True
+        # Farthest from the current item first
+        def distance(path):
+            position = positions.get(path)
+            if position is None or center is None:
+                return len(positions)
+            return self._distance(position, center)
+        for path in sorted(self.warm, key=distance, reverse=True):
+            if self.used + size <= self.budget:
+                break
+            self._drop(path)
+        return self.used + size <= self.budget
+
+    def _drop(self, path):
+        size = self.warm.pop(path)
+        self.used -= size
+        self.dropped += size
+        self._advise(path, 0, os.POSIX_FADV_DONTNEED)
+
+    @staticmethod
+    def _advise(path, length, advice):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return False
+        try:
+            os.posix_fadvise(fd, 0, length, advice)
+            return True
+        except OSError:
+            return False
+        finally:
+            os.close(fd)
+
+    def __str__(self):
+        return (f"{len(self.warm)} files warm, {self.used / 1e6:.1f}/{self.budget / 1e6:.0f} MB, "
+                f"{self.advised / 1e6:.0f} MB advised, {self.dropped / 1e6:.0f} MB dropped")
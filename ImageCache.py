@@ -0,0 +1,85 @@
+import collections
+import os
+import threading
+
+
+class ImageCache:
+    """
+    LRU cache of decoded, window-sized images (e.g. ImageTk.PhotoImage).
+
+    Entries are keyed by (path, mtime, target size), so an edited file or a
+    different window size never returns a stale picture. The total size is
+    bounded by `max_bytes`; the least recently shown images are evicted
+    first. Call set_geometry() when the window changes size to drop every
+    entry that was scaled for the old size.
+    """
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.geometry = None
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path, size):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        return (path, mtime, tuple(size))
+
+    def get(self, path, size):
+        key = self.key(path, size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, path, size, image, nbytes=None):
+        if nbytes is None:
+            # Tk keeps photo images as 32-bit pixels
+            nbytes = image.width() * image.height() * 4
+        if nbytes > self.max_bytes:
+            return
+        key = self.key(path, size)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (image, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def invalidate(self, path):
+        """Drop every cached size of one file (e.g. it was modified)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                self.bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def set_geometry(self, size):
+        """Forget everything scaled for a different window size."""
+        size = tuple(size)
+        if size != self.geometry:
+            if self.geometry is not None:
+                self.clear()
+            self.geometry = size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return (f"{len(self)} images, {self.bytes / 1e6:.1f}/{self.max_bytes / 1e6:.0f} MB, "
+                f"{self.hits} hits, {self.misses} misses")
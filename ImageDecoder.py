@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Background, reduced-scale decoding of still images.
+
+Large archival JPEGs are decoded straight to the smallest scale that is
+still at least as big as the window (libjpeg's DCT scaling: 1/2, 1/4, 1/8),
+then resized once with a high quality filter. Both backends in
+requirements.txt can do this:
+
+    pil     Image.draft() before loading
+    opencv  cv2.imread() with IMREAD_REDUCED_COLOR_2/4/8
+
+Benchmark them on this machine and remember the faster one with
+
+    python ImageDecoder.py bench Videos/Teens_Exhibit --size 1920x1080 --save
+"""
+import argparse
+import collections
+import concurrent.futures
+import os
+import statistics
+import sys
+import threading
+import time
+
+from PIL import Image
+
+BACKEND_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'decoder_backend.txt')
+JPEG_EXTS = ('.jpg', '.jpeg')
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.gif')
+
+
+def fit_size(image_size, window_size):
+    """Largest size with the image's aspect ratio that fits the window."""
+    image_width, image_height = image_size
+    window_width, window_height = window_size
+    scale = min(window_width / image_width, window_height / image_height)
+    return max(1, int(image_width * scale)), max(1, int(image_height * scale))
+
+
+def decode_pil(path, window_size):
+    # convert() returns a loaded copy, so the file is closed on the way out
+    with Image.open(path) as source:
+        target = fit_size(source.size, window_size)
+        if source.format == 'JPEG':
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale if that's still >= target
+            source.draft('RGB', target)
+        image = source.convert('RGB')
+    if image.size != target:
+        image = image.resize(target, Image.LANCZOS)
+    return image
+
+
+def _reduced_flag(cv2, image_size, target):
+    # Biggest reduction that still leaves at least the target size
+    for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8),
+                         (4, cv2.IMREAD_REDUCED_COLOR_4),
+                         (2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if image_size[0] // factor >= target[0] and image_size[1] // factor >= target[1]:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_opencv(path, window_size):
+    import cv2
+
+    # Only reads the header, to learn the full size
+    with Image.open(path) as header:
+        image_size = header.size
+    target = fit_size(image_size, window_size)
+    flag = _reduced_flag(cv2, image_size, target) if path.lower().endswith(JPEG_EXTS) else cv2.IMREAD_COLOR
+    pixels = cv2.imread(path, flag)
+    if pixels is None:
+        # Formats OpenCV can't read (e.g. GIF)
+        return decode_pil(path, window_size)
+    if (pixels.shape[1], pixels.shape[0]) != target:
+        pixels = cv2.resize(pixels, target, interpolation=cv2.INTER_AREA)
+    return Image.fromarray(cv2.cvtColor(pixels, cv2.COLOR_BGR2RGB))
+
+
+def decode_full(path, window_size):
+    # Full decode then resize, what the slideshows did before, for the benchmark
+    with Image.open(path) as source:
+        image = source.convert('RGB')
+    return image.resize(fit_size(image.size, window_size), Image.LANCZOS)
+
+
+BACKENDS = {
+    'pil': decode_pil,
+    'opencv': decode_opencv,
+}
+
+
+def saved_backend():
+    try:
+        with open(BACKEND_FILE) as f:
+            name = f.read().strip()
+    except OSError:
+        return 'pil'
+    return name if name in BACKENDS else 'pil'
+
+
+class ImageDecoder:
+    """
+    Thread pool that decodes upcoming images ahead of navigation.
+
+    prefetch() queues a decode and returns its Future; get() returns the
+    decoded PIL image, waiting for a prefetch that is already running or
+    decoding right away. Results are kept for the `keep` most recent keys.
+
+    With a FrameCache, frames decoded earlier (even before a reboot) are
+    mapped from disk instead, and fresh decodes are written back to it.
+    """
+    def __init__(self, backend='auto', workers=2, keep=8, frame_cache=None):
+        if backend == 'auto':
+            backend = saved_backend()
+        self.backend = backend
+        self.decode = BACKENDS[backend]
+        self.keep = keep
+        self.frame_cache = frame_cache
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                                               thread_name_prefix='decoder')
+        self._futures = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def prefetch(self, path, window_size):
+        key = (path, tuple(window_size))
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                future = self._executor.submit(self._load, path, tuple(window_size))
+                self._futures[key] = future
+            self._futures.move_to_end(key)
+            while len(self._futures) > self.keep:
+                _, old = self._futures.popitem(last=False)
+                old.cancel()
+        return future
+
+    def retain(self, paths):
+        """Cancel queued decodes for anything not in `paths`."""
+        with self._lock:
+            for key in [k for k in self._futures if k[0] not in paths]:
+                if self._futures[key].cancel():
+                    del self._futures[key]
+
+    def get(self, path, window_size):
+        future = self.prefetch(path, window_size)
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            return self._load(path, tuple(window_size))
+
+    def _load(self, path, window_size):
+        if self.frame_cache is None:
+            return self.decode(path, window_size)
+        image = self.frame_cache.load(path, window_size)
+        if image is None:
+            image = self.decode(path, window_size)
+            self.frame_cache.store(path, window_size, image)
+        return image
+
+    def forget(self, path):
+        with self._lock:
+            for key in [k for k in self._futures if k[0] == path]:
+                self._futures.pop(key).cancel()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.frame_cache is not None:
+            self.frame_cache.save_index()
+
+
+###############################################################################
+# Benchmark
+###############################################################################
+def benchmark(paths, window_size, repeat=3):
+    """Median decode time per backend in seconds, plus decoded megapixels."""
+    candidates = dict(BACKENDS, full=decode_full)
+    results = {}
+    for name, decode in candidates.items():
+        times = []
+        pixels = 0
+        try:
+            for path in paths:
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    image = decode(path, window_size)
+                    times.append(time.perf_counter() - start)
+                pixels += decoded_pixels(name, path, window_size)
+        except ImportError as e:
+            print(f"{name}: not available ({e})")
+            continue
+        results[name] = (statistics.median(times), pixels / len(paths) / 1e6)
+    return results
+
+
+def decoded_pixels(backend, path, window_size):
+    # Size of the intermediate full/reduced decode, a proxy for peak memory
+    with Image.open(path) as image:
+        size = image.size
+        if backend != 'full' and image.format == 'JPEG':
+            image.draft('RGB', fit_size(size, window_size))
+            size = image.size
+    return size[0] * size[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark image decode backends.')
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('paths', nargs='+', help='image files or folders')
+    parser.add_argument('--size', default='1920x1080', help='window size, WxH')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', action='store_true', help=f'write the winner to {BACKEND_FILE}')
+    args = parser.parse_args()
+
+    window_size = tuple(int(v) for v in args.size.lower().split('x'))
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, f) for f in sorted(os.listdir(path))
+                      if f.lower().endswith(IMAGE_EXTS)]
+        else:
+            files.append(path)
+    if not files:
+        print("No images found.")
+        sys.exit(1)
+
+    print(f"Decoding {len(files)} images to fit {window_size[0]}x{window_size[1]}, {args.repeat}x each")
+    results = benchmark(files, window_size, args.repeat)
+    for name, (seconds, megapixels) in sorted(results.items(), key=lambda item: item[1][0]):
+        print(f"  {name:<8} {seconds * 1000:8.1f} ms/image  {megapixels:6.1f} MP decoded")
+
+    best = min((name for name in results if name in BACKENDS), key=lambda name: results[name][0])
+    print(f"Fastest backend: {best}")
+    if args.save:
+        with open(BACKEND_FILE, 'w') as f:
+            f.write(best + '\n')
+        print(f"Saved to {BACKEND_FILE}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,77 +2,151 @@ import time
 import keyboard
 import threading
 
+from TickAccumulator import NavigationCommand
+
+
 class KeyboardController:
-    
-    def __init__(self):
-        
-        # self.connect()
-        self.t1 = threading.Thread(target=self.begin_loop)
-        
-        #self.t1.daemon = True
-        # self.begin_loop()
-    
+    """
+    Arrow keys drive the slideshow like the encoder does.
+
+    Built on keyboard's per-key hooks, one per key for both key-down and
+    key-up (on Linux these read /dev/input directly) instead of polling
+    is_pressed every 100 ms, so a short tap is never missed and nothing
+    runs while no key is touched.
+
+    Holding a key: the OS sends repeated key-down events, which are ignored.
+    If repeat_delay is set, a held arrow repeats every repeat_interval
+    seconds after that delay, on our own timer.
+    """
+
+    def __init__(self, repeat_delay=None, repeat_interval=0.25):
+        self.incrementCallback = None
+        self.decrementCallback = None
+        # Optional: receives a NavigationCommand per key press
+        self.navigateCallback = None
+        self.quitCallback = None
+
+        self.repeat_delay = repeat_delay
+        self.repeat_interval = repeat_interval
+
+        self.bindings = {
+            'right': self.increment,
+            'left': self.decrement,
+            's': lambda: print("You pressed 's'."),
+            'q': self.quit,
+        }
+
+        self._pressed = set()
+        self._repeat_timers = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
     def connect(self):
         print("Default connection logic.")
-    
+
     def increment(self):
-        print("Default increment logic.")
-        # Check if incrementCallback is not a function
-        if not callable(self.incrementCallback):
-            #throw an error
-            #TODO: Implement a better error handling mechanism
-            print("Error: incrementCallback is not a function.")
-        else:
-            print("Calling incrementCallback.")
-            self.incrementCallback()
-    
+        self._navigate(1, self.incrementCallback)
+
     def decrement(self):
-        print("Default decrement logic.")
-        
-        if not callable(self.decrementCallback):
-            print("Error: decrementCallback is not a function.")
+        self._navigate(-1, self.decrementCallback)
+
+    def _navigate(self, steps, callback):
+        if callable(self.navigateCallback):
+            self.navigateCallback(NavigationCommand(steps, 0.0, 1, 0.0, time.monotonic()))
+        elif not callable(callback):
+            #TODO: Implement a better error handling mechanism
+            print("Error: increment/decrementCallback is not a function.")
         else:
-            print("Calling decrementCallback.")
-            self.decrementCallback()
-        
+            callback()
+
+    def quit(self):
+        print("You pressed 'q'. Exiting...")
+        if callable(self.quitCallback):
+            self.quitCallback()
+        # Unhooking from inside a hook callback is not safe, do it from
+        # a thread of its own
+        threading.Thread(target=self.stop_controller, daemon=True).start()
+
     def poll_contorller(self):
         print("Default poll logic.")
-        
+
         print("Press 'q' to quit.")
-        
+
     def start_controller(self):
         print("Starting controller...")
-        self.t1.start()
-        
+        self._stopped.clear()
+        # One hook per key for both directions: keyboard keeps a single
+        # hook entry per key (and per callback object), so separate press
+        # and release hooks, or one shared callback, could not all be removed
+        for key in self.bindings:
+            handler = lambda event, key=key: self._on_key(key, event)
+            self._hooks.append(keyboard.hook_key(key, handler, suppress=False))
+
     def stop_controller(self):
         print("Stopping controller...")
-        self.t1.join()
-        # Add conditional statement to check for a vaiable that will stop the loop in begin_loop()
-        
+        hooks, self._hooks = self._hooks, []
+        try:
+            for hook in hooks:
+                try:
+                    keyboard.unhook(hook)
+                except (KeyError, ValueError) as e:
+                    print(f"Keyboard hook already removed: {e}")
+        finally:
+            with self._lock:
+                for timer in self._repeat_timers.values():
+                    timer.cancel()
+                self._repeat_timers.clear()
+                self._pressed.clear()
+            self._stopped.set()
+
     def begin_loop(self):
-        while True:
-            time.sleep(0.1)
-            if keyboard.is_pressed('right'):  # Detect if 'right' key is pressed
-                print("You pressed 'right'.")
-                self.increment()
-                
-            if keyboard.is_pressed('left'):  # Detect if 'left' key is pressed
-                print("You pressed 'left'.")
-                self.decrement()
-                
-            if keyboard.is_pressed('s'):  # Detect if 's' key is pressed
-                print("You pressed 's'.")
-            
-            if keyboard.is_pressed('q'):  # Detect if 'q' key is pressed
-                print("You pressed 'q'. Exiting...")
-                self.quitCallback()
-                break
-        #self.stop_controller()
-        
-        
+        # Kept for scripts that ran the old polling loop in the foreground:
+        # hook the keys and sleep until 'q' or stop_controller()
+        if not self._hooks:
+            self.start_controller()
+        self._stopped.wait()
+
+    def _on_key(self, key, event):
+        if event.event_type == keyboard.KEY_DOWN:
+            self._on_press(key)
+        else:
+            self._on_release(key)
+
+    def _on_press(self, key):
+        with self._lock:
+            if key in self._pressed:
+                # OS auto-repeat of a key that is already down
+                return
+            self._pressed.add(key)
+            if self.repeat_delay is not None and key in ('left', 'right'):
+                self._schedule_repeat(key, self.repeat_delay)
+        self.bindings[key]()
+
+    def _on_release(self, key):
+        with self._lock:
+            self._pressed.discard(key)
+            timer = self._repeat_timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _schedule_repeat(self, key, delay):
+        timer = threading.Timer(delay, self._repeat, args=(key,))
+        timer.daemon = True
+        self._repeat_timers[key] = timer
+        timer.start()
+
+    def _repeat(self, key):
+        with self._lock:
+            if key not in self._pressed:
+                return
+            self._schedule_repeat(key, self.repeat_interval)
+        self.bindings[key]()
+
+
 if __name__ == "__main__":
     controller = KeyboardController()
     #controller.start_controller()
     controller.begin_loop()
     #controller.stop_controller()
-    print("Exiting...")
\ No newline at end of file
+    print("Exiting...")
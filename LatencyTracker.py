@@ -0,0 +1,134 @@
+import threading
+import time
+
+
+class Histogram:
+    """
+    HDR-style histogram of durations in microseconds.
+
+    Values below 2**sub_bucket_bits are counted exactly; above that every
+    power of two is split into 2**sub_bucket_bits linear buckets, so the
+    relative error stays under 1 / 2**sub_bucket_bits (3% by default) from
+    microseconds up to hours with a fixed, small array of counters.
+    """
+    def __init__(self, sub_bucket_bits=5, max_exponent=40):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_buckets = 1 << sub_bucket_bits
+        self.counts = [0] * (self.sub_buckets * (max_exponent + 1))
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.sum = 0
+
+    def _index(self, value):
+        if value < self.sub_buckets:
+            return value
+        exponent = value.bit_length() - self.sub_bucket_bits
+        mantissa = (value >> (exponent - 1)) - self.sub_buckets
+        return exponent * self.sub_buckets + mantissa
+
+    def _value(self, index):
+        # Upper edge of the bucket, so percentiles never under-report
+        exponent, mantissa = divmod(index, self.sub_buckets)
+        if exponent == 0:
+            return mantissa
+        mantissa += self.sub_buckets
+        return ((mantissa + 1) << (exponent - 1)) - 1
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1e6))
+        index = min(self._index(value), len(self.counts) - 1)
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        if self.min is None or value < self.min:
+            self.min = value
+
+    def percentile(self, percent):
+        """Value in seconds below which `percent` of the samples fall."""
+        if not self.total:
+            return 0.0
+        wanted = max(1, int(round(self.total * percent / 100.0)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted:
+                return min(self._value(index), self.max) / 1e6
+        return self.max / 1e6
+
+    def mean(self):
+        return self.sum / self.total / 1e6 if self.total else 0.0
+
+
+class LatencyTracker:
+    """
+    Input-to-photon latency, broken down by stage.
+
+    Every input gesture carries the time.monotonic() timestamp at which its
+    first byte came off the serial port. Each stage of the pipeline calls
+    mark(stage, origin) and the time since that origin goes into the
+    stage's histogram, so the histograms read as "how long after the knob
+    moved did we reach this point".
+
+    record(stage, seconds) is for stand-alone durations that are not tied to
+    one input, e.g. how long media_new took during a background pre-roll.
+    """
+    # Input path in the order the stages happen, used to sort the report
+    STAGES = (
+        'decoded', 'command', 'dequeued', 'callback',
+        'ready', 'shown', 'fade_complete',
+        'preroll.media_new', 'preroll.set_media', 'preroll.play', 'preroll.vout',
+        'queue_delay',
+    )
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.record(seconds)
+
+    def mark(self, stage, origin, now=None):
+        if origin is None:
+            return
+        if now is None:
+            now = time.monotonic()
+        self.record(stage, now - origin)
+
+    def report(self):
+        with self._lock:
+            known = [s for s in self.STAGES if s in self.histograms]
+            other = sorted(s for s in self.histograms if s not in self.STAGES)
+            lines = [f"{'stage':<20} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+            for stage in known + other:
+                h = self.histograms[stage]
+                lines.append(f"{stage:<20} {h.total:>7} {h.percentile(50) * 1000:>9.1f} "
+                             f"{h.percentile(95) * 1000:>9.1f} {h.percentile(99) * 1000:>9.1f} "
+                             f"{h.max / 1000:>9.1f}")
+        return '\n'.join(lines)
+
+    def dump(self, path=None):
+        """Print the report, or append it to `path` with a timestamp."""
+        text = self.report()
+        if path is None:
+            print(text)
+            return
+        with open(path, 'a') as f:
+            f.write(f"# {time.strftime('%Y-%m-%d %H:%M:%S')}\n{text}\n\n")
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+
+
+# Shared by the controller, queue and slideshow so they report together
+latency = LatencyTracker()
@@ -1,11 +1,25 @@
-from Viewer import Viewer
-from EncoderController import EncoderController
-from SlideShow import SlideShow
-import psutil
-import time
-import threading
-import logging
-from datetime import datetime
+from StartupProfiler import startup
+
+with startup.phase('imports'):
+    # Only what is needed to get a window up; vlc, serial and PIL
+    # are imported later, off the main thread where possible
+    import concurrent.futures
+    import signal
+    import sys
+    import threading
+    import logging
+    from datetime import datetime
+
+    from Viewer import Viewer
+    from CommandQueue import CommandQueue, TkCommandPump
+    from LatencyTracker import latency
+    from Tracer import tracer
+    from MetricsSampler import MetricsSampler
+    from MediaCatalog import MediaCatalog, load_playlist
+
+MEDIA_FOLDER = 'Videos'
+# Seconds from power-on of the process to the first picture on screen
+STARTUP_BUDGET = 3.0
 
 logging.basicConfig(filename='./app.log', level=logging.DEBUG)
 
@@ -13,28 +27,120 @@ now = datetime.now()
 dt_string = now.strftime("%d/%m/%Y %H:%M:%S")
 logging.debug(f'Starting at {dt_string}')
 
-def monitor_resources():
-    while True:
-        cpu_usage = psutil.cpu_percent(interval=1)
-        memory_info = psutil.virtual_memory()
-        logging.debug(f'CPU Usage: {cpu_usage}%')
-        logging.debug(f'Memory Usage: {memory_info.percent}%')
-        time.sleep(5)
+def create_instance():
+    with startup.phase('vlc_instance'):
+        from SlideShow import create_instance
+        return create_instance()
+
+def create_controller():
+    with startup.phase('serial_open'):
+        from EncoderController import EncoderController
+        return EncoderController()
+
+def load_catalog(catalog, media_folder):
+    with startup.phase('catalog'):
+        return load_playlist(media_folder, catalog=catalog)
+
+def show_cached_first_frame(viewer, catalog, media_folder):
+    """
+    Put last run's first still on screen straight from the frame cache,
+    before VLC or the serial port are even open. Returns the PhotoImage, or
+    None if there is nothing cached to show.
+    """
+    playlist = catalog.playlist(media_folder)
+    if not playlist or not playlist[0].lower().endswith(('.png', '.jpg', '.jpeg')):
+        return None
+    from PIL import ImageTk
+    from FrameCache import FrameCache
 
-viewer = Viewer()
-# resource_thread = threading.Thread(target=monitor_resources)
-# resource_thread.start()
+    # Map the fullscreen window so it has its real size
+    viewer.root.update()
+    size = (viewer.window.winfo_width(), viewer.window.winfo_height())
+    image = FrameCache().load(playlist[0], size)
+    if image is None:
+        return None
+    photo = ImageTk.PhotoImage(image)
+    viewer.show_image(photo)
+    viewer.root.update_idletasks()
+    return photo
 
-controller = EncoderController()
+def fast_start(media_folder):
+    """
+    Window and cached first frame first, while the VLC instance, the serial
+    port and the catalog refresh are set up concurrently on other threads.
+    """
+    with startup.phase('viewer'):
+        viewer = Viewer()
+    catalog = MediaCatalog()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3, thread_name_prefix='startup') as pool:
+        instance_job = pool.submit(create_instance)
+        controller_job = pool.submit(create_controller)
+        playlist_job = pool.submit(load_catalog, catalog, media_folder)
+        with startup.phase('cached_frame'):
+            cached = show_cached_first_frame(viewer, catalog, media_folder)
+            if cached is not None:
+                startup.mark('first_frame')
+        instance = instance_job.result()
+        controller = controller_job.result()
+        media_files = playlist_job.result()
+
+    with startup.phase('slideshow'):
+        from SlideShow import SlideShow
+        slideShow = SlideShow(viewer, controller, media_folder,
+                              instance=instance, media_files=media_files, catalog=catalog)
+        viewer.root.update_idletasks()
+    if cached is None:
+        # Nothing was cached: the slideshow's own first item is the first frame
+        startup.mark('first_frame')
+    return viewer, controller, slideShow
+
+def classic_start(media_folder):
+    # The old one-thing-after-another order, kept to compare against
+    with startup.phase('viewer'):
+        viewer = Viewer()
+    controller = create_controller()
+    with startup.phase('slideshow'):
+        from SlideShow import SlideShow
+        slideShow = SlideShow(viewer, controller, media_folder)
+        viewer.root.update_idletasks()
+    startup.mark('first_frame')
+    return viewer, controller, slideShow
+
+def report_startup():
+    startup.mark('mainloop')
+    startup.dump()
+    logging.debug('Startup profile:\n' + startup.report())
+    if startup.over_budget():
+        logging.warning(f'Startup over its {startup.budget:.1f}s budget')
+
+startup.budget = STARTUP_BUDGET
+if '--classic' in sys.argv:
+    viewer, controller, slideShow = classic_start(MEDIA_FOLDER)
+else:
+    viewer, controller, slideShow = fast_start(MEDIA_FOLDER)
+# Per-thread CPU, memory, fds and temperature to metrics.bin; read it with
+# python MetricsSampler.py summary
+metrics = MetricsSampler().start()
+
+# Encoder input is queued and run on the Tk loop, never on the serial thread
+commands = CommandQueue()
+commands.attach(controller)
+pump = TkCommandPump(commands, viewer.root, slideShow)
 
-slideShow = SlideShow(viewer, controller, 'Videos')
 controller.start_controller()
 
+# kill -USR1 <pid> prints the latency percentiles without stopping
+signal.signal(signal.SIGUSR1, lambda sig, frame: latency.dump())
+# kill -USR2 <pid> writes the trace so far (SLIDESHOW_TRACE=trace.json)
+signal.signal(signal.SIGUSR2, lambda sig, frame: tracer.save())
+
+viewer.root.after(0, report_startup)
 viewer.start()
+latency.dump()
+metrics.stop()
+logging.debug(f'Metrics: {metrics}')
 
 # Detect an interupt signal and stop the controller
-import signal
-import sys
 def signal_handler(sig, frame):
     print('You pressed Ctrl+C!')
     controller.stop_controller()
@@ -44,4 +150,4 @@ def signal_handler(sig, frame):
 
 
 # if __name__ == "__main__":
-    # play_video('/path/to/your/video.mp4')
\ No newline at end of file
+    # play_video('/path/to/your/video.mp4')
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+SQLite catalog of the exhibit media, so the slideshows don't have to list,
+filter and sort folders (or open a file to learn anything about it).
+
+One row per media file: path, size, mtime, content hash, kind, duration,
+dimensions, codec and the artist from the `#Artist_Name#` filename
+convention. refresh() only stats the folder; files that are new or whose
+size/mtime changed are probed in parallel, rows of deleted files are
+dropped. A playlist is then a single indexed query.
+
+    python MediaCatalog.py update Videos/Teens_Exhibit Videos/Music_Exhibit
+    python MediaCatalog.py list Videos/Music_Exhibit
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media_catalog.sqlite3')
+
+VIDEO_EXTS = ('.mp4', '.mkv', '.mov', '.avi')
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.gif')
+MEDIA_EXTS = VIDEO_EXTS + IMAGE_EXTS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    path      TEXT PRIMARY KEY,
+    folder    TEXT NOT NULL,
+    name      TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    mtime_ns  INTEGER NOT NULL,
+    hash      TEXT,
+    kind      TEXT NOT NULL,
+    duration  REAL,
+    width     INTEGER,
+    height    INTEGER,
+    codec     TEXT,
+    artist    TEXT,
+    error     TEXT,
+    probed_at REAL
+);
+CREATE INDEX IF NOT EXISTS media_folder_name ON media (folder, name);
+"""
+
+COLUMNS = ('path', 'folder', 'name', 'size', 'mtime_ns', 'hash', 'kind', 'duration',
+           'width', 'height', 'codec', 'artist', 'error', 'probed_at')
+
+
+def artist_from_filename(filename):
+    """'trimmed_#Chuck_Berry#_Johnny_B_Goode.mp4' -> 'Chuck Berry', else None."""
+    if '#' not in filename:
+        return None
+    return filename.split('#')[1].replace('_', ' ')
+
+
+def content_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def kind_of(filename):
+    # Dotfiles are hidden or half-written (e.g. exhibit_compiler's partials)
+    if filename.startswith('.'):
+        return None
+    name = filename.lower()
+    if name.endswith(VIDEO_EXTS):
+        return 'video'
+    if name.endswith(IMAGE_EXTS):
+        return 'image'
+    return None
+
+
+###############################################################################
+# Probing (runs on worker threads, never touches the database)
+###############################################################################
+def probe_image(path):
+    from PIL import Image
+
+    with Image.open(path) as image:
+        return {'width': image.width, 'height': image.height,
+                'codec': (image.format or '').lower() or None,
+                # Animated GIFs have a running time too
+                'duration': (sum(_gif_durations(image)) / 1000
+                             if getattr(image, 'is_animated', False) else None)}
+
+
+def _gif_durations(image):
+    for frame in range(image.n_frames):
+        image.seek(frame)
+        yield image.info.get('duration', 0)
+
+
+def probe_video(path):
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+         '-show_entries', 'stream=codec_name,width,height:format=duration', '-of', 'json', path],
+        capture_output=True, text=True, check=True)
+    probe = json.loads(result.stdout)
+    stream = (probe.get('streams') or [{}])[0]
+    duration = probe.get('format', {}).get('duration')
+    return {'width': stream.get('width'), 'height': stream.get('height'),
+            'codec': stream.get('codec_name'),
+            'duration': float(duration) if duration not in (None, 'N/A') else None}
+
+
+def probe(path, kind):
+    """Everything the catalog stores about one file."""
+    row = {'hash': None, 'duration': None, 'width': None, 'height': None,
+           'codec': None, 'error': None, 'probed_at': time.time()}
+    try:
+        row['hash'] = content_hash(path)
+        row.update(probe_image(path) if kind == 'image' else probe_video(path))
+    except FileNotFoundError as e:
+        # ffprobe missing (or the file vanished): keep the row, 'update' retries it
+        row['error'] = str(e)
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        row['error'] = str(e).strip()[-300:]
+    return row
+
+
+###############################################################################
+# Catalog
+###############################################################################
+class MediaCatalog:
+    """
+    The catalog database. Safe to share between threads; probing happens on
+    a thread pool but every read and write goes through one connection.
+    """
+    def __init__(self, db_path=DEFAULT_DB, workers=None):
+        self.db_path = db_path
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def folder_key(folder):
+        return os.path.abspath(folder)
+
+    def refresh(self, folder, retry_errors=False):
+        """
+        Bring the rows of one folder up to date. Returns (added, updated,
+        removed) counts; unchanged files cost a stat and nothing else.
+        Files whose probe failed are only probed again with retry_errors.
+        """
+        key = self.folder_key(folder)
+        with self._lock:
+            known = {row['path']: (row['size'], row['mtime_ns'], row['error'])
+                     for row in self._db.execute(
+                         'SELECT path, size, mtime_ns, error FROM media WHERE folder = ?', (key,))}
+
+        stale = []
+        present = set()
+        for entry in os.scandir(key):
+            kind = kind_of(entry.name)
+            if kind is None or not entry.is_file():
+                continue
+            stat = entry.stat()
+            present.add(entry.path)
+            old = known.get(entry.path)
+            if (old is None or old[:2] != (stat.st_size, stat.st_mtime_ns)
+                    or (retry_errors and old[2] is not None)):
+                stale.append((entry.path, entry.name, kind, stat))
+
+        removed = [path for path in known if path not in present]
+        rows = []
+        if stale:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers,
+                                                       thread_name_prefix='catalog-probe') as executor:
+                probes = executor.map(lambda item: probe(item[0], item[2]), stale)
+                for (path, name, kind, stat), info in zip(stale, probes):
+                    rows.append(dict(info, path=path, folder=key, name=name, size=stat.st_size,
+                                     mtime_ns=stat.st_mtime_ns, kind=kind,
+                                     artist=artist_from_filename(name)))
+        self._write(rows, removed)
+        added = sum(1 for row in rows if row['path'] not in known)
+        return added, len(rows) - added, len(removed)
+
+    def update_file(self, path):
+        """Probe one new or modified file and store its row (no folder scan)."""
+        path = os.path.abspath(path)
+        name = os.path.basename(path)
+        kind = kind_of(name)
+        if kind is None:
+            return None
+        stat = os.stat(path)
+        row = dict(probe(path, kind), path=path, folder=os.path.dirname(path), name=name,
+                   size=stat.st_size, mtime_ns=stat.st_mtime_ns, kind=kind,
+                   artist=artist_from_filename(name))
+        self._write([row], [])
+        return row
+
+    def remove_file(self, path):
+        self._write([], [os.path.abspath(path)])
+
+    def _write(self, rows, removed):
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM media WHERE path = ?', [(p,) for p in removed])
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO media ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join(':' + c for c in COLUMNS)})", rows)
+
+    def playlist(self, folder, kinds=('video', 'image')):
+        """Paths in a folder, sorted by file name."""
+        marks = ', '.join('?' * len(kinds))
+        with self._lock:
+            rows = self._db.execute(
+                f'SELECT path FROM media WHERE folder = ? AND kind IN ({marks}) ORDER BY name',
+                (self.folder_key(folder), *kinds)).fetchall()
+        return [row['path'] for row in rows]
+
+    def get(self, path):
+        """The row of one file as a dict, or None."""
+        with self._lock:
+            row = self._db.execute('SELECT * FROM media WHERE path = ?',
+                                   (os.path.abspath(path),)).fetchone()
+        return dict(row) if row is not None else None
+
+    def rows(self, folder):
+        with self._lock:
+            return [dict(row) for row in self._db.execute(
+                'SELECT * FROM media WHERE folder = ? ORDER BY name', (self.folder_key(folder),))]
+
+
+def load_playlist(folder, kinds=('video', 'image'), catalog=None):
+    """
+    What the slideshows' load_media functions used to do with os.listdir:
+    the sorted media paths of a folder, FileNotFoundError if there are none.
+    """
+    owned = catalog is None
+    if owned:
+        catalog = MediaCatalog()
+    try:
+        catalog.refresh(folder)
+        media_files = catalog.playlist(folder, kinds)
+    finally:
+        if owned:
+            catalog.close()
+    if not media_files:
+        raise FileNotFoundError(f"No media found in {folder}")
+    return media_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and query the media catalog.')
+    parser.add_argument('--db', default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('update', help='add new and changed files, drop deleted ones')
+    p.add_argument('folders', nargs='+')
+    p = sub.add_parser('list', help='print the catalog rows of a folder')
+    p.add_argument('folders', nargs='+')
+    args = parser.parse_args()
+
+    catalog = MediaCatalog(args.db)
+    for folder in args.folders:
+        if args.command == 'update':
+            started = time.monotonic()
+            added, updated, removed = catalog.refresh(folder, retry_errors=True)
+            print(f"{folder}: {added} added, {updated} updated, {removed} removed "
+                  f"in {time.monotonic() - started:.2f}s")
+        for row in catalog.rows(folder):
+            size = f"{row['width']}x{row['height']}" if row['width'] else '?'
+            duration = f"{row['duration']:.1f}s" if row['duration'] else ''
+            print(f"  {row['kind']:<5} {size:>10} {duration:>7} {row['codec'] or '':<6} "
+                  f"{row['artist'] or '':<20} {row['name']}"
+                  + (f"  [{row['error']}]" if row['error'] else ''))
+    catalog.close()
+
+
+if __name__ == '__main__':
+    main()
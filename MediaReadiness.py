@@ -0,0 +1,115 @@
+from concurrent.futures import CancelledError, Future, InvalidStateError
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import time
+
+import vlc
+
+
+class MediaLoadError(Exception):
+    """Raised when VLC reports an error while opening or decoding media."""
+
+
+class MediaReadiness:
+    """
+    Resolves a Future as soon as a player has its first frame up, using the
+    libvlc event manager instead of polling will_play() and sleeping.
+
+    The media counts as ready on the first Vout event (a video output now
+    exists and holds a picture). Media without video is ready once it is
+    playing or paused and VLC knows its length. EncounteredError fails the
+    Future with MediaLoadError.
+
+    libvlc must not be called from inside its own event callbacks, so the
+    callbacks only record what happened; detaching happens in close().
+    python-vlc keeps one callback per event type and player, so close the
+    previous MediaReadiness of a player before creating the next one.
+    """
+    EVENTS = (
+        vlc.EventType.MediaPlayerPlaying,
+        vlc.EventType.MediaPlayerPaused,
+        vlc.EventType.MediaPlayerVout,
+        vlc.EventType.MediaPlayerLengthChanged,
+        vlc.EventType.MediaPlayerEncounteredError,
+    )
+
+    def __init__(self, player, media_path=None, expect_video=True):
+        self.player = player
+        self.media_path = media_path
+        self.expect_video = expect_video
+        self.future = Future()
+
+        self.started = False
+        self.length = None
+        # time.monotonic() of the first Vout event, for latency figures
+        self.first_frame_at = None
+
+        self._events = player.event_manager()
+        for event_type in self.EVENTS:
+            self._events.event_attach(event_type, self._on_event)
+
+    def _on_event(self, event):
+        if self.future.done():
+            return
+        try:
+            self._handle(event)
+        except InvalidStateError:
+            # Cancelled from another thread while this event was in flight
+            pass
+
+    def _handle(self, event):
+        event_type = event.type
+        if event_type == vlc.EventType.MediaPlayerEncounteredError:
+            self.future.set_exception(MediaLoadError(f"VLC could not play {self.media_path}"))
+        elif event_type == vlc.EventType.MediaPlayerVout:
+            if event.u.new_count > 0:
+                self.first_frame_at = time.monotonic()
+                self.future.set_result(True)
+        elif event_type in (vlc.EventType.MediaPlayerPlaying, vlc.EventType.MediaPlayerPaused):
+            self.started = True
+            self._check_audio_only()
+        elif event_type == vlc.EventType.MediaPlayerLengthChanged:
+            self.length = event.u.new_length
+            self._check_audio_only()
+
+    def _check_audio_only(self):
+        if not self.expect_video and self.started and self.length:
+            self.future.set_result(True)
+
+    def done(self):
+        return self.future.done()
+
+    def failed(self):
+        return self.future.done() and self.future.exception() is not None
+
+    def wait(self, timeout=None):
+        """
+        Block until the first frame is up. Raises MediaLoadError if VLC
+        reported an error and TimeoutError if nothing happened in time.
+        """
+        try:
+            return self.future.result(timeout)
+        except FutureTimeoutError:
+            raise TimeoutError(f"{self.media_path} had no frame after {timeout}s")
+        except CancelledError:
+            raise TimeoutError(f"Stopped waiting for {self.media_path}")
+
+    def cancel(self):
+        if not self.future.done():
+            self.future.cancel()
+
+    def close(self):
+        for event_type in self.EVENTS:
+            self._events.event_detach(event_type)
+
+
+def play_and_wait(player, media_path=None, timeout=2.0):
+    """
+    Convenience for one-player call sites: attach before play() so no event
+    is missed, wait for the first frame and detach again.
+    """
+    readiness = MediaReadiness(player, media_path)
+    try:
+        player.play()
+        return readiness.wait(timeout)
+    finally:
+        readiness.close()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Per-thread CPU, memory, file descriptor and temperature samples of this
+process, kept in a fixed-size binary ring file.
+
+    python MetricsSampler.py summary [metrics.bin] [--last 3600]
+    python MetricsSampler.py csv     [metrics.bin] [--last 3600] > metrics.csv
+
+Every `interval` seconds the sampler reads /proc/self/task/*/stat,
+/proc/self/smaps_rollup, /proc/self/fd and the SoC thermal zone, and
+appends one RECORD. Per-thread CPU is summed by thread name into
+THREAD_SLOTS columns: Python threads by their threading name, the main
+(Tk) thread as 'main', VLC's threads by their kernel name. The names live
+in the file header, so a later run that sees the same threads reuses the
+same columns; threads that don't fit share the last column, 'other'.
+
+The file holds `retention` seconds of samples and then overwrites the
+oldest, so it never grows. A sample costs a few hundred microseconds of
+CPU; summary shows the sampler's own share.
+"""
+import argparse
+import os
+import struct
+import sys
+import threading
+import time
+
+MAGIC = b'MTRS'
+VERSION = 1
+THREAD_SLOTS = 16
+NAME_BYTES = 24
+# magic, version, interval, capacity, next record, records written
+HEADER = struct.Struct('<4sBfIII')
+NAMES = struct.Struct('<' + f'{NAME_BYTES}s' * THREAD_SLOTS)
+# time, system cpu, process cpu (both per mille of one core), rss kB,
+# pss kB, open fds, temperature in tenths of a degree, sampler cpu in us,
+# then per-thread cpu per mille
+RECORD = struct.Struct('<dHHIIHhI' + 'H' * THREAD_SLOTS)
+DATA_OFFSET = HEADER.size + NAMES.size
+
+THERMAL_ZONE = '/sys/class/thermal/thermal_zone0/temp'
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+###############################################################################
+# /proc readers
+###############################################################################
+def read_ticks(path):
+    """utime + stime of a /proc/.../stat file, in clock ticks."""
+    with open(path, 'rb') as f:
+        fields = f.read().rsplit(b')', 1)[1].split()
+    # Fields 14 and 15, counted after the command name
+    return int(fields[11]) + int(fields[12])
+
+
+def read_system_ticks():
+    """(busy, total) clock ticks of all CPUs since boot."""
+    with open('/proc/stat', 'rb') as f:
+        values = [int(v) for v in f.readline().split()[1:]]
+    idle = values[3] + (values[4] if len(values) > 4 else 0)
+    total = sum(values[:8])
+    return total - idle, total
+
+
+def read_memory():
+    """(rss, pss) of this process in kB. pss is 0 without smaps_rollup."""
+    rss = pss = 0
+    try:
+        with open('/proc/self/smaps_rollup', 'rb') as f:
+            for line in f:
+                if line.startswith(b'Rss:'):
+                    rss = int(line.split()[1])
+                elif line.startswith(b'Pss:'):
+                    pss = int(line.split()[1])
+                    break
+    except OSError:
+        with open('/proc/self/statm', 'rb') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    return rss, pss
+
+
+def read_temperature():
+    """SoC temperature in tenths of a degree, or -1."""
+    try:
+        with open(THERMAL_ZONE, 'rb') as f:
+            return int(f.read()) // 100
+    except (OSError, ValueError):
+        return -1
+
+
+def thread_label(name):
+    # "Thread-3 (_loop)" -> "_loop"
+    if name.startswith('Thread-') and name.endswith(')') and ' (' in name:
+        return name.split(' (', 1)[1][:-1]
+    return name
+
+
+###############################################################################
+# Ring file
+###############################################################################
+class MetricsFile:
+    """The ring file: header, thread name table, then `capacity` RECORDs."""
+    def __init__(self, path, capacity, interval):
+        self.path = path
+        self.capacity = capacity
+        self.interval = interval
+        self.next = 0
+        self.count = 0
+        self.names = [''] * THREAD_SLOTS
+        self.names[-1] = 'other'
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if not self._read_header():
+            # New, foreign or resized file: start over
+            os.ftruncate(self.fd, DATA_OFFSET + capacity * RECORD.size)
+            self._write_header()
+            self._write_names()
+
+    def _read_header(self):
+        data = os.pread(self.fd, DATA_OFFSET, 0)
+        if len(data) < DATA_OFFSET:
+            return False
+        magic, version, _, capacity, next_record, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or capacity != self.capacity:
+            return False
+        self.next, self.count = next_record, count
+        self.names = [raw.rstrip(b'\0').decode('utf-8', 'replace')
+                      for raw in NAMES.unpack_from(data, HEADER.size)]
+        return True
+
+    def _write_header(self):
+        os.pwrite(self.fd, HEADER.pack(MAGIC, VERSION, self.interval, self.capacity,
+                                       self.next, self.count), 0)
+
+    def _write_names(self):
+        raw = [name.encode('utf-8')[:NAME_BYTES] for name in self.names]
+        os.pwrite(self.fd, NAMES.pack(*raw), HEADER.size)
+
+    def slot(self, name):
+        """Column for a thread name, claiming a free one if needed."""
+        try:
+            return self.names.index(name)
+        except ValueError:
+            pass
+        for index, existing in enumerate(self.names[:-1]):
+            if not existing:
+                self.names[index] = name
+                self._write_names()
+                return index
+        return THREAD_SLOTS - 1
+
+    def append(self, values):
+        os.pwrite(self.fd, RECORD.pack(*values), DATA_OFFSET + self.next * RECORD.size)
+        self.next = (self.next + 1) % self.capacity
+        self.count += 1
+        self._write_header()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def read_records(path):
+    """(interval, thread names, records oldest first) of a ring file."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, interval, capacity, next_record, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a metrics file")
+    names = [raw.rstrip(b'\0').decode('utf-8', 'replace') for raw in NAMES.unpack_from(data, HEADER.size)]
+    stored = min(count, capacity)
+    first = next_record if count > capacity else 0
+    records = []
+    for i in range(stored):
+        offset = DATA_OFFSET + ((first + i) % capacity) * RECORD.size
+        records.append(RECORD.unpack_from(data, offset))
+    return interval, names, records
+
+
+###############################################################################
+# Sampler
+###############################################################################
+class MetricsSampler:
+    """
+    Samples this process every `interval` seconds on a daemon thread and
+    appends the samples to a MetricsFile holding `retention` seconds.
+    """
+    def __init__(self, path='metrics.bin', interval=5.0, retention=3 * 24 * 3600):
+        self.interval = interval
+        self.file = MetricsFile(path, max(1, int(retention / interval)), interval)
+        self.samples = 0
+        self.cost = 0.0
+        self._previous = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='metrics', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval)
+        self.file.close()
+
+    def _loop(self):
+        # The first pass only sets the baseline for the CPU deltas
+        self._sample()
+        while not self._stop.wait(self.interval):
+            try:
+                self._sample()
+            except Exception as e:
+                print(f"MetricsSampler: {e}")
+
+    def _thread_names(self):
+        main_id = os.getpid()
+        names = {main_id: 'main'}
+        for thread in threading.enumerate():
+            if thread.native_id is not None and thread.native_id != main_id:
+                names[thread.native_id] = thread_label(thread.name)
+        return names
+
+    def _sample(self):
+        started = time.thread_time()
+        now = time.time()
+        process_ticks = read_ticks('/proc/self/stat')
+        system_ticks = read_system_ticks()
+
+        python_names = self._thread_names()
+        thread_ticks = {}
+        for entry in os.scandir('/proc/self/task'):
+            tid = int(entry.name)
+            try:
+                ticks = read_ticks(f'/proc/self/task/{tid}/stat')
+                name = python_names.get(tid)
+                if name is None:
+                    with open(f'/proc/self/task/{tid}/comm') as f:
+                        name = f.read().strip()
+            except (OSError, ValueError):
+                # Thread exited while we were looking
+                continue
+            thread_ticks[tid] = (name, ticks)
+
+        previous, self._previous = self._previous, (now, process_ticks, system_ticks, thread_ticks)
+        if previous is None:
+            return
+        elapsed = now - previous[0]
+        if elapsed <= 0:
+            return
+
+        def per_mille(ticks):
+            return min(65535, int(ticks / CLOCK_TICKS / elapsed * 1000 + 0.5))
+
+        busy = system_ticks[0] - previous[2][0]
+        total = system_ticks[1] - previous[2][1]
+        system = int(busy / total * 1000 + 0.5) if total > 0 else 0
+
+        threads = [0] * THREAD_SLOTS
+        for tid, (name, ticks) in thread_ticks.items():
+            before = previous[3].get(tid)
+            # A thread started since the last sample counts from zero
+            delta = ticks - before[1] if before is not None else ticks
+            threads[self.file.slot(name)] += delta
+        threads = [per_mille(ticks) for ticks in threads]
+
+        rss, pss = read_memory()
+        fds = len(os.listdir('/proc/self/fd'))
+        temperature = read_temperature()
+        cost_us = int((time.thread_time() - started) * 1e6)
+        self.file.append((now, system, per_mille(process_ticks - previous[1]), rss, pss,
+                          min(fds, 65535), temperature, cost_us, *threads))
+        self.samples += 1
+        self.cost += cost_us / 1e6
+
+    def __str__(self):
+        share = self.cost / (self.samples * self.interval) * 100 if self.samples else 0.0
+        return f"{self.samples} samples, {share:.3f}% CPU spent sampling"
+
+
+###############################################################################
+# Reader
+###############################################################################
+def summarise(interval, names, records):
+    if not records:
+        return "No samples."
+    first, last = records[0][0], records[-1][0]
+    lines = [f"{len(records)} samples every {interval:g}s, "
+             f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(first))} to "
+             f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last))}"]
+
+    def stats(values):
+        values = sorted(values)
+        return sum(values) / len(values), values[int(len(values) * 0.95)], values[-1]
+
+    columns = list(zip(*records))
+    lines.append(f"{'':<24} {'mean':>8} {'p95':>8} {'max':>8}")
+    rows = [
+        ('system CPU %', columns[1], 0.1),
+        ('process CPU %', columns[2], 0.1),
+        ('RSS MB', columns[3], 1 / 1024),
+        ('PSS MB', columns[4], 1 / 1024),
+        ('open fds', columns[5], 1),
+        ('temperature C', [t for t in columns[6] if t >= 0], 0.1),
+        ('sampler CPU ms', columns[7], 1e-3),
+    ]
+    for label, values, scale in rows:
+        if values:
+            mean, p95, peak = stats(values)
+            lines.append(f"{label:<24} {mean * scale:>8.1f} {p95 * scale:>8.1f} {peak * scale:>8.1f}")
+
+    lines.append('')
+    lines.append(f"{'thread CPU % of one core':<24} {'mean':>8} {'p95':>8} {'max':>8}")
+    threads = []
+    for slot, name in enumerate(names):
+        if name:
+            threads.append((stats(columns[8 + slot]), name))
+    for (mean, p95, peak), name in sorted(threads, reverse=True):
+        if peak:
+            lines.append(f"{name:<24} {mean / 10:>8.1f} {p95 / 10:>8.1f} {peak / 10:>8.1f}")
+
+    cost = sum(columns[7]) / 1e6 / (len(records) * interval) * 100
+    lines.append(f"\nSampler overhead: {cost:.3f}% of one core")
+    return '\n'.join(lines)
+
+
+def write_csv(names, records, out):
+    used = [(slot, name) for slot, name in enumerate(names) if name]
+    out.write(','.join(['time', 'system_cpu', 'process_cpu', 'rss_kb', 'pss_kb', 'fds',
+                        'temperature', 'sampler_us'] + [name for _, name in used]) + '\n')
+    for record in records:
+        values = [time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record[0])),
+                  f"{record[1] / 10:.1f}", f"{record[2] / 10:.1f}", str(record[3]), str(record[4]),
+                  str(record[5]), f"{record[6] / 10:.1f}" if record[6] >= 0 else '', str(record[7])]
+        values += [f"{record[8 + slot] / 10:.1f}" for slot, _ in used]
+        out.write(','.join(values) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarise a MetricsSampler file.')
+    parser.add_argument('command', choices=['summary', 'csv'])
+    parser.add_argument('path', nargs='?', default='metrics.bin')
+    parser.add_argument('--last', type=float, help='only the last N seconds')
+    args = parser.parse_args()
+
+    interval, names, records = read_records(args.path)
+    if args.last and records:
+        since = records[-1][0] - args.last
+        records = [record for record in records if record[0] >= since]
+    if args.command == 'summary':
+        print(summarise(interval, names, records))
+    else:
+        write_csv(names, records, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
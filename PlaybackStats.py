@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Per-file playback statistics from libvlc's media stats, kept across runs.
+
+While a video plays, sample() reads Media.get_stats() every few seconds;
+finish() takes a last reading when it is swapped out. The counters of one
+play (decoded, displayed and lost pictures, played and lost audio buffers,
+bytes demuxed, corrupted and discontinuous demux blocks) are added to the
+file's row in a small SQLite database, together with the time played and
+the highest demux bitrate seen. Database writes happen on a thread of
+their own, never on the caller's.
+
+    python PlaybackStats.py report [--by drops|bitrate] [--limit 20]
+    python PlaybackStats.py reset
+"""
+import argparse
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'playback_stats.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS playback (
+    path                TEXT PRIMARY KEY,
+    plays               INTEGER NOT NULL,
+    seconds             REAL NOT NULL,
+    decoded_video       INTEGER NOT NULL,
+    displayed           INTEGER NOT NULL,
+    lost_pictures       INTEGER NOT NULL,
+    decoded_audio       INTEGER NOT NULL,
+    played_abuffers     INTEGER NOT NULL,
+    lost_abuffers       INTEGER NOT NULL,
+    demux_bytes         INTEGER NOT NULL,
+    demux_corrupted     INTEGER NOT NULL,
+    demux_discontinuity INTEGER NOT NULL,
+    peak_kbps           REAL NOT NULL,
+    last_played         REAL NOT NULL
+);
+"""
+
+# Summed over plays; libvlc_media_stats_t field -> column
+COUNTERS = {
+    'decoded_video': 'decoded_video',
+    'displayed_pictures': 'displayed',
+    'lost_pictures': 'lost_pictures',
+    'decoded_audio': 'decoded_audio',
+    'played_abuffers': 'played_abuffers',
+    'lost_abuffers': 'lost_abuffers',
+    'demux_read_bytes': 'demux_bytes',
+    'demux_corrupted': 'demux_corrupted',
+    'demux_discontinuity': 'demux_discontinuity',
+}
+
+# ORDER BY of the report
+RANKINGS = {
+    'drops': 'drop_ratio DESC, mean_kbps DESC',
+    'bitrate': 'mean_kbps DESC, drop_ratio DESC',
+}
+
+
+def read_stats(media):
+    """The media's counters as a dict (demux_kbps included), or None."""
+    import vlc
+
+    stats = vlc.MediaStats()
+    if not media.get_stats(stats):
+        return None
+    values = {field: getattr(stats, field) for field in COUNTERS}
+    # libvlc bitrates are in bytes per microsecond
+    values['demux_kbps'] = stats.demux_bitrate * 8000
+    return values
+
+
+class Play:
+    """
+    One play of one file: the counters when it started, the newest ones and
+    the peak bitrate. A pre-rolled player that is shown again keeps its
+    input, so its counters run on from the last play; only the difference
+    to `baseline` belongs to this one.
+    """
+    __slots__ = ('path', 'media', 'started', 'baseline', 'counters', 'peak_kbps')
+
+    def __init__(self, path, media, baseline=None):
+        self.path = path
+        self.media = media
+        self.started = time.monotonic()
+        self.baseline = baseline
+        self.counters = None
+        self.peak_kbps = 0.0
+
+    def totals(self):
+        """This play's share of each counter."""
+        baseline = self.baseline or {}
+        return {field: max(0, self.counters[field] - baseline.get(field, 0)) for field in COUNTERS}
+
+    def update(self, values):
+        if values is None:
+            return
+        self.peak_kbps = max(self.peak_kbps, values['demux_kbps'])
+        # The counters only grow while the input lives; once it is torn
+        # down they may read back as zero, so keep the larger reading
+        if self.counters is None or values['decoded_video'] >= self.counters['decoded_video']:
+            self.counters = values
+
+
+class PlaybackStats:
+    """
+    Collects one Play at a time. start() when a video starts, sample() at
+    `interval` seconds while it plays, finish() when it is swapped out.
+    All three are meant for the Tk thread; the database is written on a
+    background thread.
+    """
+    def __init__(self, db_path=DEFAULT_DB, interval=2.0):
+        self.db_path = db_path
+        self.interval = interval
+        self.current = None
+        self.recorded = 0
+
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name='playback-stats', daemon=True)
+        self._thread.start()
+
+    @property
+    def interval_ms(self):
+        return int(self.interval * 1000)
+
+    def start(self, path, media):
+        self.finish()
+        try:
+            baseline = read_stats(media)
+        except Exception as e:
+            print(f"PlaybackStats: {e}")
+            baseline = None
+        self.current = Play(path, media, baseline)
+
+    def sample(self):
+        if self.current is not None:
+            try:
+                self.current.update(read_stats(self.current.media))
+            except Exception as e:
+                print(f"PlaybackStats: {e}")
+
+    def finish(self):
+        """Take a last reading of the current play and record it."""
+        play, self.current = self.current, None
+        if play is None:
+            return
+        try:
+            play.update(read_stats(play.media))
+        except Exception as e:
+            print(f"PlaybackStats: {e}")
+        if play.counters is None:
+            return
+        totals = play.totals()
+        row = {column: totals[field] for field, column in COUNTERS.items()}
+        row.update(path=play.path, plays=1, seconds=time.monotonic() - play.started,
+                   peak_kbps=play.peak_kbps, last_played=time.time())
+        self._jobs.put(row)
+        self.recorded += 1
+
+    def close(self):
+        self.finish()
+        self._jobs.put(None)
+        self._thread.join(timeout=2.0)
+
+    def _loop(self):
+        db = connect(self.db_path)
+        columns = ['path', 'plays', 'seconds', *COUNTERS.values(), 'peak_kbps', 'last_played']
+        summed = ['plays', 'seconds', *COUNTERS.values()]
+        statement = (
+            f"INSERT INTO playback ({', '.join(columns)}) "
+            f"VALUES ({', '.join(':' + c for c in columns)}) "
+            f"ON CONFLICT (path) DO UPDATE SET "
+            + ', '.join(f"{c} = {c} + excluded.{c}" for c in summed)
+            + ", peak_kbps = MAX(peak_kbps, excluded.peak_kbps), last_played = excluded.last_played")
+        while True:
+            row = self._jobs.get()
+            if row is None:
+                break
+            try:
+                with db:
+                    db.execute(statement, row)
+            except sqlite3.Error as e:
+                print(f"PlaybackStats: could not record {row['path']}: {e}")
+        db.close()
+
+    def __str__(self):
+        return f"{self.recorded} plays recorded to {self.db_path}"
+
+
+def connect(db_path=DEFAULT_DB):
+    db = sqlite3.connect(db_path)
+    db.row_factory = sqlite3.Row
+    db.execute('PRAGMA journal_mode=WAL')
+    db.executescript(SCHEMA)
+    return db
+
+
+def report(db_path=DEFAULT_DB, by='drops', limit=None):
+    """
+    Rows per file with drop_ratio (lost / (displayed + lost) pictures),
+    mean_kbps (demuxed bytes over time played) and the raw sums, worst first.
+    """
+    db = connect(db_path)
+    query = (
+        "SELECT *, "
+        "CAST(lost_pictures AS REAL) / MAX(1, displayed + lost_pictures) AS drop_ratio, "
+        "CAST(lost_abuffers AS REAL) / MAX(1, played_abuffers + lost_abuffers) AS audio_loss, "
+        "demux_bytes * 8 / 1000.0 / MAX(seconds, 0.001) AS mean_kbps "
+        f"FROM playback ORDER BY {RANKINGS[by]}")
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    rows = [dict(row) for row in db.execute(query)]
+    db.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rank media by playback statistics.')
+    parser.add_argument('--db', default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('report', help='files ranked by dropped frames or bitrate')
+    p.add_argument('--by', choices=sorted(RANKINGS), default='drops')
+    p.add_argument('--limit', type=int)
+    sub.add_parser('reset', help='forget every recorded play')
+    args = parser.parse_args()
+
+    if args.command == 'reset':
+        db = connect(args.db)
+        with db:
+            db.execute('DELETE FROM playback')
+        db.close()
+        return
+
+    rows = report(args.db, args.by, args.limit)
+    if not rows:
+        print("No plays recorded yet.")
+        return
+    print(f"{'file':<44} {'plays':>5} {'minutes':>7} {'decoded':>8} {'lost':>6} {'drop %':>6} "
+          f"{'audio %':>7} {'kbps':>6} {'peak':>6} {'corrupt':>7}")
+    for row in rows:
+        name = os.path.basename(row['path'])
+        if len(name) > 44:
+            name = name[:41] + '...'
+        print(f"{name:<44} {row['plays']:>5} {row['seconds'] / 60:>7.1f} {row['decoded_video']:>8} "
+              f"{row['lost_pictures']:>6} {row['drop_ratio'] * 100:>6.2f} {row['audio_loss'] * 100:>7.2f} "
+              f"{row['mean_kbps']:>6.0f} {row['peak_kbps']:>6.0f} {row['demux_corrupted']:>7}")
+
+
+if __name__ == '__main__':
+    main()
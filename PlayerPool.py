@@ -0,0 +1,295 @@
+import os
+import queue
+import threading
+import time
+
+import vlc
+
+from LatencyTracker import latency
+from Tracer import tracer
+from MediaReadiness import MediaReadiness
+
+
+class PoolSlot:
+    """
+    One VLC MediaPlayer that renders into its own viewer surface.
+    The slot remembers which playlist index it holds and whether that
+    media has been pre-rolled up to its first frame.
+    """
+    def __init__(self, instance, surface):
+        self.player = instance.media_player_new()
+        self.surface = surface
+        self.player.set_xwindow(surface.winfo_id())
+        self._attached = threading.Event()
+
+        self.index = None
+        self.path = None
+        self.generation = 0
+        self.readiness = None
+
+    def wait_ready(self, timeout):
+        """
+        Wait until the slot's media has its first frame up. Raises
+        MediaLoadError or TimeoutError like MediaReadiness.wait().
+        """
+        # The loader may not have attached a MediaReadiness yet
+        if not self._attached.wait(timeout):
+            raise TimeoutError(f"{self.path} was not opened in time")
+        readiness = self.readiness
+        if readiness is None:
+            raise TimeoutError(f"{self.path} was reassigned while waiting")
+        return readiness.wait(timeout)
+
+    def is_loaded(self):
+        return self.readiness is not None and self.readiness.done()
+
+    def needs_reload(self):
+        # Images end after --image-duration and videos end at their last
+        # frame, either way the slot has to be opened again before reuse
+        state = self.player.get_state()
+        return state in (vlc.State.Ended, vlc.State.Stopped, vlc.State.Error)
+
+
+class PlayerPool:
+    """
+    Keeps the current playlist item and its next/previous `radius` neighbours
+    opened, demuxed and paused on their first frame, each on its own player.
+    Moving through the playlist then only has to raise an already rendered
+    surface instead of starting the media from scratch.
+    """
+    def __init__(self, instance, viewer, media_files, radius=1, setup_player=None, setup_media=None):
+        self.instance = instance
+        self.viewer = viewer
+        self.media_files = media_files
+        self.radius = max(0, radius)
+
+        # Optional hooks so the owner can configure marquee, audio, etc.
+        self.setup_player = setup_player
+        self.setup_media = setup_media
+
+        # The current item, 2 * radius neighbours and one spare so an
+        # outgoing player can finish its fade while the new window loads
+        self.slots = []
+        for _ in range(2 * self.radius + 2):
+            slot = PoolSlot(self.instance, self.viewer.create_surface())
+            if callable(self.setup_player):
+                self.setup_player(slot.player)
+            self.slots.append(slot)
+
+        self.pinned = set()
+        self.center = None
+        self._speculation = 0
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._running = True
+        self._thread = threading.Thread(target=self._loader_loop, name='pool-loader', daemon=True)
+        self._thread.start()
+
+    def wanted_indices(self, index):
+        """Playlist indices to keep loaded around `index`, nearest first."""
+        count = len(self.media_files)
+        wanted = [index % count]
+        for distance in range(1, self.radius + 1):
+            for candidate in ((index + distance) % count, (index - distance) % count):
+                if candidate not in wanted:
+                    wanted.append(candidate)
+        return wanted
+
+    def slot_for(self, index):
+        with self._lock:
+            for slot in self.slots:
+                if slot.index == index:
+                    return slot
+        return None
+
+    def focus(self, index):
+        """
+        Make `index` the centre of the pool and queue pre-rolls for its
+        neighbours. Returns the slot that holds (or is loading) `index`.
+        """
+        wanted = self.wanted_indices(index)
+        loads = []
+        with self._lock:
+            self.center = index % len(self.media_files)
+            held = {slot.index: slot for slot in self.slots if slot.index is not None}
+            free = [slot for slot in self.slots
+                    if slot.index not in wanted and id(slot) not in self.pinned]
+
+            for wanted_index in wanted:
+                slot = held.get(wanted_index)
+                if slot is not None:
+                    if slot.is_loaded() and (slot.readiness.failed() or slot.needs_reload()):
+                        loads.append(self._assign(slot, wanted_index))
+                    continue
+                if not free:
+                    print(f"PlayerPool: no free slot for index {wanted_index}")
+                    break
+                slot = free.pop(0)
+                loads.append(self._assign(slot, wanted_index))
+
+        for job in loads:
+            self._jobs.put(job)
+        return self.slot_for(index % len(self.media_files))
+
+    def speculate(self, indices):
+        """
+        Pre-roll likely upcoming indices (nearest first) into slots outside
+        the current neighbourhood, without evicting the current item or its
+        neighbours. Replaces any earlier speculation that hasn't started.
+        """
+        count = len(self.media_files)
+        indices = [i % count for i in indices]
+        loads = []
+        with self._lock:
+            self._speculation += 1
+            token = self._speculation
+            keep = set(self.wanted_indices(self.center)) if self.center is not None else set()
+            held = {slot.index for slot in self.slots}
+            free = [slot for slot in self.slots
+                    if slot.index not in keep and slot.index not in indices
+                    and id(slot) not in self.pinned]
+            for index in indices:
+                if index in held or index in keep:
+                    continue
+                if not free:
+                    break
+                slot = free.pop(0)
+                held.add(index)
+                loads.append(self._assign(slot, index) + (token,))
+        for job in loads:
+            self._jobs.put(job)
+
+    def cancel_speculation(self):
+        # Cheap: queued speculative pre-rolls are skipped, one that already
+        # started simply stays loaded until its slot is needed
+        with self._lock:
+            self._speculation += 1
+
+    def pin(self, slot):
+        # Pinned slots are on screen (or fading out) and never get reassigned
+        with self._lock:
+            self.pinned.add(id(slot))
+
+    def unpin(self, slot):
+        with self._lock:
+            self.pinned.discard(id(slot))
+
+    def playlist_changed(self, invalidated=()):
+        """
+        The playlist list was edited in place (files added or removed), or
+        the files in `invalidated` changed on disk. Re-point every slot at
+        its item's new index; slots whose item is gone or stale are freed
+        so the next focus() loads them again. A pinned slot keeps playing
+        until it leaves the screen, but no longer counts as holding its item.
+        """
+        positions = {path: index for index, path in enumerate(self.media_files)}
+        with self._lock:
+            for slot in self.slots:
+                if slot.path is None:
+                    continue
+                index = positions.get(slot.path)
+                if slot.path in invalidated:
+                    index = None
+                if index is not None or id(slot) in self.pinned:
+                    slot.index = index
+                    continue
+                slot.generation += 1
+                slot.index = None
+                slot.path = None
+                if slot.readiness is not None:
+                    slot.readiness.cancel()
+                    slot.readiness.close()
+                slot.readiness = None
+                slot._attached.clear()
+            if self.center is not None and self.media_files:
+                self.center %= len(self.media_files)
+
+    def _assign(self, slot, index):
+        slot.generation += 1
+        slot.index = index
+        slot.path = self.media_files[index]
+        if slot.readiness is not None:
+            slot.readiness.cancel()
+            slot.readiness.close()
+        slot.readiness = None
+        slot._attached.clear()
+        return (slot, slot.generation)
+
+    def _release(self, slot, generation):
+        with self._lock:
+            if generation == slot.generation:
+                slot.generation += 1
+                slot.index = None
+                slot.path = None
+
+    def _loader_loop(self):
+        while self._running:
+            job = self._jobs.get()
+            if job is None:
+                break
+            slot, generation = job[:2]
+            if generation != slot.generation:
+                # Reassigned before we got to it
+                continue
+            if len(job) > 2 and job[2] != self._speculation:
+                # A speculation that was cancelled or replaced
+                self._release(slot, generation)
+                continue
+            self._preroll(slot, generation)
+
+    def _preroll(self, slot, generation):
+        path = slot.path
+        print(f"PlayerPool: pre-rolling {os.path.basename(path)}")
+        player = slot.player
+        with tracer.span('preroll.stop'):
+            player.stop()
+
+        start = time.monotonic()
+        with tracer.span('preroll.media_new', {'path': path}):
+            media = self.instance.media_new(path)
+            # Open, demux and decode up to the first frame, then hold there
+            media.add_option(':start-paused')
+            if callable(self.setup_media):
+                self.setup_media(player, media, path)
+        created = time.monotonic()
+        latency.record('preroll.media_new', created - start)
+        with tracer.span('preroll.set_media'):
+            player.set_media(media)
+            player.audio_set_volume(0)
+        latency.mark('preroll.set_media', created)
+
+        # Attach before play() so the first Vout event cannot be missed.
+        # The loader does not wait for it and moves straight on to the next
+        # pre-roll; whoever needs the slot waits on its readiness future.
+        with self._lock:
+            if generation != slot.generation:
+                return
+            readiness = slot.readiness = MediaReadiness(player, path)
+            slot._attached.set()
+        play_at = time.monotonic()
+        with tracer.span('preroll.play'):
+            player.play()
+        latency.mark('preroll.play', play_at)
+
+        def first_frame(future):
+            # Runs on VLC's event thread, so only plain Python in here
+            if readiness.first_frame_at is not None:
+                latency.mark('preroll.vout', play_at, readiness.first_frame_at)
+        readiness.future.add_done_callback(first_frame)
+
+    @tracer.traced('pool.rewind')
+    def rewind(self, slot):
+        """Put a slot that just left the screen back on its first frame."""
+        player = slot.player
+        player.audio_set_volume(0)
+        if player.get_state() == vlc.State.Playing:
+            player.set_pause(1)
+        player.set_time(0)
+
+    def stop(self):
+        self._running = False
+        self._jobs.put(None)
+        for slot in self.slots:
+            if slot.readiness is not None:
+                slot.readiness.close()
+            slot.player.stop()
@@ -1,11 +1,34 @@
 import vlc
 import tkinter as tk
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import time
 import os
 
+from FrameCache import FrameCache
+from ImageCache import ImageCache
+from ExhibitWatcher import ExhibitWatcher, apply_delta, ADDED, MODIFIED, REMOVED, RESCAN
+from MediaCatalog import MediaCatalog, load_playlist
+from ImageDecoder import ImageDecoder
+from IOPrefetcher import IOPrefetcher
+from PlaybackStats import PlaybackStats
+from LatencyTracker import latency
+from VlcLogPipeline import vlc_log
+from Tracer import tracer
+
+# Logging goes through vlc_log (filtered, rate-limited, written in the
+# background) instead of VLC's synchronous --file-logging
+VLC_ARGS = (
+    '--avcodec-hw', 'none',
+    '--verbose=2',
+)
+
+def create_instance():
+    return vlc_log.attach(vlc.Instance(*VLC_ARGS))
+
 class SlideShow:
-    def __init__(self, viewer, controller, media_folder):
+    def __init__(self, viewer, controller, media_folder, instance=None, media_files=None, catalog=None):
+        # instance, media_files and catalog can be prepared concurrently by
+        # the caller (see MainLoop's fast start), otherwise they're made here
                 
         #Reference Viewer
         self.viewer = viewer
@@ -14,6 +37,8 @@ class SlideShow:
         self.controller = controller
         self.controller.incrementCallback = self.increment_media_index
         self.controller.decrementCallback = self.decrement_media_index
+        self.controller.navigateCallback = self.navigate
+        self.controller.hintCallback = self.hint
         self.startCallback = self.display_media
         self.controller.quitCallback = self.stop
         
@@ -24,22 +49,38 @@ class SlideShow:
         # self.instance = vlc.Instance( '--avcodec-hw=none','--verbose=2', '--file-logging', '--logfile=vlc.log')
         #self.instance = vlc.Instance('--avcodec-hw=none', '--verbose=2', '--file-logging', '--logfile=vlc.log')
 
-        self.instance = vlc.Instance(
-            '--avcodec-hw', 'none',
-            '--verbose=2',
-            '--file-logging',
-            '--logfile=vlc.log'
-        )
+        self.instance = instance if instance is not None else create_instance()
 
 
         self.player = self.instance.media_player_new()
         
         #Media
         self.media_folder = media_folder
-        self.media_files = self.load_media_locations(self.media_folder)
+        self.catalog = catalog if catalog is not None else MediaCatalog()
+        if media_files is None:
+            media_files = self.load_media_locations(self.media_folder)
+        self.media_files = media_files
+
+        #Decoded, window-sized images by (path, mtime, size)
+        self.image_cache = ImageCache()
+        self.viewer.window.bind('<Configure>', self.on_configure)
+        #Upcoming images are decoded in the background at reduced scale,
+        #or mapped from the on-disk frame cache if decoded before
+        self.decoder = ImageDecoder(frame_cache=FrameCache())
+        self.prefetch_radius = 2
+        #Videos (and images beyond the decode radius) are read ahead into the page cache
+        self.io_prefetcher = IOPrefetcher(self.media_files, radius=self.prefetch_radius + 1)
+
+        #Decoded/lost frames and bitrate of every play, summed per file
+        self.playback_stats = PlaybackStats()
+        self.viewer.root.after(self.playback_stats.interval_ms, self.sample_playback_stats)
 
         #Controls
         self.current_media_index = 0
+
+        #Files copied into (or removed from) the exhibit show up live
+        self.watcher = ExhibitWatcher(self.media_folder, self.on_media_change, known=self.media_files)
+        self.watcher.start()
     
         #Start the show
         self.display_media()
@@ -55,11 +96,22 @@ class SlideShow:
     def decrement_media_index(self):
         self.viewer.root.after(0, self.run_decrement)
     
+    def navigate(self, command):
+        # One whole knob gesture, only the final target gets loaded
+        latency.mark('callback', command.origin)
+        self.viewer.root.after(0, self.run_navigate, command.steps, command.origin)
+    
+    def run_navigate(self, steps, origin=None):
+        self.current_media_index = (self.current_media_index + steps) % len(self.media_files)
+        self.display_media()
+        latency.mark('shown', origin)
+    
     def run_decrement(self):
         #TODO: Possibly make it so that it can't go further back than the beginning
         self.current_media_index = (self.current_media_index - 1) % len(self.media_files)
         self.display_media()
     
+    @tracer.traced('display_media')
     def display_media(self):
         """
         Called to move to the next media (video or image).
@@ -69,12 +121,54 @@ class SlideShow:
             print("Display request ignored: currently transitioning.")
             return
         
+        # Last reading of whatever is being swapped out
+        self.playback_stats.finish()
+        
         media_path = self.media_files[self.current_media_index]
         print('displaying:', media_path) #debugging
         if media_path.endswith(('.png', '.jpg', '.jpeg')):
             self.show_image(media_path)
         elif media_path.endswith(('.mp4', '.mkv', '.mov', '.gif')):
             self.play_video(media_path)
+        
+        self.prefetch_neighbours()
+    
+    def hint(self, direction, steps):
+        # The encoder says where a turn is heading, start decoding it now
+        if direction != 0:
+            target = self.current_media_index + direction * steps
+            self.io_prefetcher.prefetch([target])
+            self.viewer.root.after(0, self.prefetch_image, target)
+    
+    def prefetch_neighbours(self):
+        self.io_prefetcher.focus(self.current_media_index)
+        indices = [self.current_media_index + d for d in range(-self.prefetch_radius, self.prefetch_radius + 1)]
+        paths = {self.media_files[i % len(self.media_files)] for i in indices}
+        self.decoder.retain(paths)
+        # Nearest first, next before previous
+        for distance in range(1, self.prefetch_radius + 1):
+            self.prefetch_image(self.current_media_index + distance)
+            self.prefetch_image(self.current_media_index - distance)
+    
+    def prefetch_image(self, index):
+        media_path = self.media_files[index % len(self.media_files)]
+        if not media_path.endswith(('.png', '.jpg', '.jpeg')):
+            return
+        size = self.window_size()
+        if self.image_cache.get(media_path, size) is not None:
+            return
+        future = self.decoder.prefetch(media_path, size)
+        # Build the PhotoImage on the Tk thread as soon as the decode is done,
+        # so showing it later is a pure blit
+        future.add_done_callback(
+            lambda f: self.viewer.root.after(0, self._cache_decoded, media_path, size, f))
+    
+    def _cache_decoded(self, media_path, size, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        if size != self.window_size() or self.image_cache.get(media_path, size) is not None:
+            return
+        self.image_cache.put(media_path, size, ImageTk.PhotoImage(future.result()))
     
     def play_video(self, media_path):
 
@@ -87,16 +181,24 @@ class SlideShow:
         """
         Actually start playing the next video after the transition delay.
         """
-        media = self.instance.media_new(media_path)
-        self.player.set_media(media)
+        with tracer.span('media_new', {'path': media_path}):
+            media = self.instance.media_new(media_path)
+        with tracer.span('set_media'):
+            self.player.set_media(media)
         
         self.player.set_xwindow(self.viewer.get_window_id())
         self.viewer.show_video()
-        self.player.play()
+        with tracer.span('play'):
+            self.player.play()
+        self.playback_stats.start(media_path, media)
         
         # End transition
         self.transitioning = False
         
+    def sample_playback_stats(self):
+        self.playback_stats.sample()
+        self.viewer.root.after(self.playback_stats.interval_ms, self.sample_playback_stats)
+    
     def _finish_video_transition(self, media_path):
         """
         Actually start playing the next video after the transition delay.
@@ -112,31 +214,78 @@ class SlideShow:
         self.transitioning = False
         
     def show_image(self, media_path):
-        self.player.stop()
+        with tracer.span('player.stop'):
+            self.player.stop()
         
         print('showing image:', media_path) #debugging
-        image = Image.open(media_path)
         self.viewer.window.update_idletasks()
-        resized_image = self.resize_photo(image)
+        size = self.window_size()
+        self.image_cache.set_geometry(size)
 
-        photo = ImageTk.PhotoImage(resized_image)
+        # Revisiting a recent image is just a blit of the cached photo
+        photo = self.image_cache.get(media_path, size)
+        if photo is None:
+            # Reduced-scale decode, or the prefetch that is already running
+            with tracer.span('decode', {'path': media_path}):
+                resized_image = self.decoder.get(media_path, size)
+
+            with tracer.span('photo_image'):
+                photo = ImageTk.PhotoImage(resized_image)
+            self.image_cache.put(media_path, size, photo)
         
         self.viewer.show_image(photo)
 
     def load_media_locations(self, media_folder):
-        media_files = [os.path.join(media_folder, f) for f in os.listdir(media_folder) if f.endswith(('.mp4', '.mkv', '.mov', '.avi', '.png', '.jpg', '.jpeg', '.gif'))]
-       
-        #sort the files in the folder alphabetically
-        media_files.sort()
-        if not media_files:
-            raise FileNotFoundError(f"No media files found in the folder: {media_folder}")
-        return media_files
+        # Sorted playlist from the media catalog, only new or changed files get probed
+        return load_playlist(media_folder, catalog=self.catalog)
+    
+    def on_media_change(self, kind, path):
+        # Watcher thread: probe the file here, touch the playlist on the Tk thread
+        if kind in (ADDED, MODIFIED):
+            self.catalog.update_file(path)
+        elif kind == REMOVED:
+            self.catalog.remove_file(path)
+        elif kind == RESCAN:
+            self.catalog.refresh(self.media_folder)
+        self.viewer.root.after(0, self.apply_media_change, kind, path)
+    
+    def apply_media_change(self, kind, path):
+        print(f"Exhibit {kind}: {os.path.basename(path)}")
+        current_path = self.media_files[self.current_media_index] if self.media_files else None
+        if kind == MODIFIED:
+            # Drop every decoded copy of the old content
+            self.image_cache.invalidate(path)
+            self.decoder.forget(path)
+            self.decoder.frame_cache.invalidate(path)
+        elif kind == RESCAN:
+            self.media_files[:] = self.catalog.playlist(self.media_folder)
+            if current_path in self.media_files:
+                self.current_media_index = self.media_files.index(current_path)
+            else:
+                self.current_media_index = 0
+        else:
+            self.current_media_index = apply_delta(self.media_files, self.current_media_index, kind, path)
+        
+        if not self.media_files:
+            print("Exhibit folder is empty.")
+            return
+        if self.media_files[self.current_media_index] != current_path or path == current_path:
+            # What was on screen was removed or replaced
+            self.display_media()
+        else:
+            self.prefetch_neighbours()
     
     def stop(self, optional_event=None):
+        tracer.save()
+        self.playback_stats.close()
         self.player.stop()
+        self.watcher.stop()
+        self.io_prefetcher.stop()
+        self.decoder.shutdown()
+        vlc_log.detach()
         self.viewer.quit()
         
-    def resize_photo(self, image):
+    def window_size(self):
         # Get the dimensions of the window
         window_width = self.viewer.window.winfo_width()
         window_height = self.viewer.window.winfo_height()
@@ -144,26 +293,8 @@ class SlideShow:
         if window_width < 5 or window_height < 5:
             window_width = 800
             window_height = 600
-        
-        # Get the dimensions of the image
-        image_width, image_height = image.size
-        
-        # Calculate the aspect ratios
-        window_aspect = window_width / window_height
-        image_aspect = image_width / image_height
-        
-        # Determine the scaling factor
-        if window_aspect > image_aspect:
-            # Window is wider than the image
-            scale_factor = window_height / image_height
-        else:
-            # Window is taller than the image
-            scale_factor = window_width / image_width
-        
-        # Calculate the new dimensions of the image
-        new_width = int(image_width * scale_factor)
-        new_height = int(image_height * scale_factor)
-        
-        # Resize the image
-        resized_image = image.resize((new_width, new_height))
-        return resized_image
\ No newline at end of file
+        return window_width, window_height
+    
+    def on_configure(self, event):
+        # The window changed size: cached images are scaled for the old one
+        self.image_cache.set_geometry(self.window_size())
@@ -4,7 +4,8 @@ import cv2
 import numpy as np
 from PIL import Image, ImageTk
 import time
-import os
+
+from MediaCatalog import load_playlist
 
 class SlideShow:
     def __init__(self, root, media_folder, run_duration=3000):
@@ -56,10 +57,7 @@ class SlideShow:
         self.player.play()
 
     def load_media_locations(self, media_folder):
-        media_files = [os.path.join(media_folder, f) for f in os.listdir(media_folder) if f.endswith(('.mp4', '.mkv', '.mov', '.avi', '.png', '.jpg', '.jpeg', '.gif'))]
-        if not media_files:
-            raise FileNotFoundError(f"No media files found in the folder: {media_folder}")
-        return media_files
+        return load_playlist(media_folder)
     
     def quit(self, optional_event=None):
         self.player.stop()
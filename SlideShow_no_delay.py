@@ -2,10 +2,15 @@ import vlc
 import tkinter as tk
 import cv2
 import numpy as np
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import time
 import os
 
+from ImageCache import ImageCache
+from MediaCatalog import load_playlist
+from ImageDecoder import decode_pil
+from VlcLogPipeline import vlc_log
+
 class SlideShow:
     def __init__(self, viewer, controller, media_folder):
                 
@@ -21,13 +26,17 @@ class SlideShow:
         
         #VLC Setup
         # self.instance = vlc.Instance('--input-repeat=999999')
-        self.instance = vlc.Instance('--verbose=2', '--file-logging', '--logfile=vlc.log', '--avcodec-hw=none')
+        self.instance = vlc_log.attach(vlc.Instance('--verbose=2', '--avcodec-hw=none'))
         self.player = self.instance.media_player_new()
         
         #Media
         self.media_folder = media_folder
         self.media_files = self.load_media_locations(self.media_folder)
 
+        #Decoded, window-sized images by (path, mtime, size)
+        self.image_cache = ImageCache()
+        self.viewer.window.bind('<Configure>', self.on_configure)
+
         #Controls
         self.current_media_index = 0
         self.current_media_is_video = False
@@ -68,28 +77,31 @@ class SlideShow:
         self.player.stop()
         
         print('showing image:', media_path) #debugging
-        image = Image.open(media_path)
         self.viewer.window.update_idletasks()
-        resized_image = self.resize_photo(image)
+        size = self.window_size()
+        self.image_cache.set_geometry(size)
+
+        # Revisiting a recent image is just a blit of the cached photo
+        photo = self.image_cache.get(media_path, size)
+        if photo is None:
+            # Decode straight to (about) window size instead of full resolution
+            resized_image = decode_pil(media_path, size)
 
-        photo = ImageTk.PhotoImage(resized_image)
+            photo = ImageTk.PhotoImage(resized_image)
+            self.image_cache.put(media_path, size, photo)
         
         self.viewer.show_image(photo)
 
     def load_media_locations(self, media_folder):
-        media_files = [os.path.join(media_folder, f) for f in os.listdir(media_folder) if f.endswith(('.mp4', '.mkv', '.mov', '.avi', '.png', '.jpg', '.jpeg', '.gif'))]
-       
-        #sort the files in the folder alphabetically
-        media_files.sort()
-        if not media_files:
-            raise FileNotFoundError(f"No media files found in the folder: {media_folder}")
-        return media_files
+        # Sorted playlist from the media catalog, only new or changed files get probed
+        return load_playlist(media_folder)
     
     def stop(self, optional_event=None):
         self.player.stop()
+        vlc_log.detach()
         self.viewer.quit()
         
-    def resize_photo(self, image):
+    def window_size(self):
         # Get the dimensions of the window
         window_width = self.viewer.window.winfo_width()
         window_height = self.viewer.window.winfo_height()
@@ -97,29 +109,11 @@ class SlideShow:
         if window_width < 5 or window_height < 5:
             window_width = 800
             window_height = 600
-        
-        # Get the dimensions of the image
-        image_width, image_height = image.size
-        
-        # Calculate the aspect ratios
-        window_aspect = window_width / window_height
-        image_aspect = image_width / image_height
-        
-        # Determine the scaling factor
-        if window_aspect > image_aspect:
-            # Window is wider than the image
-            scale_factor = window_height / image_height
-        else:
-            # Window is taller than the image
-            scale_factor = window_width / image_width
-        
-        # Calculate the new dimensions of the image
-        new_width = int(image_width * scale_factor)
-        new_height = int(image_height * scale_factor)
-        
-        # Resize the image
-        resized_image = image.resize((new_width, new_height))
-        return resized_image
+        return window_width, window_height
+    
+    def on_configure(self, event):
+        # The window changed size: cached images are scaled for the old one
+        self.image_cache.set_geometry(self.window_size())
         
             
 def getMediaName(media):
@@ -6,6 +6,8 @@ from PIL import Image, ImageTk
 import time
 import os
 
+from StillDissolve import StillDissolve
+
 class SlideShow:
     def __init__(self, viewer, controller, media_folder):
                 
@@ -32,6 +34,8 @@ class SlideShow:
         # Controls
         self.current_media_index = 0
         self.current_media_is_video = False
+        # Created on the first still, at the window's size
+        self.dissolve = None
         
         print(self.media_files) # debugging
         # Start the show
@@ -73,9 +77,8 @@ class SlideShow:
         print('showing image:', media_path) # debugging
         image = Image.open(media_path)
         resized_image = self.resize_photo(image)
-        photo = ImageTk.PhotoImage(resized_image)
         
-        self.cross_dissolve(photo)
+        self.cross_dissolve(resized_image)
     
     def resize_photo(self, image):
         # Get the dimensions of the window
@@ -107,27 +110,14 @@ class SlideShow:
         return resized_image
     
     def cross_dissolve(self, new_image):
-        # Create a blank black image
-        width = self.viewer.winfo_width()
-        height = self.viewer.winfo_height()
-        blank_image = Image.new('RGB', (width, height), 'black')
-        blank_photo = ImageTk.PhotoImage(blank_image)
-        
-        # Get the current image on the canvas
-        current_image = self.canvas.create_image(0, 0, anchor=tk.NW, image=blank_photo)
-        
-        # Perform the cross dissolve transition
-        for i in range(0, 101, 5):
-            alpha = i / 100.0
-            blended_image = Image.blend(blank_image, new_image, alpha)
-            blended_photo = ImageTk.PhotoImage(blended_image)
-            self.canvas.itemconfig(current_image, image=blended_photo)
-            self.canvas.update()
-            time.sleep(0.05)
-        
-        # Set the final image
-        self.canvas.itemconfig(current_image, image=new_image)
-        self.canvas.image = new_image
+        # Dissolve from the picture on screen to the new one, on the Tk loop
+        size = (self.viewer.winfo_width(), self.viewer.winfo_height())
+        if self.dissolve is None or self.dissolve.size != size:
+            if self.dissolve is not None:
+                self.canvas.delete(self.dissolve.item)
+            self.dissolve = StillDissolve(self.canvas, size)
+        self.canvas.tag_raise(self.dissolve.item)
+        self.dissolve.dissolve_to(new_image)
     
     def cross_dissolve_video(self):
         # Create a black overlay canvas
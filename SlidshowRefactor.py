@@ -4,7 +4,8 @@ import cv2
 import numpy as np
 from PIL import Image, ImageTk
 import time
-import os
+
+from MediaCatalog import load_playlist
 
 class SlideShow:
     def __init__(self, media_folder, run_duration=3000):
@@ -68,10 +69,7 @@ class SlideShow:
         self.player.play()
 
     def load_media_locations(self, media_folder):
-        media_files = [os.path.join(media_folder, f) for f in os.listdir(media_folder) if f.endswith(('.mp4', '.mkv', '.mov'))]
-        if not media_files:
-            raise FileNotFoundError(f"No media files found in the folder: {media_folder}")
-        return media_files
+        return load_playlist(media_folder, kinds=('video',))
     
     def start(self):
         # Set the size of the window
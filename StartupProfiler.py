@@ -0,0 +1,94 @@
+import contextlib
+import os
+import threading
+import time
+
+
+def process_age():
+    """Seconds since this process was started by the kernel, or None."""
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22 (after the parenthesised command name) is the start
+            # time in clock ticks after boot
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+
+
+class StartupProfiler:
+    """
+    Wall-clock timeline of the phases between process start and the first
+    frame on screen. Phases may overlap (they can run on different threads);
+    each records its offset from process start, its duration and thread.
+
+        with startup.phase('vlc_instance'):
+            instance = vlc.Instance(...)
+        startup.mark('first_frame')
+
+    Time spent before this module was imported (interpreter start-up and
+    the first imports) is read from /proc and shown as 'python'.
+    """
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.created = time.monotonic()
+        age = process_age()
+        self.origin = self.created - age if age is not None else self.created
+        self.phases = []
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    def offset(self, now=None):
+        return (time.monotonic() if now is None else now) - self.origin
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            with self._lock:
+                self.phases.append((name, start - self.origin, end - start,
+                                    threading.current_thread().name))
+
+    def mark(self, name):
+        """Record an instant, e.g. 'first_frame'. The first mark of a name wins."""
+        with self._lock:
+            self.marks.setdefault(name, self.offset())
+
+    def report(self):
+        with self._lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+            marks = sorted(self.marks.items(), key=lambda mark: mark[1])
+        lines = [f"{'phase':<22} {'start ms':>9} {'took ms':>9}  thread"]
+        if self.created > self.origin:
+            lines.append(f"{'python':<22} {0:>9.0f} {(self.created - self.origin) * 1000:>9.0f}  MainThread")
+        for name, start, duration, thread in phases:
+            lines.append(f"{name:<22} {start * 1000:>9.0f} {duration * 1000:>9.0f}  {thread}")
+        for name, at in marks:
+            lines.append(f"{'@ ' + name:<22} {at * 1000:>9.0f}")
+        first_frame = dict(marks).get('first_frame')
+        if self.budget is not None and first_frame is not None:
+            verdict = 'within' if first_frame <= self.budget else 'OVER'
+            lines.append(f"boot-to-first-frame {first_frame:.2f}s, {verdict} the {self.budget:.2f}s budget")
+        return '\n'.join(lines)
+
+    def over_budget(self):
+        first_frame = self.marks.get('first_frame')
+        return self.budget is not None and (first_frame is None or first_frame > self.budget)
+
+    def dump(self, path=None):
+        """Print the report, or append it to `path` with a timestamp."""
+        text = self.report()
+        if path is None:
+            print(text)
+            return
+        with open(path, 'a') as f:
+            f.write(f"# {time.strftime('%Y-%m-%d %H:%M:%S')}\n{text}\n\n")
+
+
+# Created as early as possible; MainLoop sets the budget
+startup = StartupProfiler()
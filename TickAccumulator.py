@@ -0,0 +1,121 @@
+class NavigationCommand:
+    """
+    One coalesced knob gesture: move `steps` items (negative is backwards).
+    velocity is the measured speed of the gesture in detents per second,
+    origin the time.monotonic() at which its first tick was received.
+    """
+    def __init__(self, steps, velocity, ticks, duration, origin=None):
+        self.steps = steps
+        self.velocity = velocity
+        self.ticks = ticks
+        self.duration = duration
+        self.origin = origin
+
+    def __repr__(self):
+        return (f"NavigationCommand(steps={self.steps}, velocity={self.velocity:.1f}/s, "
+                f"ticks={self.ticks}, duration={self.duration:.3f}s)")
+
+
+class TickAccumulator:
+    """
+    Merges bursts of encoder ticks into single navigation commands instead
+    of throwing away ticks that arrive too fast.
+
+    Ticks are summed (signed) while they keep coming. Once the knob has been
+    still for `burst_gap` seconds, the whole burst is turned into detents
+    (`tics_per_increment` ticks each) and emitted as one NavigationCommand.
+    Partial detents carry over to the next gesture, like increment_count did.
+
+    `min_interval` keeps commands at least that far apart: ticks keep being
+    counted meanwhile and go out with the next command. Gestures faster than
+    `fast_velocity` detents/s have their step count multiplied by
+    `fast_multiplier`, so a flick can travel further than the detents felt.
+    """
+    def __init__(self, tics_per_increment=4, burst_gap=0.08, min_interval=0.0,
+                 fast_velocity=8.0, fast_multiplier=1):
+        self.tics_per_increment = tics_per_increment
+        self.burst_gap = burst_gap
+        self.min_interval = min_interval
+        self.fast_velocity = fast_velocity
+        self.fast_multiplier = fast_multiplier
+
+        self.carry = 0
+        self.burst_ticks = 0
+        self.burst_count = 0
+        self.burst_start = None
+        self.last_tick = None
+        self.last_emit = None
+        # Set by poll() when a burst ended without completing a detent, so
+        # the owner can withdraw its hint; cleared by whoever handles it
+        self.abandoned = False
+
+    @property
+    def pending(self):
+        return self.burst_count > 0
+
+    @property
+    def partial(self):
+        """Signed ticks towards the next detent, including the open burst."""
+        return self.carry + self.burst_ticks
+
+    def hint(self):
+        """
+        (direction, steps) the open gesture is heading for, or (0, 0) when
+        no burst is open. Available from the first tick, before a single
+        detent is complete. The direction is that of the open burst; carry
+        left over from an earlier gesture only adds steps if it agrees.
+        """
+        if not self.pending or self.burst_ticks == 0:
+            return (0, 0)
+        direction = 1 if self.burst_ticks > 0 else -1
+        heading = max(abs(self.burst_ticks), direction * self.partial)
+        steps = -(-heading // self.tics_per_increment)
+        return (direction, steps)
+
+    def add(self, direction, now):
+        """Record one tick (+1 clockwise, -1 counterclockwise)."""
+        if self.burst_start is None:
+            self.burst_start = now
+        self.burst_ticks += direction
+        self.burst_count += 1
+        self.last_tick = now
+
+    def poll(self, now):
+        """Return a NavigationCommand if the current burst is over, else None."""
+        if not self.pending:
+            return None
+        if now - self.last_tick < self.burst_gap:
+            return None
+        if self.last_emit is not None and now - self.last_emit < self.min_interval:
+            return None
+
+        total = self.carry + self.burst_ticks
+        detents = int(total / self.tics_per_increment)
+        self.carry = total - detents * self.tics_per_increment
+
+        origin = self.burst_start
+        duration = self.last_tick - self.burst_start
+        ticks = self.burst_count
+        velocity = (ticks / self.tics_per_increment) / duration if duration > 0 else 0.0
+
+        self.burst_ticks = 0
+        self.burst_count = 0
+        self.burst_start = None
+
+        if detents == 0:
+            self.abandoned = True
+            return None
+
+        self.abandoned = False
+        steps = detents
+        if velocity >= self.fast_velocity:
+            steps *= self.fast_multiplier
+        self.last_emit = now
+        return NavigationCommand(steps, velocity, ticks, duration, origin)
+
+    def reset(self):
+        self.carry = 0
+        self.burst_ticks = 0
+        self.burst_count = 0
+        self.burst_start = None
+        self.abandoned = False
@@ -0,0 +1,150 @@
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+
+
+class _NullSpan:
+    """What span() hands out while tracing is off: does nothing, allocated once."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._add(self.name, self.start, time.perf_counter_ns() - self.start, self.args)
+        return False
+
+
+class Tracer:
+    """
+    Spans of work on every thread, exported as Chrome trace-event JSON
+    (chrome://tracing or ui.perfetto.dev).
+
+        with tracer.span('media_new'):
+            media = instance.media_new(path)
+
+        @tracer.traced('display_media')
+        def display_media(self): ...
+
+    Events go into a preallocated ring of `capacity` entries, so a long
+    session keeps its newest events and memory never grows. Each event is
+    one tuple: name, start, duration, native thread id and optional args.
+
+    While disabled, span() returns a shared no-op object and traced()
+    functions make one attribute check before calling straight through.
+    Setting SLIDESHOW_TRACE=trace.json enables the module-level `tracer`
+    and save() writes there.
+    """
+    def __init__(self, capacity=65536, path=None):
+        self.capacity = capacity
+        self.path = path
+        self.enabled = path is not None
+        self.origin = time.perf_counter_ns()
+        self._events = [None] * capacity
+        # next() on an itertools.count is atomic, so threads never share a slot
+        self._counter = itertools.count()
+        self.recorded = 0
+        self._threads = {}
+
+    def enable(self, path=None):
+        if path is not None:
+            self.path = path
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name, args=None):
+        """Context manager timing its block. `args` (a dict) shows up in the viewer."""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, args)
+
+    def traced(self, name):
+        """Decorator: every call of the function is a span called `name`."""
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter_ns()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self._add(name, start, time.perf_counter_ns() - start, None)
+            return wrapper
+        return decorate
+
+    def instant(self, name, args=None):
+        """A point in time, e.g. an input arriving."""
+        if self.enabled:
+            self._add(name, time.perf_counter_ns(), None, args)
+
+    def _add(self, name, start, duration, args):
+        tid = threading.get_native_id()
+        if tid not in self._threads:
+            self._threads[tid] = threading.current_thread().name
+        index = next(self._counter)
+        self._events[index % self.capacity] = (name, start, duration, tid, args)
+        self.recorded = max(self.recorded, index + 1)
+
+    def trace_events(self):
+        """The buffered events as a list of Chrome trace-event dicts, oldest first."""
+        pid = os.getpid()
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': pid,
+                   'args': {'name': 'slideshow'}}]
+        for tid, name in list(self._threads.items()):
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                           'args': {'name': 'main (Tk)' if tid == pid else name}})
+
+        buffered = sorted((event for event in list(self._events) if event is not None),
+                          key=lambda event: event[1])
+        for name, start, duration, tid, args in buffered:
+            event = {'name': name, 'pid': pid, 'tid': tid, 'ts': (start - self.origin) / 1000}
+            if duration is None:
+                event.update(ph='i', s='t')
+            else:
+                event.update(ph='X', dur=duration / 1000)
+            if args:
+                event['args'] = args
+            events.append(event)
+        return events
+
+    def save(self, path=None):
+        """Write the buffer as trace JSON. Returns the path, or None if there is nowhere to write."""
+        path = path or self.path
+        if path is None:
+            return None
+        events = self.trace_events()
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        dropped = max(0, self.recorded - self.capacity)
+        print(f"Trace: {len(events)} events written to {path}"
+              + (f" ({dropped} oldest overwritten)" if dropped else ''))
+        return path
+
+
+# One tracer for the whole process, off unless SLIDESHOW_TRACE names a file
+tracer = Tracer(path=os.environ.get('SLIDESHOW_TRACE') or None)
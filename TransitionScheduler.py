@@ -0,0 +1,115 @@
+import threading
+import time
+
+from Tracer import tracer
+
+
+class Transition:
+    """
+    One running fade. The scheduler calls step() with the progress (0..1]
+    on every tick and finish() after the last one. If a newer target comes
+    in first, interrupt() is called instead and the fade is abandoned.
+    """
+    def step(self, progress):
+        pass
+
+    def finish(self):
+        pass
+
+    def interrupt(self):
+        # By default jump straight to the end state
+        self.finish()
+
+
+class TransitionScheduler:
+    """
+    Runs transitions on its own thread so the caller (e.g. the encoder's
+    serial thread) never blocks on a fade.
+
+    request() only records the latest target and returns immediately. If a
+    fade is in progress when a new target arrives, the fade is interrupted
+    and the scheduler moves straight on to the newest target; targets that
+    were superseded in between are never shown.
+    """
+    def __init__(self, start_transition, steps=51, step_interval=0.02):
+        # start_transition(target) prepares the target and returns a
+        # Transition, or None if there is nothing to fade (e.g. superseded)
+        self.start_transition = start_transition
+        self.steps = steps
+        self.step_interval = step_interval
+
+        self._cond = threading.Condition()
+        self._pending = None
+        self._has_pending = False
+        self._running = False
+        self.busy = False
+        self._thread = threading.Thread(target=self._loop, name='transition-scheduler', daemon=True)
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def request(self, target):
+        with self._cond:
+            self._pending = target
+            self._has_pending = True
+            self._cond.notify_all()
+
+    def superseded(self):
+        """True if a newer target is waiting, so current work can bail out."""
+        return self._has_pending or not self._running
+
+    def wait(self, timeout):
+        """
+        Sleep for up to `timeout` seconds, waking early if a newer target is
+        requested. Returns True if the caller has been superseded.
+        """
+        with self._cond:
+            self._cond.wait_for(self.superseded, timeout)
+        return self.superseded()
+
+    def _take(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._has_pending or not self._running)
+            if not self._running:
+                return False, None
+            target = self._pending
+            self._pending = None
+            self._has_pending = False
+            return True, target
+
+    def _loop(self):
+        while self._running:
+            ok, target = self._take()
+            if not ok:
+                break
+
+            self.busy = True
+            try:
+                transition = self.start_transition(target)
+                if transition is not None:
+                    self._run(transition)
+            except Exception as e:
+                print(f"Transition to {target} failed: {e}")
+            finally:
+                self.busy = False
+
+    @tracer.traced('fade')
+    def _run(self, transition):
+        # Pace steps against a fixed start time so slow VLC calls don't
+        # stretch the fade
+        start = time.monotonic()
+        for i in range(1, self.steps + 1):
+            transition.step(i / self.steps)
+            if i == self.steps:
+                break
+            remaining = start + i * self.step_interval - time.monotonic()
+            if self.wait(max(0.0, remaining)):
+                transition.interrupt()
+                return
+        transition.finish()
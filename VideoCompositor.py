@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Software compositor for real video crossfades.
+
+Instead of drawing into their own X windows, players decode through
+libvlc's video memory callbacks into pre-allocated NumPy buffers (three
+per player, so the decoder never waits for the presenter and the presenter
+never sees a half-written frame). One presenter on the Tk loop takes the
+newest frame of each player and, while a fade is running, alpha-blends
+them with fixed-point integer arithmetic into one output buffer that is
+pasted into a single persistent PhotoImage. Outside a fade the newest
+frame is pasted as it is, no blending.
+
+Nothing is allocated per frame: the frame buffers, blend scratch space and
+the PIL images wrapping them are all created up front.
+
+A blended frame is only worth it if blend and paste together fit in the
+frame interval. calibrate() times both before the players are attached, so
+the slideshow can keep VLC's own surfaces and its opacity crossfade on a
+machine that is too slow. Should fades fall behind later on, the compositor
+stops blending and cuts to the incoming video instead of dropping frames.
+
+    python VideoCompositor.py bench [--size 1920x1080] [--frames 300]
+"""
+import argparse
+import ctypes
+import threading
+import time
+
+import numpy as np
+
+
+class Blender:
+    """
+    out = (a * (256 - alpha) + b * alpha) >> 8 on uint8 frames, with alpha
+    in 0..256, computed in preallocated uint16 scratch arrays.
+    255 * 256 fits in 16 bits, so nothing can overflow.
+    """
+    def __init__(self, shape):
+        self.shape = shape
+        self._a = np.empty(shape, dtype=np.uint16)
+        self._b = np.empty(shape, dtype=np.uint16)
+
+    def blend(self, a, b, progress, out):
+        alpha = np.uint16(min(256, max(0, int(progress * 256 + 0.5))))
+        np.multiply(a, np.uint16(256) - alpha, out=self._a, dtype=np.uint16)
+        np.multiply(b, alpha, out=self._b, dtype=np.uint16)
+        np.add(self._a, self._b, out=self._a)
+        np.right_shift(self._a, 8, out=self._a)
+        np.copyto(out, self._a, casting='unsafe')
+        return out
+
+
+###############################################################################
+# libvlc video callbacks
+###############################################################################
+def _vlc():
+    import vlc
+    return vlc
+
+
+# python-vlc declares the chroma argument as c_char_p, which hands Python a
+# copy we can't write the chroma into, so the format callback is bound here
+VideoFormatCb = ctypes.CFUNCTYPE(ctypes.c_uint, ctypes.POINTER(ctypes.c_void_p), ctypes.c_void_p,
+                                 ctypes.POINTER(ctypes.c_uint), ctypes.POINTER(ctypes.c_uint),
+                                 ctypes.POINTER(ctypes.c_uint), ctypes.POINTER(ctypes.c_uint))
+VideoCleanupCb = ctypes.CFUNCTYPE(None, ctypes.c_void_p)
+
+
+def _set_format_callbacks(player, setup, cleanup):
+    function = _vlc().dll.libvlc_video_set_format_callbacks
+    function.argtypes = [ctypes.c_void_p, VideoFormatCb, VideoCleanupCb]
+    function.restype = None
+    function(player, setup, cleanup)
+
+
+class VideoSource:
+    """
+    The frames of one VLC player, decoded as RGBA straight into a triple
+    buffer of screen-sized NumPy arrays. The video keeps its aspect ratio:
+    VLC writes it centred into the buffer, the borders stay black.
+    """
+    def __init__(self, player, width, height):
+        from PIL import Image
+
+        self.player = player
+        self.width = width
+        self.height = height
+        self.pitch = width * 4
+        # One spare row: VLC may copy whole pitches on the last line
+        self.buffers = np.zeros((3, height + 1, width, 4), dtype=np.uint8)
+        self.frames = [buffer[:height] for buffer in self.buffers]
+        self.images = [Image.frombuffer('RGBA', (width, height), frame, 'raw', 'RGBA', 0, 1)
+                       for frame in self.frames]
+        self.addresses = [buffer.ctypes.data for buffer in self.buffers]
+        self.offset = 0
+
+        # Triple buffering: VLC writes `_write`, the newest complete frame
+        # is `_ready`, the presenter reads `read`
+        self._write, self._ready, self.read = 0, 1, 2
+        self._fresh = False
+        self._lock = threading.Lock()
+        self.decoded = 0
+
+        vlc = _vlc()
+        # Keep references, ctypes callbacks must outlive the player
+        self._callbacks = (
+            vlc.CallbackDecorators.VideoLockCb(self._lock_cb),
+            vlc.CallbackDecorators.VideoUnlockCb(self._unlock_cb),
+            vlc.CallbackDecorators.VideoDisplayCb(self._display_cb),
+            VideoFormatCb(self._format_cb),
+            VideoCleanupCb(self._cleanup_cb),
+        )
+        lock, unlock, display, setup, cleanup = self._callbacks
+        player.video_set_callbacks(lock, unlock, display, None)
+        _set_format_callbacks(player, setup, cleanup)
+
+    # Everything below runs on VLC's decoder threads: plain Python only
+    def _format_cb(self, opaque, chroma, width, height, pitches, lines):
+        source_width, source_height = width[0], height[0]
+        scale = min(self.width / max(1, source_width), self.height / max(1, source_height))
+        fit_width = min(self.width, int(source_width * scale)) & ~1
+        fit_height = min(self.height, int(source_height * scale)) & ~1
+        ctypes.memmove(chroma, b'RGBA', 4)
+        width[0], height[0] = fit_width, fit_height
+        pitches[0] = self.pitch
+        lines[0] = fit_height
+        x0 = (self.width - fit_width) // 2
+        y0 = (self.height - fit_height) // 2
+        self.offset = y0 * self.pitch + x0 * 4
+        # New media: clear the letterbox borders of the previous one
+        self.buffers.fill(0)
+        return 1
+
+    def _cleanup_cb(self, opaque):
+        pass
+
+    def _lock_cb(self, opaque, planes):
+        planes[0] = self.addresses[self._write] + self.offset
+        return None
+
+    def _unlock_cb(self, opaque, picture, planes):
+        pass
+
+    def _display_cb(self, opaque, picture):
+        with self._lock:
+            self._write, self._ready = self._ready, self._write
+            self._fresh = True
+        self.decoded += 1
+
+    def latest(self):
+        """Swap in the newest complete frame. True if it is a new one."""
+        with self._lock:
+            if not self._fresh:
+                return False
+            self.read, self._ready = self._ready, self.read
+            self._fresh = False
+        return True
+
+    @property
+    def frame(self):
+        return self.frames[self.read]
+
+    @property
+    def image(self):
+        return self.images[self.read]
+
+
+class VideoCompositor:
+    """
+    Shows one or two VideoSources on a single Tk surface, covering the
+    viewer's window. fade(old, new, progress) may be called from any thread;
+    the presenter picks the state up on its next tick.
+    """
+    def __init__(self, viewer, size, fps=60):
+        import tkinter as tk
+        from PIL import Image, ImageTk
+
+        self.viewer = viewer
+        self.width, self.height = size
+        self.interval = max(1, int(1000 / fps))
+        self.sources = {}
+
+        self.output = np.zeros((self.height, self.width, 4), dtype=np.uint8)
+        self.output_image = Image.frombuffer('RGBA', (self.width, self.height), self.output,
+                                             'raw', 'RGBA', 0, 1)
+        self.blender = Blender(self.output.shape)
+        self.photo = ImageTk.PhotoImage('RGBA', (self.width, self.height))
+        self.label = tk.Label(viewer.window, image=self.photo, bg='black', borderwidth=0)
+        self.label.place(x=0, y=0, relwidth=1, relheight=1)
+        self.label.lift()
+
+        self._state = (None, None, 1.0)
+        self._shown = None
+        self._running = False
+        self.presented = 0
+        self.blend_time = 0.0
+        self.paste_time = 0.0
+        self.blends = 0
+        # Cleared once blend + paste no longer fit in a frame interval
+        self.blending = True
+
+    def calibrate(self, frames=10):
+        """
+        Time blend + paste of the output surface. Returns True if a blended
+        frame fits in the frame interval.
+        """
+        times = []
+        for frame in range(frames):
+            start = time.perf_counter()
+            self.blender.blend(self.output, self.output, frame / frames, self.output)
+            self.photo.paste(self.output_image)
+            times.append(time.perf_counter() - start)
+        mean = sum(times) / len(times)
+        print(f"Compositor: {mean * 1000:.1f} ms to blend and paste a frame, "
+              f"{self.interval} ms available")
+        return mean * 1000 <= self.interval
+
+    def close(self):
+        self.stop()
+        self.label.destroy()
+
+    def attach(self, player):
+        """Route a player's video into the compositor."""
+        source = VideoSource(player, self.width, self.height)
+        self.sources[id(player)] = source
+        return source
+
+    def source_for(self, player):
+        return self.sources.get(id(player))
+
+    def show(self, player):
+        self._state = (None, self.source_for(player), 1.0)
+
+    def fade(self, old_player, new_player, progress):
+        if not self.blending:
+            # Too slow to blend: a cut, while the caller fades audio and marquee
+            self.show(new_player)
+            return
+        old = self.source_for(old_player) if old_player is not None else None
+        self._state = (old, self.source_for(new_player), progress)
+
+    def start(self):
+        self._running = True
+        self.viewer.root.after(0, self._present)
+
+    def stop(self):
+        self._running = False
+
+    def _present(self):
+        if not self._running:
+            return
+        self.viewer.root.after(self.interval, self._present)
+        old, new, progress = self._state
+        if new is None:
+            return
+        changed = new.latest()
+        if old is not None and old is not new and progress < 1.0:
+            changed = old.latest() or changed
+            # Every tick of a fade is a new picture, even if neither video moved
+            start = time.perf_counter()
+            self.blender.blend(old.frame, new.frame, progress, self.output)
+            blended = time.perf_counter()
+            self.photo.paste(self.output_image)
+            self.blend_time += blended - start
+            self.paste_time += time.perf_counter() - blended
+            self.blends += 1
+            self._shown = None
+            if self.blends >= 30 and (self.blend_time + self.paste_time) / self.blends * 1000 > self.interval:
+                print(f"Compositor: falling behind ({self}), cutting instead of blending")
+                self.blending = False
+        elif changed or self._shown is not new:
+            self.photo.paste(new.image)
+            self._shown = new
+        else:
+            return
+        self.presented += 1
+
+    def __str__(self):
+        blend = self.blend_time / self.blends * 1000 if self.blends else 0.0
+        paste = self.paste_time / self.blends * 1000 if self.blends else 0.0
+        return (f"{self.presented} frames presented, {self.blends} blended, "
+                f"{blend:.1f} ms per blend + {paste:.1f} ms per paste")
+
+
+###############################################################################
+# Benchmark
+###############################################################################
+def _mean_p95(times):
+    times = sorted(times)
+    return sum(times) / len(times), times[int(len(times) * 0.95)]
+
+
+def time_paste(image, frames=300):
+    """
+    PhotoImage.paste of `image` in seconds (mean, p95), the other half of a
+    blended frame. None if Tk can't open a display.
+    """
+    import tkinter as tk
+    from PIL import ImageTk
+
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return None
+    root.withdraw()
+    try:
+        photo = ImageTk.PhotoImage('RGBA', image.size)
+        photo.paste(image)
+        times = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            photo.paste(image)
+            times.append(time.perf_counter() - start)
+    finally:
+        root.destroy()
+    return _mean_p95(times)
+
+
+def benchmark(width, height, frames=300):
+    """
+    Blend cost per frame in seconds (mean, p95), bytes allocated while
+    blending, the largest error against a float blend and the paste cost
+    (mean, p95) of the blended RGBA frame, or None without a display.
+    """
+    import tracemalloc
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    a = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+    b = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+    out = np.empty_like(a)
+    blender = Blender(a.shape)
+    blender.blend(a, b, 0.5, out)
+
+    times = []
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[1]
+    for frame in range(frames):
+        start = time.perf_counter()
+        blender.blend(a, b, frame / frames, out)
+        times.append(time.perf_counter() - start)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    # Check the fixed-point result against floating point
+    expected = (a * 0.5 + b * 0.5)
+    blender.blend(a, b, 0.5, out)
+    error = np.abs(out.astype(np.int16) - expected.round().astype(np.int16)).max()
+
+    mean, p95 = _mean_p95(times)
+    paste = time_paste(Image.frombuffer('RGBA', (width, height), out, 'raw', 'RGBA', 0, 1), frames)
+    return mean, p95, peak, error, paste
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the crossfade blend and paste.')
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('--size', default='1920x1080', help='frame size, WxH')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--fps', type=int, default=60, help="the compositor's frame rate")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split('x'))
+    mean, p95, allocated, error, paste = benchmark(width, height, args.frames)
+    print(f"{width}x{height} RGBA, {args.frames} frames")
+    print(f"  blend: mean {mean * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms per frame "
+          f"({1 / mean:.0f} fps max)")
+    print(f"  allocated while blending: {allocated} bytes")
+    print(f"  max error vs float blend: {error}")
+    if paste is None:
+        print("  paste: no display, not measured")
+        return
+    paste_mean, paste_p95 = paste
+    total = mean + paste_mean
+    print(f"  paste: mean {paste_mean * 1000:.2f} ms, p95 {paste_p95 * 1000:.2f} ms per frame")
+    print(f"  blend + paste: mean {total * 1000:.2f} ms ({1 / total:.0f} fps max), "
+          f"{'fits' if total * args.fps <= 1 else 'does not fit'} {args.fps} fps")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 import tkinter as tk
 
+from Tracer import tracer
+
 class Viewer:
     def __init__(self):
         # Initialize Tkinter window
@@ -30,6 +32,19 @@ class Viewer:
     def get_window_id(self):
         return self.window.winfo_id()
     
+    def create_surface(self):
+        # A black frame stacked over the whole window that a VLC player can
+        # render into. Surfaces are shown by raising them above the others.
+        surface = tk.Frame(self.window, bg='black')
+        surface.place(x=0, y=0, relwidth=1, relheight=1)
+        surface.lower()
+        return surface
+    
+    @tracer.traced('viewer.raise_surface')
+    def raise_surface(self, surface):
+        surface.lift()
+    
+    @tracer.traced('viewer.show_image')
     def show_image(self, image):
         if not self.imageContainer:
             print('creating label') #debugging
@@ -40,6 +55,7 @@ class Viewer:
         self.imageContainer.place(x=0, y=0, relwidth=1, relheight=1)
         
         
+    @tracer.traced('viewer.show_video')
     def show_video(self):
         if self.imageContainer:
             print('destroying label') #debugging
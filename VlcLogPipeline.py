@@ -0,0 +1,267 @@
+import collections
+import ctypes
+import ctypes.util
+import os
+import queue
+import threading
+import time
+
+# libvlc log levels
+DEBUG = 0
+NOTICE = 2
+WARNING = 3
+ERROR = 4
+LEVEL_NAMES = {DEBUG: 'debug', 1: 'debug', NOTICE: 'info', WARNING: 'warning', ERROR: 'error'}
+
+# Modules whose debug/info output is pure chatter on the kiosk; their
+# warnings and errors still go through
+QUIET_MODULES = frozenset({
+    'lua', 'pulse', 'vlcpulse', 'xdg_shell', 'wl_dmabuf', 'dbus_screensaver', 'egl_x11',
+    'freetype', 'scaletempo', 'mmal_xsplitter', 'xcb_window', 'drm_gl_conv', 'cache_read',
+    'swscale', 'gles2', 'keystore', 'logger', 'qt',
+})
+
+# void (*libvlc_log_cb)(void *data, int level, const libvlc_log_t *ctx,
+#                       const char *fmt, va_list args)
+LogCb = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p,
+                         ctypes.c_char_p, ctypes.c_void_p)
+
+_libc = ctypes.CDLL(ctypes.util.find_library('c'))
+_libc.vsnprintf.argtypes = [ctypes.c_char_p, ctypes.c_size_t, ctypes.c_char_p, ctypes.c_void_p]
+_libc.vsnprintf.restype = ctypes.c_int
+
+
+class RateLimiter:
+    """
+    At most `burst` messages per key every `window` seconds. The key is the
+    printf format, so "elst box found" is limited before it is even
+    formatted. Returns (allowed, suppressed_since_last_allowed).
+    """
+    def __init__(self, burst=5, window=10.0):
+        self.burst = burst
+        self.window = window
+        self._keys = {}
+
+    def check(self, key, now):
+        entry = self._keys.get(key)
+        if entry is None or now - entry[0] >= self.window:
+            suppressed = entry[2] if entry is not None else 0
+            self._keys[key] = [now, 1, 0]
+            if len(self._keys) > 4096:
+                self._keys.clear()
+            return True, suppressed
+        if entry[1] < self.burst:
+            entry[1] += 1
+            return True, 0
+        entry[2] += 1
+        return False, 0
+
+
+class RotatingWriter:
+    """
+    Background thread that appends batches of lines to `path`, rotating it
+    to path.1 ... path.<backups> once it passes `max_bytes`. Lines are
+    queued without blocking and written together, at most every `interval`
+    seconds, so the SD card sees a few larger writes instead of many tiny
+    ones.
+    """
+    def __init__(self, path, max_bytes=1024 * 1024, backups=3, interval=1.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.interval = interval
+        self.written = 0
+        self._queue = queue.Queue(maxsize=10000)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._loop, name='vlc-log-writer', daemon=True)
+        self._running = True
+        self._thread.start()
+
+    def write(self, line):
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def write_many(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def close(self):
+        self._running = False
+        self._queue.put(None)
+        self._thread.join(timeout=2.0)
+
+    def _loop(self):
+        while True:
+            line = self._queue.get()
+            if line is None:
+                break
+            batch = [line]
+            deadline = time.monotonic() + self.interval
+            # Gather whatever else arrives in the next interval
+            while self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    line = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if line is None:
+                    self._flush(batch)
+                    return
+                batch.append(line)
+            self._flush(batch)
+        # Whatever was queued behind the stop marker
+        rest = []
+        while not self._queue.empty():
+            line = self._queue.get_nowait()
+            if line is not None:
+                rest.append(line)
+        self._flush(rest)
+
+    def _flush(self, lines):
+        if not lines:
+            return
+        data = ''.join(lines)
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+                self._rotate()
+            with open(self.path, 'a') as f:
+                f.write(data)
+            self.written += len(data)
+        except OSError as e:
+            print(f"VLC log: could not write {self.path}: {e}")
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+class VlcLogPipeline:
+    """
+    Replaces VLC's --file-logging. Registered with libvlc_log_set(), it
+    sees every message of an instance and:
+
+      - drops debug/info from QUIET_MODULES and anything below
+        `ring_level` before formatting it,
+      - rate-limits each message format (RateLimiter),
+      - keeps the last `ring_size` formatted lines in memory,
+      - queues `write_level` and above to a rotated, size-capped file,
+      - on an error (or dump()), writes the whole ring buffer out once, so
+        the debug context leading up to a failure is kept.
+
+    The callback runs on VLC's threads and never calls back into libvlc.
+    """
+    def __init__(self, path='vlc.log', ring_size=2000, ring_level=DEBUG, write_level=WARNING,
+                 quiet_modules=QUIET_MODULES, max_bytes=1024 * 1024, backups=3, dump_interval=60.0):
+        self.path = path
+        self.ring_level = ring_level
+        self.write_level = write_level
+        self.quiet_modules = quiet_modules
+        self.ring = collections.deque(maxlen=ring_size)
+        self.limiter = RateLimiter()
+        self.dump_interval = dump_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+        self.counts = collections.Counter()
+        self.filtered = 0
+        self.limited = 0
+        self._last_dump = None
+        self._writer = None
+        self._instances = []
+        self._lock = threading.Lock()
+        # Must outlive every instance it is registered with
+        self._callback = LogCb(self._on_log)
+
+    def attach(self, instance):
+        import vlc
+
+        if self._writer is None:
+            self._writer = RotatingWriter(self.path, self.max_bytes, self.backups)
+        get_context = vlc.dll.libvlc_log_get_context
+        get_context.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_char_p),
+                                ctypes.POINTER(ctypes.c_char_p), ctypes.POINTER(ctypes.c_uint)]
+        get_context.restype = None
+        self._get_context = get_context
+        log_set = vlc.dll.libvlc_log_set
+        log_set.argtypes = [ctypes.c_void_p, LogCb, ctypes.c_void_p]
+        log_set.restype = None
+        log_set(instance, self._callback, None)
+        self._instances.append(instance)
+        return instance
+
+    def detach(self):
+        # VLC must stop calling into Python before the interpreter goes away
+        for instance in self._instances:
+            instance.log_unset()
+        self._instances = []
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _on_log(self, data, level, ctx, fmt, args):
+        try:
+            module = ctypes.c_char_p()
+            file = ctypes.c_char_p()
+            line = ctypes.c_uint()
+            self._get_context(ctx, ctypes.byref(module), ctypes.byref(file), ctypes.byref(line))
+            module = module.value.decode('utf-8', 'replace') if module.value else 'vlc'
+
+            if level < WARNING and (level < self.ring_level or module in self.quiet_modules):
+                self.filtered += 1
+                return
+            now = time.time()
+            with self._lock:
+                allowed, suppressed = self.limiter.check((module, fmt), now)
+            if not allowed:
+                self.limited += 1
+                return
+
+            buffer = ctypes.create_string_buffer(1024)
+            _libc.vsnprintf(buffer, len(buffer), fmt, args)
+            text = buffer.value.decode('utf-8', 'replace')
+            name = LEVEL_NAMES.get(level, 'debug')
+            stamp = time.strftime('%H:%M:%S', time.localtime(now)) + f".{int(now % 1 * 1000):03d}"
+            entry = f"[{stamp}] {module} {name}: {text}\n"
+            if suppressed:
+                entry += f"[{stamp}] {module} {name}: ({suppressed} similar messages suppressed)\n"
+
+            self.counts[name] += 1
+            self.ring.append(entry)
+            if level >= self.write_level and self._writer is not None:
+                self._writer.write(entry)
+            if level >= ERROR:
+                self.dump(f"{module} error: {text}")
+        except Exception:
+            # Never let an exception unwind into VLC's thread
+            pass
+
+    def dump(self, reason):
+        """Write the whole ring buffer to the log once, e.g. after a failure."""
+        now = time.monotonic()
+        with self._lock:
+            if self._last_dump is not None and now - self._last_dump < self.dump_interval:
+                return False
+            self._last_dump = now
+            lines = list(self.ring)
+        if self._writer is None:
+            return False
+        self._writer.write(f"----- ring buffer ({len(lines)} lines): {reason} -----\n")
+        self._writer.write_many(lines)
+        self._writer.write("----- end of ring buffer -----\n")
+        return True
+
+    def __str__(self):
+        written = self._writer.written if self._writer is not None else 0
+        return (f"{sum(self.counts.values())} kept ({dict(self.counts)}), {self.filtered} filtered, "
+                f"{self.limited} rate-limited, {written / 1e3:.0f} kB written")
+
+
+# One pipeline for every VLC instance in the process
+vlc_log = VlcLogPipeline()
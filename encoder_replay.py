@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Record, replay and synthesise rotary encoder traffic without the knob.
+
+    python encoder_replay.py record  session.enc [--port /dev/ttyS0] [--seconds 60]
+    python encoder_replay.py replay  session.enc [--speed 1|N|max] [--link /tmp/encoder]
+    python encoder_replay.py generate flick out.enc [--repeat 10] [--seed 1]
+    python encoder_replay.py info    session.enc
+
+replay (and generate --replay) opens a pseudo-terminal and prints its path.
+EncoderController can open that path like the real port, e.g.
+
+    python newMain2.py Teens /dev/pts/5
+
+Recordings are a small binary file: a header followed by one record per
+serial read, each holding the microseconds since the previous read and
+the raw bytes, so framing problems are reproduced exactly.
+"""
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+import tty
+
+MAGIC = b'ENCR'
+VERSION = 1
+HEADER = struct.Struct('<4sBI')      # magic, version, baud
+RECORD = struct.Struct('<IH')        # delta in microseconds, length
+
+CW = b'\xff\x00\x00\x01'
+CCW = b'\xff\x00\x00\xfe'
+
+
+###############################################################################
+# File format
+###############################################################################
+def write_recording(path, records, baud=125000):
+    """records is an iterable of (delta_seconds, data)."""
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, baud))
+        for delta, data in records:
+            for offset in range(0, len(data), 0xFFFF):
+                chunk = data[offset:offset + 0xFFFF]
+                f.write(RECORD.pack(min(int(delta * 1e6), 0xFFFFFFFF), len(chunk)))
+                f.write(chunk)
+                delta = 0
+            count += 1
+    return count
+
+
+def read_recording(path):
+    """Returns (baud, [(delta_seconds, data), ...])."""
+    with open(path, 'rb') as f:
+        magic, version, baud = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an encoder recording")
+        records = []
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                break
+            delta_us, length = RECORD.unpack(head)
+            records.append((delta_us / 1e6, f.read(length)))
+    return baud, records
+
+
+###############################################################################
+# Record from a real port
+###############################################################################
+def record(path, port, baud, seconds):
+    import serial
+
+    ser = serial.Serial(port=port, baudrate=baud, timeout=0.5)
+    print(f"Recording {port} to {path}, Ctrl+C to stop.")
+
+    def reads():
+        last = time.monotonic()
+        end = last + seconds if seconds else None
+        try:
+            while end is None or time.monotonic() < end:
+                data = ser.read(max(1, ser.in_waiting))
+                if not data:
+                    continue
+                now = time.monotonic()
+                yield now - last, data
+                last = now
+        except KeyboardInterrupt:
+            pass
+        finally:
+            ser.close()
+
+    count = write_recording(path, reads(), baud)
+    print(f"Wrote {count} reads to {path}")
+
+
+###############################################################################
+# Replay through a pseudo-terminal
+###############################################################################
+def open_pty(link=None):
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    name = os.ttyname(slave)
+    if link:
+        if os.path.islink(link):
+            os.remove(link)
+        os.symlink(name, link)
+        name = f"{link} -> {name}"
+    return master, slave, name
+
+
+def replay(records, speed, baud, link=None, wait=True):
+    """
+    Write the records to a pty. speed is a time scale factor (1 = real
+    time, 10 = ten times faster) or None for as fast as the wire allows.
+    """
+    master, slave, name = open_pty(link)
+    print(f"Replaying on {name}")
+    if wait:
+        input("Start the controller on that port, then press Enter...")
+
+    # Even at max speed don't go faster than the real serial line would:
+    # 10 bits per byte with start and stop bits
+    byte_time = 10.0 / baud if baud else 0.0
+    total = 0
+    start = time.monotonic()
+    clock = start
+    try:
+        for delta, data in records:
+            if speed:
+                clock += delta / speed
+            delay = clock - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            # If we fell behind, keep the following gaps instead of bursting
+            clock = max(clock, time.monotonic())
+            os.write(master, data)
+            total += len(data)
+            clock += len(data) * byte_time
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.monotonic() - start
+    print(f"Sent {total} bytes in {elapsed:.2f}s")
+    if wait:
+        input("Done, press Enter to close the port...")
+    os.close(master)
+    os.close(slave)
+    if link and os.path.islink(link):
+        os.remove(link)
+
+
+###############################################################################
+# Synthetic profiles
+###############################################################################
+def detents(direction, count, tics_per_increment, tick_gap, detent_gap):
+    frame = CW if direction > 0 else CCW
+    for _ in range(count):
+        for tick in range(tics_per_increment):
+            yield (detent_gap if tick == 0 else tick_gap), frame
+
+
+def profile_slow(rng, tics):
+    # A careful visitor: one detent at a time with a pause in between
+    yield from detents(1, 5, tics, 0.02, 0.8)
+    yield from detents(-1, 5, tics, 0.02, 0.8)
+
+
+def profile_flick(rng, tics):
+    # A fast spin that decelerates
+    gap = 0.001
+    for _ in range(30 * tics):
+        yield gap, CW
+        gap *= 1.03
+
+
+def profile_reversal(rng, tics):
+    # Back and forth, sometimes before a detent is complete
+    for _ in range(10):
+        direction = rng.choice((1, -1))
+        for _ in range(rng.randint(1, 3 * tics)):
+            yield rng.uniform(0.005, 0.03), CW if direction > 0 else CCW
+        yield 0.3, b''
+
+
+def profile_corrupt(rng, tics):
+    # Normal ticks with dropped, duplicated and stray bytes mixed in
+    for delta, frame in profile_flick(rng, tics):
+        roll = rng.random()
+        if roll < 0.05:
+            frame = frame[:rng.randint(1, 3)]
+        elif roll < 0.10:
+            frame = frame + bytes([rng.randint(0, 254)])
+        elif roll < 0.12:
+            frame = frame[:2] + frame
+        yield delta, frame
+
+
+def profile_stress(rng, tics):
+    # Back-to-back frames, meant to be replayed at --speed max
+    for i in range(20000):
+        yield 0.0, CW if (i // 400) % 2 == 0 else CCW
+
+
+PROFILES = {
+    'slow': profile_slow,
+    'flick': profile_flick,
+    'reversal': profile_reversal,
+    'corrupt': profile_corrupt,
+    'stress': profile_stress,
+}
+
+
+def generate(profile, repeat, tics, seed):
+    rng = random.Random(seed)
+    records = []
+    pause = 0.0
+    for _ in range(repeat):
+        for delta, data in PROFILES[profile](rng, tics):
+            if not data:
+                # A pure pause, fold it into the next write
+                pause += delta
+                continue
+            records.append((delta + pause, data))
+            pause = 0.0
+    return records
+
+
+###############################################################################
+# Main
+###############################################################################
+def parse_speed(value):
+    if value == 'max':
+        return None
+    return float(value.rstrip('x'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('record', help='record a real encoder')
+    p.add_argument('file')
+    p.add_argument('--port', default='/dev/ttyS0')
+    p.add_argument('--baud', type=int, default=125000)
+    p.add_argument('--seconds', type=float, default=0)
+
+    p = sub.add_parser('replay', help='replay a recording through a pty')
+    p.add_argument('file')
+    p.add_argument('--speed', type=parse_speed, default=1.0, help='1, N or max')
+    p.add_argument('--link', help='also make this symlink to the pty')
+    p.add_argument('--no-wait', action='store_true', help="don't wait for Enter")
+
+    p = sub.add_parser('generate', help='write a synthetic profile')
+    p.add_argument('profile', choices=sorted(PROFILES))
+    p.add_argument('file', nargs='?')
+    p.add_argument('--repeat', type=int, default=1)
+    p.add_argument('--tics', type=int, default=4, help='ticks per detent')
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--replay', action='store_true', help='replay straight away')
+    p.add_argument('--speed', type=parse_speed, default=1.0)
+    p.add_argument('--link')
+
+    p = sub.add_parser('info', help='summarise a recording')
+    p.add_argument('file')
+
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.file, args.port, args.baud, args.seconds)
+
+    elif args.command == 'replay':
+        baud, records = read_recording(args.file)
+        replay(records, args.speed, baud, args.link, wait=not args.no_wait)
+
+    elif args.command == 'generate':
+        records = generate(args.profile, args.repeat, args.tics, args.seed)
+        if args.file:
+            count = write_recording(args.file, records)
+            print(f"Wrote {count} records to {args.file}")
+        if args.replay:
+            replay(records, args.speed, 125000, args.link)
+        elif not args.file:
+            print("Nothing to do: give a file and/or --replay")
+            sys.exit(1)
+
+    elif args.command == 'info':
+        baud, records = read_recording(args.file)
+        data = b''.join(chunk for _, chunk in records)
+        duration = sum(delta for delta, _ in records)
+        print(f"{args.file}: {len(records)} reads, {len(data)} bytes, {duration:.2f}s at {baud} baud")
+        print(f"  clockwise frames:        {data.count(CW)}")
+        print(f"  counterclockwise frames: {data.count(CCW)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Transcode an exhibit's videos to a profile the Pi plays without dropping frames.
+
+    python exhibit_compiler.py Videos/Music_Exhibit [--size 1920x1080] [--jobs N] [--dry-run]
+
+Every video is probed with ffprobe and checked against PROFILE: H.264
+8-bit 4:2:0 no bigger than the screen, no B-frames (no CTTS reordering for
+the software decoder to buffer), a keyframe at least every
+PROFILE['gop_seconds'], moov before mdat, and AAC stereo audio. Files that
+already comply are left alone. The others are re-encoded with ffmpeg, one
+job per few cores, all in parallel. The compiled file takes the original's
+place (as .mp4) and the original is moved to <exhibit>/originals/, which
+the slideshows never list; an earlier original of the same name is kept
+and the new one gets a numbered name (clip.1.mov). If that .mp4 name already belongs to another
+file, the output is called <name>.<ext>.mp4 instead; if that is taken as
+well, the file is reported as failed and nothing is overwritten.
+
+Results go to <exhibit>/exhibit_manifest.json, saved after every file. A
+file whose size and mtime match its manifest entry is not probed again.
+"""
+import argparse
+import concurrent.futures
+import fractions
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+from MediaCatalog import VIDEO_EXTS
+
+MANIFEST = 'exhibit_manifest.json'
+ORIGINALS = 'originals'
+
+# Jobs run in parallel; choosing a free name in originals/ and taking it is one step
+_originals_lock = threading.Lock()
+
+PROFILE = {
+    'codecs': ('h264',),
+    'profiles': ('Constrained Baseline', 'Baseline', 'Main', 'High'),
+    'pix_fmts': ('yuv420p', 'yuvj420p'),
+    'max_fps': 30,
+    'max_level': 41,
+    'gop_seconds': 2.0,
+    'audio_codecs': ('aac',),
+    'max_channels': 2,
+    'max_sample_rate': 48000,
+}
+
+
+###############################################################################
+# Probing
+###############################################################################
+def ffprobe(path):
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_format', '-show_streams', '-of', 'json', path],
+        capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def keyframe_interval(path):
+    """Longest gap between video keyframes in seconds (reads packets, no decode)."""
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+         '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path],
+        capture_output=True, text=True, check=True)
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(',')
+        if 'K' in flags and pts not in ('', 'N/A'):
+            keyframes.append(float(pts))
+    keyframes.sort()
+    if len(keyframes) < 2:
+        return None
+    return max(b - a for a, b in zip(keyframes, keyframes[1:]))
+
+
+def top_level_atoms(path):
+    """Box types at the top of an MP4/MOV file, in file order."""
+    atoms = []
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            size, kind = struct.unpack('>I4s', header)
+            if size == 1:
+                size = struct.unpack('>Q', f.read(8))[0]
+                f.seek(size - 16, os.SEEK_CUR)
+            elif size == 0:
+                atoms.append(kind.decode('latin-1'))
+                break
+            elif size < 8:
+                break
+            else:
+                f.seek(size - 8, os.SEEK_CUR)
+            atoms.append(kind.decode('latin-1'))
+    return atoms
+
+
+def frame_rate(stream):
+    rate = stream.get('avg_frame_rate') or stream.get('r_frame_rate') or '0/1'
+    try:
+        return float(fractions.Fraction(rate))
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def check(path, probe, screen):
+    """Reasons the file is outside PROFILE; empty if it complies."""
+    reasons = []
+    streams = probe.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    if video is None:
+        return ['no video stream']
+
+    if not path.lower().endswith('.mp4'):
+        reasons.append('container is not mp4')
+    if video.get('codec_name') not in PROFILE['codecs']:
+        reasons.append(f"codec {video.get('codec_name')}")
+    elif video.get('profile') not in PROFILE['profiles']:
+        reasons.append(f"profile {video.get('profile')}")
+    if video.get('level', 0) > PROFILE['max_level']:
+        reasons.append(f"level {video.get('level')}")
+    if video.get('pix_fmt') not in PROFILE['pix_fmts']:
+        reasons.append(f"pixel format {video.get('pix_fmt')}")
+    if video.get('width', 0) > screen[0] or video.get('height', 0) > screen[1]:
+        reasons.append(f"{video.get('width')}x{video.get('height')} larger than the screen")
+    if frame_rate(video) > PROFILE['max_fps'] + 0.5:
+        reasons.append(f"{frame_rate(video):.2f} fps")
+    if video.get('has_b_frames', 0):
+        reasons.append('B-frames')
+
+    if audio is not None:
+        if audio.get('codec_name') not in PROFILE['audio_codecs']:
+            reasons.append(f"audio codec {audio.get('codec_name')}")
+        if audio.get('channels', 0) > PROFILE['max_channels']:
+            reasons.append(f"{audio.get('channels')} audio channels")
+        if int(audio.get('sample_rate', 0)) > PROFILE['max_sample_rate']:
+            reasons.append(f"audio {audio.get('sample_rate')} Hz")
+
+    if path.lower().endswith(('.mp4', '.mov')):
+        atoms = top_level_atoms(path)
+        if 'moov' in atoms and 'mdat' in atoms and atoms.index('mdat') < atoms.index('moov'):
+            reasons.append('moov after mdat')
+
+    if not reasons:
+        # Only worth reading every packet if nothing else needs a transcode
+        gop = keyframe_interval(path)
+        if gop is not None and gop > PROFILE['gop_seconds'] + 0.05:
+            reasons.append(f"keyframes every {gop:.1f}s")
+    return reasons
+
+
+###############################################################################
+# Transcoding
+###############################################################################
+def ffmpeg_command(source, output, probe, screen, threads):
+    video = next(s for s in probe['streams'] if s.get('codec_type') == 'video')
+    has_audio = any(s.get('codec_type') == 'audio' for s in probe['streams'])
+    fps = min(frame_rate(video) or PROFILE['max_fps'], PROFILE['max_fps'])
+    gop = max(1, round(fps * PROFILE['gop_seconds']))
+    scale = (f"scale='min({screen[0]},iw)':'min({screen[1]},ih)'"
+             f":force_original_aspect_ratio=decrease:force_divisible_by=2")
+
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', source,
+               '-map', '0:v:0', '-vf', f"{scale},fps={fps:.3f},format=yuv420p",
+               '-c:v', 'libx264', '-preset', 'medium', '-crf', '20',
+               '-profile:v', 'high', '-level:v', '4.1', '-bf', '0',
+               '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+               '-threads', str(threads)]
+    if has_audio:
+        command += ['-map', '0:a:0', '-c:a', 'aac', '-b:a', '160k', '-ac', '2', '-ar', '48000']
+    # moov at the front, no edit list for the demuxer to apply
+    command += ['-movflags', '+faststart', '-use_editlist', '0',
+                '-avoid_negative_ts', 'make_zero', output]
+    return command
+
+
+def plan_outputs(folder, paths, manifest):
+    """
+    Where each video's transcode goes: an .mp4 is replaced in place, any
+    other file becomes <base>.mp4 next to it, or <base>.<ext>.mp4 when that
+    name is another file or another source's output. A name counts as free
+    if nothing is there or the manifest says this source produced it. None
+    if both names are taken.
+    """
+    outputs = {}
+    claimed = {os.path.basename(path) for path in paths if path.lower().endswith('.mp4')}
+    for path in paths:
+        name = os.path.basename(path)
+        if name in claimed:
+            outputs[path] = path
+            continue
+        base, ext = os.path.splitext(name)
+        outputs[path] = None
+        for candidate in (base + '.mp4', f"{base}{ext}.mp4"):
+            ours = manifest['files'].get(candidate, {}).get('source') == name
+            if candidate not in claimed and (ours or not os.path.exists(os.path.join(folder, candidate))):
+                claimed.add(candidate)
+                outputs[path] = os.path.join(folder, candidate)
+                break
+    return outputs
+
+
+def keep_original(path):
+    """
+    Move a transcoded file's original to originals/ without replacing one
+    that is already there: clip.mov, then clip.1.mov, clip.2.mov...
+    Returns where it went.
+    """
+    originals = os.path.join(os.path.dirname(path), ORIGINALS)
+    base, ext = os.path.splitext(os.path.basename(path))
+    with _originals_lock:
+        os.makedirs(originals, exist_ok=True)
+        target = os.path.join(originals, base + ext)
+        number = 0
+        while os.path.lexists(target):
+            number += 1
+            target = os.path.join(originals, f"{base}.{number}{ext}")
+        shutil.move(path, target)
+    return target
+
+
+def compile_file(path, output, screen, threads, dry_run=False):
+    """
+    Probe one file and transcode it to `output` if needed. Returns the
+    path the file now lives at and its manifest entry.
+    """
+    started = time.monotonic()
+    entry = {'source': os.path.basename(path), 'size': os.path.getsize(path)}
+    try:
+        probe = ffprobe(path)
+        reasons = check(path, probe, screen)
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
+        entry.update(status='failed', error=f"probe: {e}")
+        return path, entry
+
+    entry['duration'] = float(probe.get('format', {}).get('duration', 0) or 0)
+    entry['reasons'] = reasons
+    if not reasons:
+        entry['status'] = 'compliant'
+        return path, entry
+    if dry_run:
+        entry['status'] = 'needs transcode'
+        return path, entry
+    if output is None:
+        entry.update(status='failed', error='no free .mp4 name for the output')
+        return path, entry
+
+    folder = os.path.dirname(path)
+    # Named after the whole source name, so clip.mov and clip.mkv never share one
+    partial = os.path.join(folder, f".{os.path.basename(path)}.compiling.mp4")
+    command = ffmpeg_command(path, partial, probe, screen, threads)
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        if os.path.exists(partial):
+            os.remove(partial)
+        entry.update(status='failed', error=result.stderr.strip()[-500:])
+        return path, entry
+
+    original = keep_original(path)
+    os.replace(partial, output)
+
+    entry.update(status='transcoded', output=os.path.basename(output),
+                 original=os.path.relpath(original, folder),
+                 output_size=os.path.getsize(output),
+                 seconds=round(time.monotonic() - started, 1))
+    return output, entry
+
+
+###############################################################################
+# Manifest
+###############################################################################
+def load_manifest(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'files': {}}
+
+
+def save_manifest(folder, manifest):
+    path = os.path.join(folder, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def up_to_date(manifest, path, screen):
+    entry = manifest['files'].get(os.path.basename(path))
+    if entry is None or entry.get('status') not in ('compliant', 'transcoded'):
+        return False
+    stat = os.stat(path)
+    # Entries from before the screen was kept per file use the manifest's
+    return (entry.get('screen', manifest.get('screen')) == list(screen)
+            and entry.get('stamp') == [stat.st_size, stat.st_mtime_ns])
+
+
+def compile_exhibit(folder, screen, jobs=None, dry_run=False, force=False):
+    cores = os.cpu_count() or 1
+    jobs = jobs or max(1, cores // 2)
+    threads = max(1, cores // jobs)
+
+    manifest = load_manifest(folder)
+    videos = [os.path.join(folder, f) for f in sorted(os.listdir(folder))
+              if f.lower().endswith(VIDEO_EXTS) and not f.startswith('.')]
+    todo = [path for path in videos if force or not up_to_date(manifest, path, screen)]
+    print(f"{folder}: {len(videos)} videos, {len(videos) - len(todo)} up to date, "
+          f"{len(todo)} to check ({jobs} jobs x {threads} threads)")
+
+    outputs = plan_outputs(folder, todo, manifest)
+    counts = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(compile_file, path, outputs[path], screen, threads, dry_run)
+                   for path in todo]
+        for future in concurrent.futures.as_completed(futures):
+            path, entry = future.result()
+            if entry['status'] in ('compliant', 'transcoded'):
+                stat = os.stat(path)
+                entry['stamp'] = [stat.st_size, stat.st_mtime_ns]
+                entry['screen'] = list(screen)
+            if entry['status'] == 'transcoded':
+                manifest['files'].pop(entry['source'], None)
+            manifest['files'][os.path.basename(path)] = entry
+            counts[entry['status']] = counts.get(entry['status'], 0) + 1
+
+            detail = ', '.join(entry.get('reasons', [])) or entry.get('error', '')
+            print(f"  {entry['status']:<15} {entry['source']}  {detail}")
+            if not dry_run:
+                # An interrupted run keeps every file finished so far
+                save_manifest(folder, manifest)
+
+    if not dry_run:
+        manifest['screen'] = list(screen)
+        manifest['profile'] = PROFILE
+        manifest['compiled_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        save_manifest(folder, manifest)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('folders', nargs='+', help='exhibit folders, e.g. Videos/Music_Exhibit')
+    parser.add_argument('--size', default='1920x1080', help='screen size, WxH')
+    parser.add_argument('--jobs', type=int, help='parallel ffmpeg jobs (default: cores / 2)')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would be transcoded')
+    parser.add_argument('--force', action='store_true', help='ignore the manifest and re-check every file')
+    args = parser.parse_args()
+
+    for tool in ('ffprobe', 'ffmpeg'):
+        if shutil.which(tool) is None:
+            print(f"{tool} not found, install ffmpeg first.")
+            sys.exit(1)
+
+    screen = tuple(int(v) for v in args.size.lower().split('x'))
+    failed = 0
+    for folder in args.folders:
+        counts = compile_exhibit(folder, screen, args.jobs, args.dry_run, args.force)
+        print(f"  {', '.join(f'{n} {status}' for status, n in sorted(counts.items())) or 'nothing to do'}")
+        failed += counts.get('failed', 0)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,14 @@ import vlc
 import serial
 import time
 import threading
-import os
 import sys
 import signal
 
+from FrameParser import FrameParser, CLOCKWISE
+from MediaCatalog import load_playlist
+from VlcLogPipeline import vlc_log
+from MediaReadiness import MediaLoadError, play_and_wait
+
 ###############################################################################
 # Encoder Controller
 ###############################################################################
@@ -37,8 +41,10 @@ class EncoderController:
         self.last_click_time = time.time()
         self.min_time_between_clicks = 0.2
         
+        self.parser = FrameParser()
+
         self._running = False
-        self.thread = threading.Thread(target=self.begin_loop, daemon=True)
+        self.thread = threading.Thread(target=self.begin_loop, name='encoder', daemon=True)
 
     def start(self):
         self._running = True
@@ -51,21 +57,24 @@ class EncoderController:
 
     def begin_loop(self):
         while self._running:
-            data = self.ser.read(4)
-            if len(data) == 4:
+            # Block for the first byte (up to the timeout), then drain
+            # everything else that has arrived in the same read
+            data = self.ser.read(max(1, self.ser.in_waiting))
+            if data:
                 self.handle_data(data)
         self.ser.close()
-        print("Encoder serial closed.")
+        print(f"Encoder serial closed. {self.parser.stats()}")
 
     def handle_data(self, data: bytes):
-        # Example: spin clockwise
-        if data == b'\xff\x00\x00\x01':
-            self.increment()
-        # Example: spin counterclockwise
-        elif data == b'\xff\x00\x00\xfe':
-            self.decrement()
-        else:
-            print(f"Unknown data: {data}")
+        # The parser resynchronises on the 0xFF header if bytes go missing
+        errors = self.parser.framing_errors
+        for direction in self.parser.feed(data):
+            if direction == CLOCKWISE:
+                self.increment()
+            else:
+                self.decrement()
+        if self.parser.framing_errors != errors:
+            print(f"Encoder resync, framing errors so far: {self.parser.framing_errors}")
 
     def increment(self):
         now = time.time()
@@ -120,28 +129,21 @@ class SlideShow:
         
         # VLC setup
         # (Try forcing software decode if desired)
-        self.instance = vlc.Instance('--avcodec-hw=none',
-                                     '--file-logging', '--logfile=vlc.log',
-                                     '--verbose=2')
+        # VLC's messages go through vlc_log instead of --file-logging
+        self.instance = vlc_log.attach(vlc.Instance('--avcodec-hw=none', '--verbose=2'))
         self.player = self.instance.media_player_new()
 
         self.media_files = self.load_media(media_folder)
         self.current_index = 0
         
         self.transitioning = False
+        self.ready_timeout = 2.0
 
         # Start with the first media
         self.display_media()
 
     def load_media(self, folder):
-        valid_exts = ('.mp4','.mkv','.mov','.avi',
-                      '.png','.jpg','.jpeg','.gif')
-        all_files = [os.path.join(folder, f) for f in os.listdir(folder)
-                     if f.lower().endswith(valid_exts)]
-        all_files.sort()
-        if not all_files:
-            raise FileNotFoundError(f"No media found in {folder}")
-        return all_files
+        return load_playlist(folder)
 
     def increment_media_index(self):
         # Called by the encoder thread. Let's just do it inline.
@@ -150,32 +152,41 @@ class SlideShow:
             print("Ignoring increment, transitioning in progress.")
             return
         self.current_index = (self.current_index + 1) % len(self.media_files)
-        self.display_media()
+        self.display_media(direction=1)
 
     def decrement_media_index(self):
         if self.transitioning:
             print("Ignoring decrement, transitioning in progress.")
             return
         self.current_index = (self.current_index - 1) % len(self.media_files)
-        self.display_media()
+        self.display_media(direction=-1)
 
-    def display_media(self):
+    def display_media(self, direction=1):
         if self.transitioning:
             print("Already transitioning, ignoring new request.")
             return
-        
-        media_path = self.media_files[self.current_index]
-        print(f"Displaying: {media_path}")
-        
-        # You can stop any previous playback
-        self.player.stop()
 
         # Mark that we're in a "transition"
         self.transitioning = True
-        time.sleep(0.5)  # optional small delay for stability
 
-        # Actually "play" the new file
-        self.play_video(media_path)
+        # Try files in the direction of travel until one actually starts.
+        # No fixed delay: play_video returns as soon as the first frame is up.
+        for _ in range(len(self.media_files)):
+            media_path = self.media_files[self.current_index]
+            print(f"Displaying: {media_path}")
+
+            # You can stop any previous playback
+            self.player.stop()
+
+            try:
+                self.play_video(media_path)
+                break
+            except MediaLoadError as e:
+                print(f"Skipping: {e}")
+            except TimeoutError:
+                print(f"No picture yet, leaving it to VLC: {media_path}")
+                break
+            self.current_index = (self.current_index + direction) % len(self.media_files)
 
         # End transition
         self.transitioning = False
@@ -192,7 +203,8 @@ class SlideShow:
         # open its own window. So just omit set_xwindow() entirely:
         # self.player.set_xwindow(0)
 
-        self.player.play()
+        # Play and wait for the first frame (or an error) from VLC's events
+        play_and_wait(self.player, media_path, timeout=self.ready_timeout)
         # The video or image is now playing in a separate VLC window.
 
 
@@ -213,6 +225,7 @@ def main(media_folder='Videos', serial_port='/dev/ttyS0'):
         print("Ctrl+C pressed, shutting down.")
         controller.stop()
         slideshow.player.stop()
+        vlc_log.detach()
         sys.exit(0)
 
     signal.signal(signal.SIGINT, signal_handler)
@@ -7,6 +7,21 @@ import os
 import sys
 import signal
 
+from CommandQueue import CommandQueue, PlaybackWorker
+from FrameParser import FrameParser, CLOCKWISE
+from TickAccumulator import TickAccumulator
+from LatencyTracker import latency
+from Tracer import tracer
+from VlcLogPipeline import vlc_log
+from IOPrefetcher import IOPrefetcher
+from PlaybackStats import PlaybackStats
+from Viewer import Viewer
+from PlayerPool import PlayerPool
+from ExhibitWatcher import ExhibitWatcher, apply_delta, ADDED, MODIFIED, REMOVED, RESCAN
+from MediaCatalog import MediaCatalog, load_playlist, artist_from_filename
+from MediaReadiness import MediaLoadError
+from TransitionScheduler import Transition, TransitionScheduler
+
 ###############################################################################
 # EncoderController - reads encoder data from /dev/ttyS0, calls increments
 ###############################################################################
@@ -19,20 +34,29 @@ class EncoderController:
         )
         self.incrementCallback = None
         self.decrementCallback = None
+        # Optional: receives one NavigationCommand per gesture
+        self.navigateCallback = None
+        # Optional: hintCallback(direction, steps) as soon as a turn starts,
+        # (0, 0) when it was abandoned before completing a detent
+        self.hintCallback = None
+        self.hint = (0, 0)
 
         self.tics_per_increment = 4
-        self.increment_count = 0
 
-        # Rate-limiting: only trigger a "full increment" every X seconds
+        # Ticks are never dropped: bursts are merged into one command once
+        # the knob has been still for burst_gap, at most one command every
+        # min_time_between_increment seconds
         self.min_time_between_increment = 0.1
-        self.last_increment_time = time.time()
+        self.burst_gap = 0.08
+        self.accumulator = TickAccumulator(self.tics_per_increment,
+                                           burst_gap=self.burst_gap,
+                                           min_interval=self.min_time_between_increment)
+        self.idle_timeout = 1.0
 
-        # Also skip rapid "clicks"
-        self.min_time_between_clicks = 0.01
-        self.last_click_time = time.time()
+        self.parser = FrameParser()
 
         self._running = False
-        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread = threading.Thread(target=self._loop, name='encoder', daemon=True)
 
     def start(self):
         self._running = True
@@ -41,70 +65,90 @@ class EncoderController:
 
     def stop(self):
         print("Stopping EncoderController...")
-        if self.player:
+        if getattr(self, 'player', None):
             self.player.stop()
         self._running = False
 
     def _loop(self):
         while self._running:
-            data = self.ser.read(4)
-            if len(data) == 4:
-                self.handle_data(data)
+            # Block for the first byte (up to the timeout), then drain
+            # everything else that has arrived in the same read
+            data = self.ser.read(max(1, self.ser.in_waiting))
+            if data:
+                self.handle_data(data, time.monotonic())
+            self.flush_ticks()
         self.ser.close()
-        print("Encoder serial closed.")
-
-    def handle_data(self, data: bytes):
-        if data == b'\xff\x00\x00\x01':  # Clockwise
-            self.increment()
-        elif data == b'\xff\x00\x00\xfe':  # Counterclockwise
-            self.decrement()
+        print(f"Encoder serial closed. {self.parser.stats()}")
+
+    @tracer.traced('encoder.handle_data')
+    def handle_data(self, data: bytes, received_at=None):
+        # The parser resynchronises on the 0xFF header if bytes go missing
+        if received_at is None:
+            received_at = time.monotonic()
+        errors = self.parser.framing_errors
+        directions = self.parser.feed(data)
+        if directions:
+            latency.mark('decoded', received_at)
+        for direction in directions:
+            if direction == CLOCKWISE:
+                self.increment(received_at)
+            else:
+                self.decrement(received_at)
+        if self.parser.framing_errors != errors:
+            print(f"Encoder resync, framing errors so far: {self.parser.framing_errors}")
+
+    def increment(self, received_at=None):
+        self.accumulator.add(1, received_at or time.monotonic())
+
+    def decrement(self, received_at=None):
+        self.accumulator.add(-1, received_at or time.monotonic())
+
+    def flush_ticks(self):
+        """Send the current burst on once it is over."""
+        command = self.accumulator.poll(time.monotonic())
+
+        # Wake up soon while a burst is open so it is sent promptly, and
+        # only once a second while the knob is idle
+        timeout = self.burst_gap if self.accumulator.pending else self.idle_timeout
+        if self.ser.timeout != timeout:
+            self.ser.timeout = timeout
+
+        if command is not None:
+            # The command itself takes over from any hint
+            self.hint = (0, 0)
+            self.navigate(command)
+        elif self.accumulator.abandoned:
+            # The turn stopped short of a detent: withdraw the hint
+            self.accumulator.abandoned = False
+            self.hint = (0, 0)
+            if callable(self.hintCallback):
+                self.hintCallback(0, 0)
         else:
-            print(f"Unknown data: {data}")
+            self.update_hint()
 
-    def increment(self):
-        now = time.time()
-        print('Incrementing...')
-        # Basic click gate
-        if (now - self.last_click_time) < self.min_time_between_clicks:
+    def update_hint(self):
+        """Tell the slideshow which way a turn is heading before its detent completes."""
+        hint = self.accumulator.hint()
+        if hint == self.hint:
             return
-        self.last_click_time = now
-
-        self.increment_count = (self.increment_count + 1) % self.tics_per_increment
-        if self.increment_count != 0:
+        self.hint = hint
+        if callable(self.hintCallback):
+            self.hintCallback(*hint)
+
+    @tracer.traced('encoder.navigate')
+    def navigate(self, command):
+        print(f"Navigating: {command}")
+        latency.mark('command', command.origin)
+        if callable(self.navigateCallback):
+            self.navigateCallback(command)
             return
-
-        # Also enforce a min time between "full increments"
-        if (now - self.last_increment_time) < self.min_time_between_increment:
+        # Older slideshows only know single steps
+        callback = self.incrementCallback if command.steps > 0 else self.decrementCallback
+        if not callable(callback):
+            print("increment/decrementCallback is not set.")
             return
-        self.last_increment_time = now
-
-        if callable(self.incrementCallback):
-            print("Calling incrementCallback.")
-            self.incrementCallback()
-        else:
-            print("incrementCallback is not set.")
-
-    def decrement(self):
-        now = time.time()
-        # Basic click gate
-        if (now - self.last_click_time) < self.min_time_between_clicks:
-            return
-        self.last_click_time = now
-
-        self.increment_count = (self.increment_count - 1) % self.tics_per_increment
-        if self.increment_count != 0:
-            return
-
-        # Also enforce a min time between "full increments"
-        if (now - self.last_increment_time) < self.min_time_between_increment:
-            return
-        self.last_increment_time = now
-        # If you want time gating for decrement too, you can add it:
-        if callable(self.decrementCallback):
-            print("Calling decrementCallback.")
-            self.decrementCallback()
-        else:
-            print("decrementCallback is not set.")
+        for _ in range(abs(command.steps)):
+            callback()
 
     def start_video(self, video_path):
         self.media = self.instance.media_new(video_path)
@@ -114,177 +158,396 @@ class EncoderController:
 
 
 ###############################################################################
-# SlideShow - single VLC window, always fullscreen, re-used for each media
+# SlideShow - pool of pre-rolled VLC players, each in its own viewer surface
 ###############################################################################
 class SlideShow:
     """
-    A slideshow that uses one VLC MediaPlayer in fullscreen for all media (videos or images).
+    A slideshow that keeps the current media and its neighbours pre-rolled on a
+    pool of VLC MediaPlayers. Moving to a neighbour only swaps which player's
+    surface is on top and fades it in.
+
+    With compositor=True the players decode into memory instead and a
+    VideoCompositor crossfades the pictures themselves on one surface.
     """
-    def __init__(self, controller, media_folder):
+    def __init__(self, controller, viewer, media_folder, preload_radius=1, ready_timeout=2.0,
+                 compositor=False):
         self.controller = controller
+        self.viewer = viewer
         # Attach callbacks
         self.controller.incrementCallback = self.increment_media_index
         self.controller.decrementCallback = self.decrement_media_index
+        self.controller.navigateCallback = self.navigate
+        self.controller.hintCallback = self.hint
 
         # Create VLC instance with compositing options
-        self.instance = vlc.Instance('--fullscreen', '--avcodec-hw=none',
-                                   '--video-x=0', '--video-y=0',
-                                   '--marq-opacity=255',
-                                   '--file-logging', '--logfile=vlc.log', '--verbose=2')
-        
-        # Create two players for cross dissolve
-        self.player_a = self.instance.media_player_new()
-        self.player_b = self.instance.media_player_new()
-        self.current_player = self.player_a
-        self.next_player = self.player_b
-        
-        # Set both players to fullscreen
-        self.player_a.set_fullscreen(True)
-        self.player_b.set_fullscreen(True)
+        # VLC's messages go through vlc_log instead of --file-logging
+        self.instance = vlc_log.attach(vlc.Instance('--avcodec-hw=none',
+                                                    '--marq-opacity=255',
+                                                    '--verbose=2'))
         
-        # Configure marquee for filename display
-        self.player_a.video_set_marquee_int(vlc.VideoMarqueeOption.Enable, 1)
-        self.player_a.video_set_marquee_int(vlc.VideoMarqueeOption.Size, 24)  # font size
-        self.player_a.video_set_marquee_int(vlc.VideoMarqueeOption.Position, 9)  # bottom-left
-        self.player_a.video_set_marquee_int(vlc.VideoMarqueeOption.Opacity, 255)
-        self.player_a.video_set_marquee_int(vlc.VideoMarqueeOption.Timeout, 0)  # permanent
-        
-        self.player_b.video_set_marquee_int(vlc.VideoMarqueeOption.Enable, 1)
-        self.player_b.video_set_marquee_int(vlc.VideoMarqueeOption.Size, 24)
-        self.player_b.video_set_marquee_int(vlc.VideoMarqueeOption.Position, 8)
-        self.player_b.video_set_marquee_int(vlc.VideoMarqueeOption.Opacity, 255)
-        self.player_b.video_set_marquee_int(vlc.VideoMarqueeOption.Timeout, 0)
-        
-        # Load media paths
+        # Load media paths (and what is known about them) from the catalog
+        self.catalog = MediaCatalog()
         self.media_files = self._load_media(media_folder)
         self.current_index = 0
-        self.transitioning = False
         self.media_loaded = False
+        self.ready_timeout = ready_timeout
+        self._index_lock = threading.Lock()
+
+        # Pool of players keeping the next/previous preload_radius items
+        # opened and paused on their first frame
+        self.viewer.window.update_idletasks()
+        self.compositor = None
+        if compositor:
+            from VideoCompositor import VideoCompositor
+            # The window is fullscreen, but may not be mapped yet
+            self.compositor = VideoCompositor(self.viewer, (self.viewer.root.winfo_screenwidth(),
+                                                            self.viewer.root.winfo_screenheight()))
+            if self.compositor.calibrate():
+                self.compositor.start()
+            else:
+                # Before any player is attached: they keep their own surfaces
+                # and the marquee/audio crossfade
+                print("Compositor too slow for this screen, using VLC surfaces.")
+                self.compositor.close()
+                self.compositor = None
+        self.pool = PlayerPool(self.instance, self.viewer, self.media_files,
+                               radius=preload_radius,
+                               setup_player=self._setup_player,
+                               setup_media=self._setup_media)
+        self.current_slot = None
+
+        # One item beyond what the pool pre-rolls is read into the page
+        # cache ahead of time, so opening it never waits on the SD card
+        self.io_prefetcher = IOPrefetcher(self.media_files, radius=preload_radius + 1)
+
+        # Decoded/lost frames and bitrate of every play, summed per file.
+        # Sampled on the Tk loop; plays start and end there too
+        self.playback_stats = PlaybackStats()
+        self.viewer.root.after(self.playback_stats.interval_ms, self._sample_playback_stats)
+
+        # Fades run on their own timer thread so input never waits on them
+        self.scheduler = TransitionScheduler(self._start_transition)
+        self.scheduler.start()
+
+        # Curators copy files in while the show runs: apply them live
+        self.media_folder = media_folder
+        self.watcher = ExhibitWatcher(media_folder, self._media_changed, known=self.media_files)
+        self.watcher.start()
         
         # Start on the first media
         self.display_media()
 
+    def _setup_player(self, player):
+        if self.compositor is not None:
+            self.compositor.attach(player)
+        # Configure marquee for filename display
+        player.video_set_marquee_int(vlc.VideoMarqueeOption.Enable, 1)
+        player.video_set_marquee_int(vlc.VideoMarqueeOption.Size, 24)  # font size
+        player.video_set_marquee_int(vlc.VideoMarqueeOption.Position, 9)  # bottom-left
+        player.video_set_marquee_int(vlc.VideoMarqueeOption.Opacity, 0)
+        player.video_set_marquee_int(vlc.VideoMarqueeOption.Timeout, 0)  # permanent
+
+    def _setup_media(self, player, media, media_path):
+        # Artist parsed from the #Artist_Name# filename convention
+        row = self.catalog.get(media_path)
+        artist = row['artist'] if row is not None else artist_from_filename(os.path.basename(media_path))
+        player.video_set_marquee_string(vlc.VideoMarqueeOption.Text, artist or '')
+        player.video_set_marquee_int(vlc.VideoMarqueeOption.Opacity, 0)
+
     def _load_media(self, folder):
-        valid_exts = ('.mp4','.mkv','.mov','.avi',
-                      '.png','.jpg','.jpeg','.gif')
-        all_files = []
-        for f in sorted(os.listdir(folder)):
-            if f.lower().endswith(valid_exts):
-                all_files.append(os.path.join(folder, f))
-        if not all_files:
-            raise FileNotFoundError(f"No media found in {folder}")
-        return all_files
+        return load_playlist(folder, catalog=self.catalog)
+
+    def _media_changed(self, kind, path):
+        """
+        Runs on the watcher thread for every file added, removed or
+        rewritten in the exhibit folder. Edits the playlist in place and
+        re-points the pool; only the affected file is probed.
+        """
+        if kind in (ADDED, MODIFIED):
+            self.catalog.update_file(path)
+        elif kind == REMOVED:
+            self.catalog.remove_file(path)
+        elif kind == RESCAN:
+            self.catalog.refresh(self.media_folder)
+        print(f"Exhibit {kind}: {os.path.basename(path)}")
+
+        with self._index_lock:
+            current_path = self.media_files[self.current_index] if self.media_files else None
+            if kind == RESCAN:
+                self.media_files[:] = self.catalog.playlist(self.media_folder)
+                self.current_index = (self.media_files.index(current_path)
+                                      if current_path in self.media_files else 0)
+            elif kind != MODIFIED:
+                self.current_index = apply_delta(self.media_files, self.current_index, kind, path)
+            self.pool.playlist_changed(invalidated=(path,) if kind == MODIFIED else ())
+            if not self.media_files:
+                print("Exhibit folder is empty.")
+                return
+            replaced = self.media_files[self.current_index] != current_path or path == current_path
+            target = (self.current_index, 1, None)
+        if replaced:
+            # What was on screen went away or changed, show what is there now
+            self.scheduler.request(target)
+        else:
+            with self._index_lock:
+                self.pool.focus(target[0])
 
     def increment_media_index(self):
-        if self.transitioning:
-            print("Ignoring increment, because we are in a transition.")
-            return
-        self.current_index = (self.current_index + 1) % len(self.media_files)
-        self.display_media()
+        # Called on the input thread: only record the new target, the
+        # transition scheduler does the rest on its own thread
+        with self._index_lock:
+            self.current_index = (self.current_index + 1) % len(self.media_files)
+            target = (self.current_index, 1, time.monotonic())
+        self.scheduler.request(target)
 
     def decrement_media_index(self):
-        if self.transitioning:
-            print("Ignoring decrement, because we are in a transition.")
+        with self._index_lock:
+            self.current_index = (self.current_index - 1) % len(self.media_files)
+            target = (self.current_index, -1, time.monotonic())
+        self.scheduler.request(target)
+
+    def navigate(self, command):
+        # A whole gesture at once: jump to the final target and never load
+        # the items in between
+        if command.steps == 0:
             return
-        self.current_index = (self.current_index - 1) % len(self.media_files)
-        self.display_media()
-
-    def display_media(self):
-        if self.transitioning:
-            print("Another display is in progress, ignoring.")
+        latency.mark('callback', command.origin)
+        with self._index_lock:
+            self.current_index = (self.current_index + command.steps) % len(self.media_files)
+            target = (self.current_index, 1 if command.steps > 0 else -1, command.origin)
+        self.scheduler.request(target)
+
+    def hint(self, direction, steps):
+        """
+        Called on the encoder thread from the first tick of a turn: start
+        opening the likely target (and the neighbour beyond it) in a spare
+        player while the knob is still moving.
+        """
+        if direction == 0:
+            self.pool.cancel_speculation()
             return
-        
-        media_path = self.media_files[self.current_index]
-        filename = os.path.basename(media_path)
-        print(f"Displaying: {media_path}")
-        self.transitioning = True
+        with self._index_lock:
+            if not self.media_files:
+                return
+            target = self.current_index + direction * steps
+            # The same items go into the page cache and the spare players
+            targets = [target, target + direction]
+            # The pool reads the playlist, which the watcher edits under this lock
+            self.pool.speculate(targets)
+        self.io_prefetcher.prefetch(targets)
+
+    def display_media(self, direction=1):
+        with self._index_lock:
+            target = (self.current_index, direction, None)
+        self.scheduler.request(target)
+
+    @property
+    def transitioning(self):
+        return self.scheduler.busy
+
+    @tracer.traced('transition.prepare')
+    def _start_transition(self, target):
+        """
+        Runs on the scheduler thread. Waits for the target to be pre-rolled
+        and returns the crossfade to run, or None if a newer target came in.
+        """
+        index, direction, origin = target
         self.media_loaded = False
 
-        # Prepare next media on the inactive player
-        media = self.instance.media_new(media_path)
-        self.next_player.set_media(media)
-        self.next_player.audio_set_volume(0)
-        
-        # if there is a # in the filename
-        if '#' in filename:
-            artist = filename.split('#')[1].replace('_', ' ')
-            self.next_player.video_set_marquee_string(vlc.VideoMarqueeOption.Text, artist)
-        else:
-            self.next_player.video_set_marquee_string(vlc.VideoMarqueeOption.Text, '')
-        
-        self.next_player.play()
-        
-        # Wait for media to be properly loaded
-        max_wait = 20  # Maximum wait time in deciseconds
-        while max_wait > 0 and not self.next_player.will_play():
-            time.sleep(0.1)
-            max_wait -= 1
-            
-        # Additional small delay to ensure media is ready
-        time.sleep(0.3)
-        
-        # Now get dimensions and set marquee
-        video_height = self.next_player.video_get_height() or 1080  # fallback to 1080p
-        font_size = max(24, int(video_height / 30))  # minimum size of 24
-        print(f"Video height: {video_height}, Font size: {font_size}")
-        
-        self.next_player.video_set_marquee_int(vlc.VideoMarqueeOption.Size, 0)
-        self.next_player.video_set_marquee_int(vlc.VideoMarqueeOption.Position, 9)
-        
-        # Cross fade between players
-        steps = 51  # Number of steps for fade
-        for i in range(steps):
-            # Fade video
-            opacity = int((i / (steps-1)) * 255)
-            self.next_player.video_set_marquee_int(vlc.VideoMarqueeOption.Opacity, opacity)
-            
-            # Fade audio
-            vol_out = int(100 * (1 - (i / (steps-1))))
-            vol_in = int(100 * (i / (steps-1)))
-            self.current_player.audio_set_volume(vol_out)
-            self.next_player.audio_set_volume(vol_in)
-            
-            time.sleep(0.02)
-        
-        # Ensure clean state
-        self.current_player.audio_set_volume(0)
-        self.current_player.stop()
-        self.next_player.audio_set_volume(100)
-        
-        # Swap players
-        self.current_player, self.next_player = self.next_player, self.current_player
-        
-        self.transitioning = False
+        # Usually the neighbour is already sitting on its first frame. Files
+        # VLC cannot open are skipped in the direction of travel right away.
+        next_slot = None
+        with self._index_lock:
+            attempts = len(self.media_files)
+        for _ in range(attempts):
+            # The watcher edits the playlist in place under _index_lock
+            # while the exhibit is edited, so only touch it holding the lock
+            with self._index_lock:
+                if not self.media_files:
+                    return None
+                index %= len(self.media_files)
+                media_path = self.media_files[index]
+                with tracer.span('pool.focus', {'path': media_path}):
+                    slot = self.pool.focus(index)
+            print(f"Displaying: {media_path}")
+            self.io_prefetcher.focus(index)
+            try:
+                with tracer.span('wait_ready'):
+                    ready = self._wait_ready(slot)
+                if ready:
+                    next_slot = slot
+                    break
+            except MediaLoadError as e:
+                print(f"Skipping: {e}")
+                # Keep the debug context of the failure
+                vlc_log.dump(f"skipped {media_path}: {e}")
+            if self.scheduler.superseded():
+                return None
+            with self._index_lock:
+                count = len(self.media_files)
+                if not count:
+                    return None
+                index = (index + direction) % count
+                # Only move the shared index if the visitor hasn't since
+                if self.current_index == (index - direction) % count:
+                    self.current_index = index
+
+        if next_slot is None:
+            if not self.scheduler.superseded():
+                print("No playable media found.")
+            return None
+        if next_slot is self.current_slot:
+            return None
+        self.pool.pin(next_slot)
+        self.media_loaded = True
+        latency.mark('ready', origin)
+
+        with tracer.span('set_pause'):
+            next_slot.player.set_pause(0)
+        # Tk calls belong on the Tk thread, so that is where it goes on screen
+        self.viewer.root.after(0, self._show_slot, next_slot, origin)
+        return PlayerCrossfade(self, self.current_slot, next_slot, origin)
+
+    def _show_slot(self, slot, origin):
+        # Swap which surface is visible; the compositor instead blends the
+        # two players on its own surface
+        if self.compositor is None:
+            self.viewer.raise_surface(slot.surface)
+        latency.mark('shown', origin)
+        # The outgoing item is swapped out the moment this one is shown;
+        # start() first records that play
+        self.playback_stats.start(slot.path, slot.player.get_media())
+
+    def _sample_playback_stats(self):
+        self.playback_stats.sample()
+        self.viewer.root.after(self.playback_stats.interval_ms, self._sample_playback_stats)
+
+    def _wait_ready(self, slot):
+        """
+        Wait for the slot's first frame in short slices so a newer target
+        can cut the wait short. Returns False if superseded.
+        """
+        deadline = time.monotonic() + self.ready_timeout
+        while True:
+            try:
+                slot.wait_ready(0.05)
+                return True
+            except TimeoutError:
+                if self.scheduler.superseded():
+                    return False
+                if time.monotonic() >= deadline:
+                    # Slow to open but not broken, show it as soon as it is up
+                    print(f"Media not ready after {self.ready_timeout}s: {slot.path}")
+                    return True
+
+    @tracer.traced('transition.done')
+    def _transition_done(self, old_slot, new_slot):
+        # The old player goes back to its first frame so it is ready again
+        # if the visitor turns back
+        if old_slot and old_slot is not new_slot:
+            self.pool.rewind(old_slot)
+            self.pool.unpin(old_slot)
+        self.current_slot = new_slot
 
     def stop(self):
         print("Slideshow stopping.")
-        self.player_a.stop()
-        self.player_b.stop()
+        self.watcher.stop()
+        self.io_prefetcher.stop()
+        self.scheduler.stop()
+        if self.compositor is not None:
+            print(f"Compositor: {self.compositor}")
+            self.compositor.stop()
+        # Before the pool stops the players, while their counters are live
+        self.playback_stats.close()
+        print(f"Playback stats: {self.playback_stats}")
+        self.pool.stop()
+        print(f"VLC log: {vlc_log}")
+        vlc_log.detach()
+        tracer.save()
+
+
+class PlayerCrossfade(Transition):
+    """
+    Fades the marquee and audio of the incoming player up and the outgoing
+    player's audio down. Interrupting it snaps to the end state so the next
+    fade can start from the new player straight away.
+    """
+    def __init__(self, slideshow, old_slot, new_slot, origin=None):
+        self.slideshow = slideshow
+        self.old_slot = old_slot
+        self.new_slot = new_slot
+        self.origin = origin
+        self.interrupted = False
+
+    @tracer.traced('fade.step')
+    def step(self, progress):
+        next_player = self.new_slot.player
+        compositor = self.slideshow.compositor
+        if compositor is not None:
+            # A real picture crossfade
+            compositor.fade(self.old_slot.player if self.old_slot else None, next_player, progress)
+        # Fade video
+        next_player.video_set_marquee_int(vlc.VideoMarqueeOption.Opacity, int(progress * 255))
+        # Fade audio
+        if self.old_slot:
+            self.old_slot.player.audio_set_volume(int(100 * (1 - progress)))
+        next_player.audio_set_volume(int(100 * progress))
+
+    def finish(self):
+        self.step(1.0)
+        self.slideshow._transition_done(self.old_slot, self.new_slot)
+        if not self.interrupted:
+            latency.mark('fade_complete', self.origin)
+
+    def interrupt(self):
+        self.interrupted = True
+        self.finish()
 
 
 ###############################################################################
 # Main script
 ###############################################################################
-def main(media_folder='Videos', serial_port='/dev/ttyS0'):
+def main(media_folder='Videos', serial_port='/dev/ttyS0', preload_radius=1, compositor=False):
     # 1) Create the EncoderController
     controller = EncoderController(port=serial_port)
-    # 2) Create the slideshow
-    slideshow = SlideShow(controller, media_folder)
-    # 3) Start reading encoder
+    # 2) Create the fullscreen viewer the players render into
+    viewer = Viewer()
+    # 3) Create the slideshow
+    slideshow = SlideShow(controller, viewer, media_folder, preload_radius=preload_radius,
+                          compositor=compositor)
+    # 4) Input goes through a command queue to one playback worker, so the
+    #    serial thread never runs slideshow code itself
+    commands = CommandQueue()
+    commands.attach(controller)
+    worker = PlaybackWorker(commands, slideshow)
+    worker.start()
+    # 5) Start reading encoder
     controller.start()
 
     # Graceful shutdown on Ctrl+C
     def signal_handler(sig, frame):
         print("Caught Ctrl+C, exiting...")
-        controller.stop()
-        slideshow.stop()
-        sys.exit(0)
+        viewer.quit()
 
     signal.signal(signal.SIGINT, signal_handler)
+    # kill -USR1 <pid> prints the latency percentiles without stopping
+    signal.signal(signal.SIGUSR1, lambda sig, frame: latency.dump())
+    # kill -USR2 <pid> writes the trace so far (SLIDESHOW_TRACE=trace.json)
+    signal.signal(signal.SIGUSR2, lambda sig, frame: tracer.save())
+
+    # Tk's mainloop blocks in C, wake it up regularly so Python signal
+    # handlers get a chance to run
+    def keep_alive():
+        viewer.root.after(250, keep_alive)
+    keep_alive()
 
     print("Slideshow running. Press Ctrl+C to exit.")
-    while True:
-        time.sleep(1)
+    viewer.start()
+
+    controller.stop()
+    worker.stop()
+    slideshow.stop()
+    latency.dump()
 
 if __name__ == "__main__":
     exhibit = sys.argv[1] if len(sys.argv) > 1 else 'Videos'
@@ -299,4 +562,5 @@ if __name__ == "__main__":
         folder = 'Videos'
     
     port = sys.argv[2] if len(sys.argv) > 2 else '/dev/ttyS0'
-    main(folder, port)
+    radius = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3].isdigit() else 1
+    main(folder, port, radius, compositor='--compositor' in sys.argv)
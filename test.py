@@ -0,0 +1,527 @@
+"""
+Tests for the pure-logic parts of the slideshow (no serial port, VLC or Tk).
+
+    python -m unittest test
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from CommandQueue import CommandQueue, PlaybackWorker, TkCommandPump
+from ExhibitWatcher import (ADDED, EVENT, IN_CLOSE_WRITE, IN_DELETE, IN_ISDIR, IN_MOVED_TO, IN_Q_OVERFLOW,
+                            MODIFIED, REMOVED, RESCAN, ExhibitWatcher, apply_delta)
+from FrameParser import CLOCKWISE, COUNTERCLOCKWISE, FrameParser
+from ImageCache import ImageCache
+from exhibit_compiler import keep_original, plan_outputs
+from LatencyTracker import Histogram
+from TickAccumulator import TickAccumulator
+from VlcLogPipeline import RateLimiter
+from vlc_log_report import LogAnalyzer
+
+CW = b'\xff\x00\x00\x01'
+CCW = b'\xff\x00\x00\xfe'
+
+
+class Target:
+    """Stands in for a slideshow: records what the queue dispatches."""
+    def __init__(self):
+        self.steps = []
+        self.stopped = threading.Event()
+        self.navigated = threading.Event()
+
+    def navigate(self, command):
+        self.steps.append(command.steps)
+        self.navigated.set()
+
+    def stop(self):
+        self.stopped.set()
+
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay, callback):
+        self.scheduled.append(callback)
+
+
+class CommandQueueTest(unittest.TestCase):
+    def test_consecutive_navigates_coalesce(self):
+        commands = CommandQueue()
+        commands.put('navigate', 1, velocity=2.0, origin=10.0)
+        commands.put('navigate', 1, velocity=5.0, origin=11.0)
+        commands.put('navigate', -3, velocity=1.0, origin=12.0)
+        drained = commands.drain()
+        self.assertEqual(len(drained), 1)
+        self.assertEqual(drained[0].steps, -1)
+        self.assertEqual(drained[0].velocity, 5.0)
+        # The burst is as old as its first command
+        self.assertEqual(drained[0].origin, 10.0)
+        self.assertEqual(len(commands), 0)
+
+    def test_other_commands_keep_their_place(self):
+        commands = CommandQueue()
+        for kind, steps in (('navigate', 1), ('quit', 0), ('navigate', 1), ('navigate', 2)):
+            commands.put(kind, steps)
+        drained = commands.drain()
+        self.assertEqual([(c.kind, c.steps) for c in drained],
+                         [('navigate', 1), ('quit', 0), ('navigate', 3)])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        commands = CommandQueue(maxlen=2)
+        self.assertTrue(commands.put('navigate', 1))
+        self.assertTrue(commands.put('quit'))
+        self.assertFalse(commands.put('navigate', 1))
+        self.assertEqual(commands.dropped, 1)
+        self.assertEqual(len(commands.drain()), 2)
+
+    def test_worker_dispatches_until_stopped(self):
+        commands = CommandQueue()
+        target = Target()
+        worker = PlaybackWorker(commands, target)
+        worker.start()
+        commands.put('navigate', 2)
+        self.assertTrue(target.navigated.wait(1.0))
+        commands.put('quit')
+        self.assertTrue(target.stopped.wait(1.0))
+        worker.stop()
+        worker._thread.join(1.0)
+        self.assertFalse(worker._thread.is_alive())
+        # Nobody drains the queue any more, putting still never blocks
+        self.assertTrue(commands.put('navigate', 1))
+        self.assertEqual(target.steps, [2])
+        self.assertEqual(worker.stats.count, 2)
+
+    def test_tk_pump_schedules_one_drain_per_burst(self):
+        commands = CommandQueue()
+        root = FakeRoot()
+        target = Target()
+        TkCommandPump(commands, root, target)
+        for _ in range(3):
+            commands.put('navigate', 1)
+        self.assertEqual(len(root.scheduled), 1)
+        root.scheduled.pop()()
+        self.assertEqual(target.steps, [3])
+        commands.put('navigate', -1)
+        self.assertEqual(len(root.scheduled), 1)
+
+
+class FrameParserTest(unittest.TestCase):
+    def setUp(self):
+        self.parser = FrameParser()
+
+    def test_clean_frames(self):
+        self.assertEqual(self.parser.feed(CW + CCW + CW), [CLOCKWISE, COUNTERCLOCKWISE, CLOCKWISE])
+        self.assertEqual(self.parser.framing_errors, 0)
+        self.assertEqual(self.parser.frames_decoded, 3)
+
+    def test_frame_split_across_reads(self):
+        data = CW + CCW
+        directions = []
+        for i in range(len(data)):
+            directions += self.parser.feed(data[i:i + 1])
+        self.assertEqual(directions, [CLOCKWISE, COUNTERCLOCKWISE])
+        self.assertEqual(self.parser.buffer, b'')
+
+    def test_partial_frame_is_kept(self):
+        self.assertEqual(self.parser.feed(CW + CCW[:2]), [CLOCKWISE])
+        self.assertEqual(self.parser.feed(CCW[2:]), [COUNTERCLOCKWISE])
+
+    def test_resync_after_dropped_byte(self):
+        self.assertEqual(self.parser.feed(CW[:3] + CCW + CW), [COUNTERCLOCKWISE, CLOCKWISE])
+        self.assertGreater(self.parser.framing_errors, 0)
+        self.assertEqual(self.parser.bytes_discarded, 3)
+
+    def test_resync_after_inserted_byte(self):
+        self.assertEqual(self.parser.feed(CW + b'\x00' + CCW), [CLOCKWISE, COUNTERCLOCKWISE])
+        self.assertEqual(self.parser.bytes_discarded, 1)
+
+    def test_garbage_after_header(self):
+        self.assertEqual(self.parser.feed(b'\xff\x12\x34\x56' + CW), [CLOCKWISE])
+        self.assertEqual(self.parser.bytes_discarded, 4)
+
+    def test_reset_drops_partial_frame(self):
+        self.parser.feed(CW[:2])
+        self.parser.reset()
+        self.assertEqual(self.parser.feed(CCW), [COUNTERCLOCKWISE])
+
+
+class TickAccumulatorTest(unittest.TestCase):
+    def test_burst_is_one_command(self):
+        accumulator = TickAccumulator(tics_per_increment=4, burst_gap=0.08)
+        for i in range(8):
+            accumulator.add(1, i * 0.01)
+        self.assertIsNone(accumulator.poll(0.1))
+        command = accumulator.poll(0.2)
+        self.assertEqual(command.steps, 2)
+        self.assertEqual(command.ticks, 8)
+        self.assertEqual(command.origin, 0.0)
+        self.assertFalse(accumulator.pending)
+
+    def test_partial_detent_carries_over(self):
+        accumulator = TickAccumulator(tics_per_increment=4, burst_gap=0.08)
+        for i in range(5):
+            accumulator.add(-1, i * 0.01)
+        self.assertEqual(accumulator.poll(0.5).steps, -1)
+        self.assertEqual(accumulator.carry, -1)
+        for i in range(3):
+            accumulator.add(-1, 1.0 + i * 0.01)
+        self.assertEqual(accumulator.poll(1.5).steps, -1)
+        self.assertEqual(accumulator.carry, 0)
+
+    def test_min_interval_holds_ticks_for_next_command(self):
+        accumulator = TickAccumulator(tics_per_increment=1, burst_gap=0.05, min_interval=0.5)
+        accumulator.add(1, 0.0)
+        self.assertEqual(accumulator.poll(0.1).steps, 1)
+        accumulator.add(1, 0.2)
+        accumulator.add(1, 0.3)
+        self.assertIsNone(accumulator.poll(0.4))
+        self.assertEqual(accumulator.poll(0.6).steps, 2)
+
+    def test_fast_gesture_is_multiplied(self):
+        accumulator = TickAccumulator(tics_per_increment=1, burst_gap=0.05,
+                                      fast_velocity=8.0, fast_multiplier=3)
+        for i in range(10):
+            accumulator.add(1, i * 0.01)
+        command = accumulator.poll(0.2)
+        self.assertGreaterEqual(command.velocity, 8.0)
+        self.assertEqual(command.steps, 30)
+
+    def test_slow_gesture_is_not_multiplied(self):
+        accumulator = TickAccumulator(tics_per_increment=1, burst_gap=0.5,
+                                      fast_velocity=8.0, fast_multiplier=3)
+        for i in range(3):
+            accumulator.add(1, i * 0.4)
+        self.assertEqual(accumulator.poll(2.0).steps, 3)
+
+
+class TickAccumulatorHintTest(unittest.TestCase):
+    def setUp(self):
+        self.accumulator = TickAccumulator(tics_per_increment=3, burst_gap=0.08)
+
+    def test_hint_from_first_tick(self):
+        self.accumulator.add(1, 0.0)
+        self.assertEqual(self.accumulator.hint(), (1, 1))
+
+    def test_abandoned_turn_clears_hint(self):
+        self.accumulator.add(1, 0.0)
+        self.accumulator.add(1, 0.01)
+        self.assertIsNone(self.accumulator.poll(0.5))
+        self.assertFalse(self.accumulator.pending)
+        self.assertTrue(self.accumulator.abandoned)
+        # The leftover carry is not a gesture in progress
+        self.assertEqual(self.accumulator.hint(), (0, 0))
+
+    def test_direction_comes_from_open_burst(self):
+        self.accumulator.add(1, 0.0)
+        self.accumulator.add(1, 0.01)
+        self.accumulator.poll(0.5)
+        self.accumulator.add(-1, 1.0)
+        self.assertEqual(self.accumulator.hint(), (-1, 1))
+
+    def test_agreeing_carry_counts_towards_steps(self):
+        for i in range(5):
+            self.accumulator.add(1, i * 0.01)
+        command = self.accumulator.poll(0.5)
+        self.assertEqual(command.steps, 1)
+        self.assertEqual(self.accumulator.carry, 2)
+        self.assertFalse(self.accumulator.abandoned)
+        for i in range(2):
+            self.accumulator.add(1, 1.0 + i * 0.01)
+        # 2 carried + 2 new ticks: heading past the next detent
+        self.assertEqual(self.accumulator.hint(), (1, 2))
+
+
+class HistogramTest(unittest.TestCase):
+    def test_small_values_are_exact(self):
+        histogram = Histogram()
+        for microseconds in (3, 10, 31):
+            histogram.record(microseconds / 1e6)
+        self.assertAlmostEqual(histogram.percentile(50), 10e-6)
+        self.assertAlmostEqual(histogram.percentile(100), 31e-6)
+
+    def test_large_values_within_bucket_error(self):
+        histogram = Histogram()
+        for seconds in (0.0123, 0.0456, 2.5):
+            histogram.record(seconds)
+        median = histogram.percentile(50)
+        self.assertGreaterEqual(median, 0.0456)
+        self.assertLessEqual(median, 0.0456 * (1 + 1 / histogram.sub_buckets))
+        # Never above the largest sample
+        self.assertEqual(histogram.percentile(100), 2.5)
+
+    def test_empty(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.percentile(99), 0.0)
+        self.assertEqual(histogram.mean(), 0.0)
+
+
+class ImageCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.paths = []
+        for name in ('a.jpg', 'b.jpg', 'c.jpg'):
+            path = os.path.join(self.folder, name)
+            open(path, 'wb').close()
+            self.paths.append(path)
+        self.cache = ImageCache(max_bytes=250)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_least_recently_shown_is_evicted_first(self):
+        a, b, c = self.paths
+        self.cache.put(a, (10, 10), 'A', nbytes=100)
+        self.cache.put(b, (10, 10), 'B', nbytes=100)
+        self.assertEqual(self.cache.get(a, (10, 10)), 'A')
+        self.cache.put(c, (10, 10), 'C', nbytes=100)
+        self.assertIsNone(self.cache.get(b, (10, 10)))
+        self.assertEqual(self.cache.get(a, (10, 10)), 'A')
+        self.assertEqual(self.cache.bytes, 200)
+
+    def test_image_over_budget_is_not_cached(self):
+        self.cache.put(self.paths[0], (10, 10), 'A', nbytes=300)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_modified_file_misses(self):
+        path = self.paths[0]
+        self.cache.put(path, (10, 10), 'A', nbytes=100)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertIsNone(self.cache.get(path, (10, 10)))
+
+    def test_other_size_misses(self):
+        self.cache.put(self.paths[0], (10, 10), 'A', nbytes=100)
+        self.assertIsNone(self.cache.get(self.paths[0], (20, 20)))
+
+    def test_geometry_change_clears(self):
+        self.cache.set_geometry((800, 600))
+        self.cache.put(self.paths[0], (10, 10), 'A', nbytes=100)
+        self.cache.set_geometry((800, 600))
+        self.assertEqual(len(self.cache), 1)
+        self.cache.set_geometry((1920, 1080))
+        self.assertEqual((len(self.cache), self.cache.bytes), (0, 0))
+
+
+class ApplyDeltaTest(unittest.TestCase):
+    def setUp(self):
+        self.files = ['a.mp4', 'c.mp4', 'e.mp4']
+
+    def test_added_before_current_keeps_it_on_screen(self):
+        index = apply_delta(self.files, 1, ADDED, 'b.mp4')
+        self.assertEqual(self.files, ['a.mp4', 'b.mp4', 'c.mp4', 'e.mp4'])
+        self.assertEqual(self.files[index], 'c.mp4')
+
+    def test_added_after_current(self):
+        self.assertEqual(apply_delta(self.files, 1, ADDED, 'd.mp4'), 1)
+
+    def test_added_twice_is_ignored(self):
+        self.assertEqual(apply_delta(self.files, 1, ADDED, 'a.mp4'), 1)
+        self.assertEqual(len(self.files), 3)
+
+    def test_removed_current_shows_successor(self):
+        index = apply_delta(self.files, 1, REMOVED, 'c.mp4')
+        self.assertEqual(self.files[index], 'e.mp4')
+
+    def test_removed_last_wraps(self):
+        self.assertEqual(apply_delta(self.files, 2, REMOVED, 'e.mp4'), 0)
+
+    def test_removed_everything(self):
+        for path in list(self.files):
+            index = apply_delta(self.files, 0, REMOVED, path)
+        self.assertEqual((self.files, index), ([], 0))
+
+
+def inotify_event(mask, name):
+    # The kernel pads names with NULs to a multiple of the event alignment
+    encoded = name.encode() + b'\0' * (16 - len(name) % 16)
+    return EVENT.pack(1, mask, 0, len(encoded)) + encoded
+
+
+class ExhibitWatcherEventTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.events = []
+        self.watcher = ExhibitWatcher(self.folder, lambda kind, path: self.events.append(
+            (kind, os.path.basename(path))), known=[])
+
+    def tearDown(self):
+        self.watcher.stop()
+        shutil.rmtree(self.folder)
+
+    def deliver(self, *events):
+        for mask, name in self.watcher._parse(b''.join(inotify_event(*event) for event in events)):
+            self.watcher._handle(mask, name)
+
+    def test_parse_strips_padding(self):
+        data = inotify_event(IN_CLOSE_WRITE, 'a.mp4') + inotify_event(IN_DELETE, 'bb.jpg')
+        self.assertEqual(list(self.watcher._parse(data)),
+                         [(IN_CLOSE_WRITE, 'a.mp4'), (IN_DELETE, 'bb.jpg')])
+
+    def test_parse_ignores_truncated_header(self):
+        data = inotify_event(IN_CLOSE_WRITE, 'a.mp4')
+        self.assertEqual(len(list(self.watcher._parse(data + data[:8]))), 1)
+
+    def test_added_modified_removed(self):
+        self.deliver((IN_CLOSE_WRITE, 'a.mp4'), (IN_CLOSE_WRITE, 'a.mp4'),
+                     (IN_MOVED_TO, 'b.jpg'), (IN_DELETE, 'a.mp4'))
+        self.assertEqual(self.events, [(ADDED, 'a.mp4'), (MODIFIED, 'a.mp4'),
+                                       (ADDED, 'b.jpg'), (REMOVED, 'a.mp4')])
+
+    def test_hidden_directories_and_other_files_are_ignored(self):
+        self.deliver((IN_CLOSE_WRITE, '.a.mp4.compiling.mp4'),
+                     (IN_CLOSE_WRITE, 'notes.txt'),
+                     (IN_MOVED_TO | IN_ISDIR, 'originals.mp4'),
+                     (IN_DELETE, 'never_seen.mp4'))
+        self.assertEqual(self.events, [])
+
+    def test_overflow_asks_for_rescan(self):
+        self.deliver((IN_Q_OVERFLOW, ''))
+        self.assertEqual(self.events, [(RESCAN, os.path.basename(self.folder))])
+
+    def test_real_inotify_events(self):
+        self.watcher.start()
+        with open(os.path.join(self.folder, 'c.png'), 'wb') as f:
+            f.write(b'x')
+        for _ in range(100):
+            if self.events:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.events, [(ADDED, 'c.png')])
+
+
+class ExhibitCompilerNamingTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def touch(self, *names):
+        paths = [os.path.join(self.folder, name) for name in names]
+        for path in paths:
+            with open(path, 'w') as f:
+                f.write(path)
+        return paths
+
+    def test_outputs_never_take_another_files_name(self):
+        self.touch('a.mp4', 'c.mp4')
+        todo = self.touch('a.mov', 'a.mkv', 'b.avi', 'c.mov', 'd.mp4')
+        manifest = {'files': {'c.mp4': {'source': 'c.mov'}}}
+        outputs = {os.path.basename(path): output and os.path.basename(output)
+                   for path, output in plan_outputs(self.folder, todo, manifest).items()}
+        self.assertEqual(outputs, {'a.mov': 'a.mov.mp4', 'a.mkv': 'a.mkv.mp4', 'b.avi': 'b.mp4',
+                                   # Its own earlier output, and a compliant-name source in place
+                                   'c.mov': 'c.mp4', 'd.mp4': 'd.mp4'})
+
+    def test_no_free_name(self):
+        self.touch('a.mp4', 'a.mov.mp4')
+        todo = self.touch('a.mov')
+        self.assertEqual(plan_outputs(self.folder, todo, {'files': {}}), {todo[0]: None})
+
+    def test_originals_are_never_replaced(self):
+        kept = []
+        for _ in range(3):
+            kept.append(os.path.relpath(keep_original(self.touch('clip.mov')[0]), self.folder))
+        self.assertEqual(kept, [os.path.join('originals', name)
+                                for name in ('clip.mov', 'clip.1.mov', 'clip.2.mov')])
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_burst_then_suppressed_until_window_passes(self):
+        limiter = RateLimiter(burst=3, window=10.0)
+        self.assertEqual([limiter.check('elst', t) for t in (0.0, 1.0, 2.0)], [(True, 0)] * 3)
+        self.assertEqual(limiter.check('elst', 3.0), (False, 0))
+        self.assertEqual(limiter.check('elst', 9.9), (False, 0))
+        # Other messages have their own budget
+        self.assertEqual(limiter.check('late', 4.0), (True, 0))
+        # A new window reports what the last one swallowed
+        self.assertEqual(limiter.check('elst', 10.0), (True, 2))
+        self.assertEqual(limiter.check('elst', 11.0), (True, 0))
+
+
+def log_lines(*lines):
+    return ''.join(line + '\n' for line in lines).encode()
+
+
+class LogAnalyzerTest(unittest.TestCase):
+    def setUp(self):
+        self.closed = []
+        self.analyzer = LogAnalyzer(self.closed.append)
+
+    def scan(self, *lines):
+        fd, path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(log_lines(*lines))
+        try:
+            self.analyzer.scan(path)
+        finally:
+            os.remove(path)
+
+    def test_session_fields(self):
+        self.scan(
+            "[10:00:00.000] main debug: `file:///home/pi/Videos/a%20b.mp4' gives access",
+            '[10:00:00.010] main debug: using demux module "mp4"',
+            '[10:00:00.020] main debug: using audio decoder module "faad"',
+            '[10:00:00.250] main debug: Received first picture',
+            '[10:00:01.000] main warning: picture is too late to be displayed (missing 40 ms)',
+            '[10:00:01.100] main warning: picture is too late to be displayed (missing 60 ms)',
+            '[10:00:01.200] avcodec warning: More than 11 late frames, dropping frame',
+            '[10:00:01.300] faad warning: decoded zero sample',
+            '[10:00:01.400] avcodec error: cannot start codec (h264_v4l2m2m)',
+            '[10:00:01.500] avcodec debug: Avoid trying hw decoder for h264 3840x2160',
+            '[10:00:02.000] main debug: removing module "mp4"',
+            '[10:00:02.100] main debug: Received first picture')
+        self.assertEqual(len(self.closed), 1)
+        session = self.closed[0]
+        self.assertEqual(session.path, '/home/pi/Videos/a b.mp4')
+        self.assertEqual((session.demux, session.audio_decoder), ('mp4', 'faad'))
+        self.assertEqual(session.first_picture_ms, 250)
+        self.assertEqual((session.too_late, session.late_total_ms, session.late_max_ms), (2, 100, 60))
+        self.assertEqual(session.dropping, 1)
+        self.assertEqual((session.fallbacks, session.fallback_sizes), (2, {'3840x2160'}))
+        self.assertEqual(session.audio_warnings, 1)
+        self.assertEqual(session.audio_samples, ['faad: decoded zero sample'])
+
+    def test_at_most_two_sessions_open(self):
+        self.analyzer._scan_chunk(log_lines(
+            "main debug: `file:///a.mp4' gives access",
+            "main debug: `file:///b.mp4' gives access",
+            "main debug: `file:///c.mp4' gives access"))
+        self.assertEqual([s.path for s in self.closed], ['/a.mp4'])
+        self.assertEqual([s.path for s in self.analyzer.open], ['/b.mp4', '/c.mp4'])
+
+    def test_removing_demux_closes_its_session(self):
+        self.analyzer._scan_chunk(log_lines(
+            "main debug: `file:///a.mp4' gives access",
+            'main debug: using demux module "mp4"',
+            "main debug: `file:///b.mkv' gives access",
+            'main debug: using demux module "mkv"',
+            'main debug: removing module "mp4"',
+            'main warning: picture is too late to be displayed (missing 5 ms)'))
+        self.assertEqual([s.path for s in self.closed], ['/a.mp4'])
+        self.assertEqual(self.analyzer.open[0].too_late, 1)
+        # A module that is no session's demux closes nothing
+        self.analyzer._scan_chunk(log_lines('main debug: removing module "faad"'))
+        self.assertEqual(len(self.analyzer.open), 1)
+
+    def test_clock_rolls_over_midnight(self):
+        self.scan(
+            "[23:59:59.900] main debug: `file:///a.mp4' gives access",
+            '[00:00:00.150] main debug: Received first picture')
+        self.assertEqual(self.closed[0].first_picture_ms, 250)
+
+    def test_decoder_wait_without_timestamps(self):
+        self.scan(
+            "main debug: `file:///a.mp4' gives access",
+            'main debug: Decoder wait done in 180 ms',
+            'main debug: Received first picture')
+        self.assertIsNone(self.closed[0].first_picture_ms)
+        self.assertEqual(self.closed[0].startup_ms(), 180)
+
+
+if __name__ == '__main__':
+    unittest.main()
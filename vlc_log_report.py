@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Per-media playback report from VLC logs.
+
+    python vlc_log_report.py vlc-old.log vlc-old2.log [--json report.json] [--sessions]
+    python vlc_log_report.py logs/vlc.log.*.gz --late-threshold 10
+
+Reads VLC's own --file-logging output as well as VlcLogPipeline's
+"[HH:MM:SS.mmm] module level: text" lines, plain or gzipped. A session
+starts when an input is opened (`file://...' gives access) and ends when
+its demux module is removed or the next input opens. For every session it
+records:
+
+  - open-to-first-picture time (from the line timestamps when the log has
+    them, otherwise VLC's own "Decoder wait done in N ms"),
+  - frames dropped by avcodec ("More than N late frames, dropping frame"),
+  - "picture is too late to be displayed" count and how late they were,
+  - hardware decoder fallbacks (h264_v4l2m2m failing to start, or VLC
+    skipping it after an earlier failure) and the resolution it refused,
+  - warnings from the session's audio decoder (faad etc.).
+
+Sessions are summed per file and files that should be re-encoded with
+exhibit_compiler.py are listed at the end.
+
+The log is scanned in fixed-size chunks with one regular expression that
+only matches the lines above, so memory stays constant and the hundreds of
+thousands of debug lines in between never reach Python code.
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import time
+import urllib.parse
+
+CHUNK_BYTES = 8 * 1024 * 1024
+
+# Optional pipeline timestamp, then one of the lines we care about
+LINE = re.compile(rb'''
+    ^(?:\[(?P<h>\d\d):(?P<m>\d\d):(?P<s>\d\d)\.(?P<ms>\d{3})\]\ )?
+    (?:
+      (?P<open>main\ debug:\ `(?P<url>file://[^']*)'\ gives\ access)
+    | (?P<demux>main\ debug:\ using\ demux\ module\ "(?P<demux_name>\w+)")
+    | (?P<audio_dec>main\ debug:\ using\ audio\ decoder\ module\ "(?P<audio_name>\w+)")
+    | (?P<picture>main\ debug:\ Received\ first\ picture)
+    | (?P<wait>main\ debug:\ Decoder\ wait\ done\ in\ (?P<wait_ms>\d+)\ ms)
+    | (?P<too_late>main\ warning:\ picture\ is\ too\ late\ to\ be\ displayed\ \(missing\ (?P<late_ms>-?\d+)\ ms\))
+    | (?P<dropping>avcodec\ warning:\ More\ than\ \d+\ late\ frames,\ dropping\ frame)
+    | (?P<hw_error>avcodec\ error:\ cannot\ start\ codec\ \((?P<hw_codec>\w+)\))
+    | (?P<hw_avoid>avcodec\ debug:\ Avoid\ trying\ hw\ decoder\ for\ \w+\ (?P<avoid_size>\d+x\d+))
+    | (?P<hw_size>avcodec\ debug:\ Set\ hw\ fail\ for\ \w+\ (?P<fail_size>\d+x\d+))
+    | (?P<remove>main\ debug:\ removing\ module\ "(?P<removed>\w+)")
+    | (?P<warning>(?P<warn_module>\w+)\ (?:warning|error):\ (?P<warn_text>[^\n]*))
+    )
+''', re.MULTILINE | re.VERBOSE)
+
+
+class Session:
+    """One opening of one media file."""
+    __slots__ = ('path', 'opened_at', 'demux', 'audio_decoder', 'first_picture_ms', 'decoder_wait_ms',
+                 'too_late', 'late_total_ms', 'late_max_ms', 'dropping', 'fallbacks', 'fallback_sizes',
+                 'audio_warnings', 'audio_samples')
+
+    def __init__(self, path, opened_at):
+        self.path = path
+        self.opened_at = opened_at
+        self.demux = None
+        self.audio_decoder = None
+        self.first_picture_ms = None
+        self.decoder_wait_ms = None
+        self.too_late = 0
+        self.late_total_ms = 0
+        self.late_max_ms = 0
+        self.dropping = 0
+        self.fallbacks = 0
+        self.fallback_sizes = set()
+        self.audio_warnings = 0
+        self.audio_samples = []
+
+    def startup_ms(self):
+        # Measured from timestamps if we have them, VLC's own figure otherwise
+        if self.first_picture_ms is not None:
+            return self.first_picture_ms
+        return self.decoder_wait_ms
+
+    def as_dict(self):
+        return {
+            'path': self.path,
+            'first_picture_ms': self.startup_ms(),
+            'too_late': self.too_late,
+            'late_max_ms': self.late_max_ms,
+            'late_dropped': self.dropping,
+            'hw_fallbacks': self.fallbacks,
+            'audio_warnings': self.audio_warnings,
+        }
+
+
+class FileStats:
+    """Sessions of one file, summed."""
+    def __init__(self, path):
+        self.path = path
+        self.sessions = 0
+        self.startup = []
+        self.too_late = 0
+        self.late_total_ms = 0
+        self.late_max_ms = 0
+        self.dropping = 0
+        self.fallbacks = 0
+        self.fallback_sizes = set()
+        self.audio_warnings = 0
+        self.audio_samples = []
+
+    def add(self, session):
+        self.sessions += 1
+        startup = session.startup_ms()
+        if startup is not None:
+            # Kept short: median and max are all the report needs
+            self.startup.append(startup)
+            if len(self.startup) > 512:
+                self.startup.sort()
+                self.startup = self.startup[::2]
+        self.too_late += session.too_late
+        self.late_total_ms += session.late_total_ms
+        self.late_max_ms = max(self.late_max_ms, session.late_max_ms)
+        self.dropping += session.dropping
+        self.fallbacks += session.fallbacks
+        self.fallback_sizes |= session.fallback_sizes
+        self.audio_warnings += session.audio_warnings
+        for sample in session.audio_samples:
+            if sample not in self.audio_samples and len(self.audio_samples) < 3:
+                self.audio_samples.append(sample)
+
+    def reasons(self, late_threshold):
+        reasons = []
+        if self.fallbacks:
+            sizes = ', '.join(sorted(self.fallback_sizes)) or 'unknown size'
+            reasons.append(f"hardware decoder refused it ({sizes})")
+        if self.dropping:
+            reasons.append(f"{self.dropping} late-frame drops")
+        if self.sessions and self.too_late / self.sessions > late_threshold:
+            reasons.append(f"{self.too_late / self.sessions:.0f} late pictures per play")
+        return reasons
+
+    def as_dict(self, late_threshold):
+        startup = sorted(self.startup)
+        return {
+            'path': self.path,
+            'sessions': self.sessions,
+            'first_picture_ms': {
+                'median': startup[len(startup) // 2] if startup else None,
+                'max': startup[-1] if startup else None,
+            },
+            'too_late': self.too_late,
+            'late_mean_ms': round(self.late_total_ms / self.too_late, 1) if self.too_late else 0,
+            'late_max_ms': self.late_max_ms,
+            'late_dropped': self.dropping,
+            'hw_fallbacks': self.fallbacks,
+            'hw_refused_sizes': sorted(self.fallback_sizes),
+            'audio_warnings': self.audio_warnings,
+            'audio_samples': self.audio_samples,
+            'reencode': self.reasons(late_threshold),
+        }
+
+
+def open_log(path):
+    if path == '-':
+        return sys.stdin.buffer
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def chunks(stream, size=CHUNK_BYTES):
+    """Whole lines, `size` bytes at a time."""
+    rest = b''
+    while True:
+        data = stream.read(size)
+        if not data:
+            break
+        data = rest + data
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            rest = data
+            continue
+        rest = data[end:]
+        yield data[:end]
+    if rest:
+        yield rest + b'\n'
+
+
+def path_from_url(url):
+    url = url.decode('utf-8', 'replace')
+    return urllib.parse.unquote(urllib.parse.urlsplit(url).path)
+
+
+class LogAnalyzer:
+    """
+    Feed it log files with scan(); on_session is called with every Session
+    as it closes. Only the sessions still open are held in memory.
+    """
+    def __init__(self, on_session):
+        self.on_session = on_session
+        self.open = []
+        self.lines = 0
+        self.bytes = 0
+        self._day_offset = 0
+        self._last_clock = None
+
+    def _clock(self, match):
+        if match.group('h') is None:
+            return None
+        seconds = (int(match.group('h')) * 3600 + int(match.group('m')) * 60 + int(match.group('s'))
+                   + int(match.group('ms')) / 1000)
+        # Pipeline stamps are wall-clock times of day
+        if self._last_clock is not None and seconds + self._day_offset < self._last_clock - 3600:
+            self._day_offset += 86400
+        self._last_clock = seconds + self._day_offset
+        return self._last_clock
+
+    def _close(self, session):
+        self.open.remove(session)
+        self.on_session(session)
+
+    def scan(self, path):
+        with open_log(path) as stream:
+            for chunk in chunks(stream):
+                self.bytes += len(chunk)
+                self.lines += chunk.count(b'\n')
+                self._scan_chunk(chunk)
+        # A file ends with whatever was playing when the log was cut
+        for session in list(self.open):
+            self._close(session)
+        self._last_clock = None
+
+    def _scan_chunk(self, chunk):
+        for match in LINE.finditer(chunk):
+            kind = match.lastgroup
+            if kind == 'open':
+                # The previous input has gone unless it is still demuxing
+                # (a preloaded player); keep at most two open
+                while len(self.open) >= 2:
+                    self._close(self.open[0])
+                self.open.append(Session(path_from_url(match.group('url')), self._clock(match)))
+                continue
+            if not self.open:
+                continue
+            # Events belong to the newest input: VLC logs without thread ids
+            session = self.open[-1]
+
+            if kind == 'demux':
+                if session.demux is None:
+                    session.demux = match.group('demux_name').decode()
+            elif kind == 'audio_dec':
+                session.audio_decoder = match.group('audio_name').decode()
+            elif kind == 'picture':
+                now = self._clock(match)
+                if session.first_picture_ms is None and now is not None and session.opened_at is not None:
+                    session.first_picture_ms = round((now - session.opened_at) * 1000)
+            elif kind == 'wait':
+                if session.decoder_wait_ms is None:
+                    session.decoder_wait_ms = int(match.group('wait_ms'))
+            elif kind == 'too_late':
+                late = int(match.group('late_ms'))
+                session.too_late += 1
+                session.late_total_ms += late
+                session.late_max_ms = max(session.late_max_ms, late)
+            elif kind == 'dropping':
+                session.dropping += 1
+            elif kind == 'hw_error':
+                session.fallbacks += 1
+            elif kind == 'hw_avoid':
+                session.fallbacks += 1
+                session.fallback_sizes.add(match.group('avoid_size').decode())
+            elif kind == 'hw_size':
+                session.fallback_sizes.add(match.group('fail_size').decode())
+            elif kind == 'remove':
+                removed = match.group('removed').decode()
+                for candidate in self.open:
+                    if candidate.demux == removed:
+                        self._close(candidate)
+                        break
+            elif kind == 'warning':
+                module = match.group('warn_module').decode()
+                if module == session.audio_decoder:
+                    session.audio_warnings += 1
+                    text = f"{module}: {match.group('warn_text').decode('utf-8', 'replace')}"
+                    if len(session.audio_samples) < 3 and text not in session.audio_samples:
+                        session.audio_samples.append(text)
+
+
+def format_table(files, late_threshold):
+    header = (f"{'file':<44} {'plays':>5} {'1st pic ms':>10} {'late':>6} {'late ms':>11} "
+              f"{'dropped':>7} {'hw fb':>5} {'audio':>5}")
+    lines = [header, '-' * len(header)]
+    for stats in files:
+        data = stats.as_dict(late_threshold)
+        startup = data['first_picture_ms']
+        startup = f"{startup['median']}/{startup['max']}" if startup['median'] is not None else '-'
+        late = f"{data['late_mean_ms']:.0f}/{data['late_max_ms']}" if stats.too_late else '-'
+        name = os.path.basename(stats.path)
+        if len(name) > 44:
+            name = name[:41] + '...'
+        lines.append(f"{name:<44} {stats.sessions:>5} {startup:>10} {stats.too_late:>6} {late:>11} "
+                     f"{stats.dropping:>7} {stats.fallbacks:>5} {stats.audio_warnings:>5}")
+    lines.append("1st pic ms: median/max, late ms: mean/max")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-media playback report from VLC logs.')
+    parser.add_argument('logs', nargs='+', help="log files (.gz is fine, '-' for stdin)")
+    parser.add_argument('--json', metavar='PATH', help="also write the report as JSON ('-' for stdout)")
+    parser.add_argument('--sessions', action='store_true', help='include every session in the JSON')
+    parser.add_argument('--late-threshold', type=float, default=5,
+                        help='late pictures per play above which a file needs re-encoding')
+    args = parser.parse_args()
+
+    files = {}
+    sessions = []
+
+    def on_session(session):
+        stats = files.get(session.path)
+        if stats is None:
+            stats = files[session.path] = FileStats(session.path)
+        stats.add(session)
+        if args.sessions:
+            sessions.append(session.as_dict())
+
+    analyzer = LogAnalyzer(on_session)
+    start = time.perf_counter()
+    for path in args.logs:
+        try:
+            analyzer.scan(path)
+        except OSError as e:
+            print(f"{path}: {e}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    # Worst first: fallbacks, then drops, then late pictures
+    ranked = sorted(files.values(), key=lambda s: (s.fallbacks, s.dropping, s.too_late), reverse=True)
+    flagged = [(stats, stats.reasons(args.late_threshold)) for stats in ranked]
+    flagged = [(stats, reasons) for stats, reasons in flagged if reasons]
+
+    if args.json != '-':
+        print(format_table(ranked, args.late_threshold))
+        print(f"\n{analyzer.lines} lines, {analyzer.bytes / 1e6:.1f} MB in {elapsed:.2f}s, "
+              f"{sum(s.sessions for s in ranked)} sessions of {len(ranked)} files")
+        if flagged:
+            print("\nRe-encode (python exhibit_compiler.py <exhibit folder>):")
+            for stats, reasons in flagged:
+                print(f"  {stats.path}: {'; '.join(reasons)}")
+        else:
+            print("\nNothing needs re-encoding.")
+
+    if args.json:
+        report = {
+            'logs': args.logs,
+            'lines': analyzer.lines,
+            'files': [stats.as_dict(args.late_threshold) for stats in ranked],
+            'reencode': [stats.path for stats, reasons in flagged],
+        }
+        if args.sessions:
+            report['sessions'] = sessions
+        if args.json == '-':
+            json.dump(report, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()